@@ -0,0 +1,208 @@
+import logging
+import re
+import sys
+from collections import deque
+from bisect import bisect_right
+from .Parse773 import normalize_title
+
+CAPTURE_TOKENS = re.compile(r'\w+')
+# shorter tokens (prepositions, conjunctions) are not indexed
+MIN_TOKEN_LEN = 3
+NO_PAGE = -1
+# keys of articles with the same title as an earlier sibling end with ` #2`, ` #3`...
+DUPLICATE_SUFFIX = ' #{}'
+CAPTURE_DUPLICATE_SUFFIX = re.compile(r' #\d+$')
+
+
+def tokenize(title: str) -> set[str]:
+    """Return lower-cased words of a title (at least `MIN_TOKEN_LEN` characters long)."""
+    return {sys.intern(token) for token in CAPTURE_TOKENS.findall(title.lower())
+            if len(token) >= MIN_TOKEN_LEN}
+
+
+class ArticleIndex:
+    """Articles of a periodical by words of their titles and by their pages.
+
+    Articles are numbered in the order they are added,
+    words map to sets of these numbers. First and last numeric pages
+    of articles are kept in arrays, articles with pages are sorted by
+    their first page for every issue, so that the articles on a page
+    are found by binary search.
+
+    Attributes
+    ----------
+    keys : list[str]
+        Keys of articles in the tree.
+    uuids : list[str]
+        UUIDs of articles.
+    issues : list[str]
+        Keys of parents (usually issues) of articles.
+    first_pages, last_pages : list[int]
+        First and last numeric page of articles, `NO_PAGE` if unknown.
+    """
+
+    def __init__(self) -> None:
+        self.keys: list[str] = []
+        self.uuids: list[str] = []
+        self.issues: list[str] = []
+        self.first_pages: list[int] = []
+        self.last_pages: list[int] = []
+        self._tokens: dict[str, set[int]] = dict()
+        # articles with pages by issue, sorted by their first pages
+        self._by_issue: dict[str, list[int]] = dict()
+        self._starts: dict[str, list[int]] = dict()
+        # the largest last page of articles up to a position in `_by_issue`
+        self._reach: dict[str, list[int]] = dict()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def from_tree(cls, tree, root_id: str, sep: str) -> 'ArticleIndex':
+        """Index all `article` nodes of a tree.
+
+        In Kramerius, pages are children of issues and articles refer to them
+        (`pages` attribute with UUIDs, see `KramAPIBase._set_page_refs`).
+        Pages of an article are the referred pages among the siblings
+        of the article, and its own children (if an API lists them there).
+        Titles are taken from keys without `DUPLICATE_SUFFIX`.
+
+        Parameters
+        ----------
+        tree : CompactTree | IndexTree
+            Downloaded tree.
+        root_id : str
+            Key to the root.
+        sep : str
+            Separator used in keys in the tree.
+
+        Returns
+        -------
+        ArticleIndex
+            Index of the articles.
+        """
+        index = cls()
+        # articles are numbered in the order of the tree
+        queue = deque([root_id])
+        while queue:
+            node = queue.popleft()
+            start = len(node)+len(sep)
+            articles = []
+            # page titles of the node by their UUIDs
+            page_titles = dict()
+            for child in tree.successors(node):
+                attrs = tree.nodes[child]
+                model = attrs.get('model')
+                if model == 'article':
+                    articles.append((child, attrs))
+                    continue
+                if model == 'page' and 'uuid' in attrs:
+                    page_titles[attrs['uuid']] = child[start:]
+                queue.append(child)
+
+            for child, attrs in articles:
+                title = CAPTURE_DUPLICATE_SUFFIX.sub('', child[start:])
+                pages = [page_titles[uuid] for uuid in attrs.get('pages', ())
+                         if uuid in page_titles]
+                pages.extend(page[len(child)+len(sep):]
+                             for page in tree.successors(child))
+                index.add(child, attrs.get('uuid'), node, title,
+                          [normalize_title(page) for page in pages])
+        index.finish()
+        logging.info(f'Indexed {len(index)} articles')
+        return index
+
+    def add(self, key: str, uuid: str, issue: str, title: str, pages: list[str]) -> None:
+        """Add an article, call `finish` once all articles are added.
+
+        Parameters
+        ----------
+        key : str
+            Key of the article in the tree.
+        uuid : str
+            UUID of the article.
+        issue : str
+            Key of the parent of the article.
+        title : str
+            Title of the article.
+        pages : list[str]
+            Normalized titles of its pages.
+        """
+        i = len(self.keys)
+        self.keys.append(key)
+        self.uuids.append(uuid)
+        self.issues.append(issue)
+        for token in tokenize(title):
+            self._tokens.setdefault(token, set()).add(i)
+        numbers = [int(page) for page in pages if page.isdigit()]
+        self.first_pages.append(min(numbers, default=NO_PAGE))
+        self.last_pages.append(max(numbers, default=NO_PAGE))
+        if len(numbers) > 0:
+            self._by_issue.setdefault(issue, []).append(i)
+
+    def finish(self) -> None:
+        """Sort articles of every issue by their first pages."""
+        for issue, articles in self._by_issue.items():
+            articles.sort(key=lambda i: self.first_pages[i])
+            self._starts[issue] = [self.first_pages[i] for i in articles]
+            reach = []
+            for i in articles:
+                reach.append(max(self.last_pages[i], reach[-1] if reach else NO_PAGE))
+            self._reach[issue] = reach
+
+    def _on_page(self, issue: str, page: int) -> set[int]:
+        """Return articles of an issue on a page."""
+        if issue not in self._by_issue:
+            return set()
+        articles = self._by_issue[issue]
+        reach = self._reach[issue]
+        found = set()
+        # articles starting up to the page, while some of them reach it
+        j = bisect_right(self._starts[issue], page)-1
+        while j >= 0 and reach[j] >= page:
+            if self.last_pages[articles[j]] >= page:
+                found.add(articles[j])
+            j -= 1
+        return found
+
+    def find(self, title: str | None, page: str | None = None, issue: str | None = None) -> list[int]:
+        """Find articles by words of a title and a page.
+
+        All words of `title` have to be in the title of an article.
+        If `issue` is given, the article has to be in the issue
+        and contain `page`, unless no article of the issue has known pages.
+
+        Parameters
+        ----------
+        title : str | None
+            Title (eg. from a MARC record).
+        page : str | None
+            Page number.
+        issue : str | None
+            Key of the issue in the tree.
+
+        Returns
+        -------
+        list[int]
+            Numbers of matching articles, see `keys` and `uuids`.
+        """
+        found = None
+        tokens = tokenize(title) if title is not None else set()
+        if len(tokens) > 0:
+            # the rarest words first
+            postings = sorted((self._tokens.get(token, set())
+                              for token in tokens), key=len)
+            found = set(postings[0])
+            for posting in postings[1:]:
+                if len(found) == 0:
+                    break
+                found &= posting
+
+        if issue is not None:
+            page = None if page is None else normalize_title(page)
+            if issue in self._by_issue and page is not None and page.isdigit():
+                on_page = self._on_page(issue, int(page))
+                found = on_page if found is None else found & on_page
+            elif found is not None:
+                found = {i for i in found if self.issues[i] == issue}
+        return [] if found is None else sorted(found)
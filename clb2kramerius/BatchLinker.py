@@ -0,0 +1,169 @@
+import csv
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .CorpusIndex import CorpusIndex
+from .Linker import Kram2CLB, ErrorCodes, RESULT_FIELDS
+
+# columns of the consolidated result of `link_corpus`
+CORPUS_RESULT_FIELDS = ['per_uuid'] + RESULT_FIELDS
+# corpus index opened in a worker process (see `_link_group`)
+_worker_index: CorpusIndex | None = None
+
+
+def _normalize_issn(issn: str | None) -> str | None:
+    """Return the first ISSN from a (`;`-separated) field, stripped and upper-cased."""
+    if issn is None:
+        return None
+    issn = issn.split(';')[0].strip().upper()
+    return issn if len(issn) > 0 else None
+
+
+def _normalize_ccnb(ccnb: str | None) -> str | None:
+    """Return the first ČČNB from a (`;`-separated) field, stripped and lower-cased."""
+    if ccnb is None:
+        return None
+    ccnb = ccnb.split(';')[0].strip().lower()
+    return ccnb if len(ccnb) > 0 else None
+
+
+def make_routing_table(index: CorpusIndex) -> tuple[dict[str, str], dict[str, str]]:
+    """Map ISSNs and ČČNBs of downloaded periodicals to their UUIDs.
+
+    Parameters
+    ----------
+    index : CorpusIndex
+        Index of downloaded periodicals.
+
+    Returns
+    -------
+    tuple[dict[str, str], dict[str, str]]
+        UUIDs of periodicals by ISSN and by ČČNB.
+    """
+    by_issn = dict()
+    by_ccnb = dict()
+    for per_uuid, params in index.periodicals.items():
+        for table, value in [(by_issn, _normalize_issn(params.get('issn'))),
+                             (by_ccnb, _normalize_ccnb(params.get('ccnb')))]:
+            if value is None:
+                continue
+            if value in table:
+                # the same periodical digitized by several libraries
+                logging.warning(
+                    f'`{value}` matches {table[value]} and {per_uuid}, using {table[value]}')
+                continue
+            table[value] = per_uuid
+    return by_issn, by_ccnb
+
+
+def route_records(marc_path: str, index: CorpusIndex) -> tuple[dict[str, list[tuple[str, str, str | None]]], list[tuple[str, str, str | None]]]:
+    """Group MARC records by the downloaded periodical they belong to.
+
+    Records are matched by ISSN (`773x`), then by ČČNB of the periodical (`773w`).
+
+    Parameters
+    ----------
+    marc_path : str
+        CSV file from `scripts_marc/get_marc_data.py` (delimited by `;`).
+    index : CorpusIndex
+        Index of downloaded periodicals.
+
+    Returns
+    -------
+    tuple[dict[str, list[tuple[str, str, str | None]]], list[tuple[str, str, str | None]]]
+        Record identifiers, locations and titles by UUID of a periodical
+        and records that match no periodical.
+    """
+    by_issn, by_ccnb = make_routing_table(index)
+    groups = dict()
+    unrouted = []
+    with open(marc_path, newline='') as f:
+        for line in csv.DictReader(f, delimiter=';'):
+            if not line.get('location'):
+                continue
+            row = (line['id'], line['location'], line.get('title'))
+            per_uuid = by_issn.get(_normalize_issn(line.get('issn')))
+            if per_uuid is None:
+                per_uuid = by_ccnb.get(_normalize_ccnb(line.get('ccnb')))
+            if per_uuid is None:
+                unrouted.append(row)
+            else:
+                groups.setdefault(per_uuid, []).append(row)
+    logging.info(
+        f'Routed records to {len(groups)} periodicals, {len(unrouted)} records match no periodical')
+    return groups, unrouted
+
+
+def link_periodical(linker: Kram2CLB) -> None:
+    """Link records, diagnose and fix failures, link again."""
+    linker.link()
+    linker.diagnose_fails()
+    linker.fix_errors()
+    linker.link()
+
+
+def _link_group(index_path: str, per_uuid: str, rows: list[tuple[str, str, str | None]]) -> tuple[str, list[dict], float]:
+    """Link records of one periodical (in a worker process).
+
+    Returns
+    -------
+    tuple[str, list[dict], float]
+        UUID of the periodical, linked records (see `Kram2CLB.rows`) and the success rate.
+    """
+    global _worker_index
+    if _worker_index is None or _worker_index.path != index_path:
+        _worker_index = CorpusIndex(index_path)
+    linker = Kram2CLB(_worker_index.periodical(per_uuid))
+    linker.add_records(rows)
+    link_periodical(linker)
+    return per_uuid, list(linker.rows()), linker.success_rate()
+
+
+def link_corpus(marc_path: str, index_path: str, out_path: str, processes=4) -> None:
+    """Link all MARC records against all downloaded periodicals.
+
+    The MARC csv is read once, records are grouped by periodical
+    (see `route_records`) and groups are linked in worker processes
+    sharing the memory-mapped `CorpusIndex`.
+    Results are written to one csv file as groups finish.
+
+    Parameters
+    ----------
+    marc_path : str
+        CSV file from `scripts_marc/get_marc_data.py` (delimited by `;`).
+    index_path : str
+        Corpus index built by `build_corpus_index`.
+    out_path : str
+        Consolidated result, csv delimited by `;` (see `CORPUS_RESULT_FIELDS`).
+    processes : int
+        Number of worker processes, by default `4`.
+    """
+    index = CorpusIndex(index_path)
+    groups, unrouted = route_records(marc_path, index)
+    names = {per_uuid: params['name']
+             for per_uuid, params in index.periodicals.items()}
+    index.close()
+
+    with open(out_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, CORPUS_RESULT_FIELDS, delimiter=';')
+        writer.writeheader()
+        for id, location, _ in unrouted:
+            for raw_loc in location.split(';'):
+                writer.writerow({'per_uuid': None, 'id': id, 'location': raw_loc,
+                                 'error_code': ErrorCodes.PER_NOT_DIGI.name})
+
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            # the largest groups first, so that they do not finish last
+            futures = {pool.submit(_link_group, index_path, per_uuid, rows): per_uuid
+                       for per_uuid, rows in sorted(groups.items(), key=lambda group: -len(group[1]))}
+            for future in as_completed(futures):
+                per_uuid = futures[future]
+                try:
+                    _, rows, succ_rate = future.result()
+                except Exception:
+                    logging.exception(
+                        f'Linking `{names[per_uuid]}` ({per_uuid}) failed')
+                    continue
+                writer.writerows({'per_uuid': per_uuid} | row for row in rows)
+                logging.info(
+                    f'Linked `{names[per_uuid]}` ({per_uuid}): {len(rows)} records, success rate {succ_rate:.1%}')
+    logging.info(f'Linked records saved to `{out_path}`')
@@ -0,0 +1,500 @@
+import sys
+import uuid as uuid_lib
+from array import array
+from collections import deque
+from collections.abc import MutableMapping
+from typing import Iterator
+import networkx as nx
+
+# model code of nodes without a model (root)
+NO_MODEL = 255
+UUID_PREF = 'uuid:'
+NO_UUID = bytes(16)
+# attributes stored in arrays, other attributes are kept in a dict
+MODEL = 'model'
+UUID = 'uuid'
+
+
+def pack_uuid(uuid: str) -> bytes | None:
+    """Convert `uuid:xxxxxxxx-...` to 16 bytes.
+
+    Parameters
+    ----------
+    uuid : str
+        UUID with the `uuid:` prefix.
+
+    Returns
+    -------
+    bytes | None
+        Packed UUID, `None` if it cannot be restored exactly from 16 bytes.
+    """
+    if not isinstance(uuid, str) or not uuid.startswith(UUID_PREF):
+        return None
+    try:
+        packed = uuid_lib.UUID(uuid[len(UUID_PREF):]).bytes
+    except ValueError:
+        return None
+    if packed == NO_UUID or unpack_uuid(packed) != uuid:
+        return None
+    return packed
+
+
+def unpack_uuid(packed: bytes) -> str:
+    """Convert 16 bytes to `uuid:xxxxxxxx-...`."""
+    h = packed.hex()
+    return f'{UUID_PREF}{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}'
+
+
+class NodeAttrs(MutableMapping):
+    """Dict-like view of attributes of a node in `CompactTree`."""
+    __slots__ = ('_tree', '_i')
+
+    def __init__(self, tree: 'CompactTree', i: int) -> None:
+        self._tree = tree
+        self._i = i
+
+    def __getitem__(self, attr: str):
+        return self._tree._get_attr(self._i, attr)
+
+    def __setitem__(self, attr: str, value) -> None:
+        self._tree._set_attr(self._i, attr, value)
+
+    def __delitem__(self, attr: str) -> None:
+        self._tree._del_attr(self._i, attr)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tree._attr_names(self._i))
+
+    def __len__(self) -> int:
+        return len(self._tree._attr_names(self._i))
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class NodeView:
+    """View of nodes in `CompactTree`, a subset of `networkx` `NodeView`.
+
+    `tree.nodes[key]` returns attributes of a node,
+    `tree.nodes(data=True)` iterates over pairs of keys and attributes.
+    """
+    __slots__ = ('_tree',)
+
+    def __init__(self, tree: 'CompactTree') -> None:
+        self._tree = tree
+
+    def __getitem__(self, key: str) -> NodeAttrs:
+        return NodeAttrs(self._tree, self._tree._index(key))
+
+    def __call__(self, data=False) -> Iterator:
+        if not data:
+            return iter(self._tree)
+        return ((key, NodeAttrs(self._tree, i)) for i, key in enumerate(self._tree._keys()))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tree)
+
+    def __len__(self) -> int:
+        return len(self._tree)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._tree
+
+
+class CompactTree:
+    """Compact tree of a periodical.
+
+    Replaces `networkx.DiGraph` in `Periodical` and `KramAPIBase`
+    and implements the subset of its API used there.
+    Nodes are stored in parallel arrays indexed in the order of insertion.
+    A key is not stored, it is made by concatenating the key of the parent,
+    `sep` and the label of the node (its last path segment, interned).
+    Models are stored as codes and UUIDs as 16 bytes.
+
+    Attributes
+    ----------
+    sep : str
+        Separator used in keys, by default `/`.
+    nodes : NodeView
+        Nodes and their attributes, eg. `tree.nodes[key]['uuid']`.
+    models : list[str]
+        Models, indexed by their codes.
+    """
+
+    def __init__(self, sep='/') -> None:
+        self.sep = sep
+        self.nodes = NodeView(self)
+        self.models = []
+        self._model_codes = dict()
+        self._labels = []
+        self._parents = array('i')
+        # children of a node, by their labels; `None` for leaves
+        self._children = []
+        self._codes = bytearray()
+        self._uuids = bytearray()
+        # UUIDs that are not packed to `_uuids`, `None` if a node has no UUID
+        self._raw_uuids = dict()
+        self._extra = dict()
+
+    def __len__(self) -> int:
+        return len(self._parents)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys())
+
+    def __contains__(self, key: str) -> bool:
+        return self._find(key) is not None
+
+    def __str__(self) -> str:
+        return f'CompactTree with {self.number_of_nodes()} nodes and {self.number_of_edges()} edges'
+
+    def number_of_nodes(self) -> int:
+        return len(self)
+
+    def number_of_edges(self) -> int:
+        return max(len(self)-1, 0)
+
+    def _keys(self) -> list[str]:
+        """Return keys of all nodes in the order of insertion."""
+        keys = []
+        for i, label in enumerate(self._labels):
+            parent = self._parents[i]
+            keys.append(label if parent < 0 else keys[parent]+self.sep+label)
+        return keys
+
+    def _key(self, i: int) -> str:
+        """Return key of a node."""
+        labels = []
+        while i >= 0:
+            labels.append(self._labels[i])
+            i = self._parents[i]
+        return self.sep.join(reversed(labels))
+
+    def _find(self, key: str) -> int | None:
+        """Return index of a node or `None`.
+
+        Labels may contain `sep`, so all splits of the key are tried.
+        """
+        if len(self) == 0 or not isinstance(key, str):
+            return None
+        root = self._labels[0]
+        if key == root:
+            return 0
+        if not key.startswith(root+self.sep):
+            return None
+        return self._find_below(0, key, len(root)+len(self.sep))
+
+    def _find_below(self, i: int, key: str, start: int) -> int | None:
+        children = self._children[i]
+        if children is None:
+            return None
+        found = children.get(key[start:])
+        if found is not None:
+            return found
+        pos = key.find(self.sep, start)
+        while pos != -1:
+            child = children.get(key[start:pos])
+            if child is not None:
+                found = self._find_below(child, key, pos+len(self.sep))
+                if found is not None:
+                    return found
+            pos = key.find(self.sep, pos+1)
+        return None
+
+    def _index(self, key: str) -> int:
+        i = self._find(key)
+        if i is None:
+            raise KeyError(key)
+        return i
+
+    def _add_node(self, parent: int, label: str) -> int:
+        i = len(self)
+        self._labels.append(sys.intern(label))
+        self._parents.append(parent)
+        self._children.append(None)
+        self._codes.append(NO_MODEL)
+        self._uuids += NO_UUID
+        self._raw_uuids[i] = None
+        if parent >= 0:
+            if self._children[parent] is None:
+                self._children[parent] = dict()
+            self._children[parent][self._labels[i]] = i
+        return i
+
+    def add_node(self, key: str, **attr) -> None:
+        """Add the root node (or update attributes of an existing node).
+
+        Raises
+        ------
+        ValueError
+            The tree has a root already.
+        """
+        i = self._find(key)
+        if i is None:
+            if len(self) > 0:
+                raise ValueError(
+                    f'Unable to add `{key}`, the tree has a root already')
+            i = self._add_node(-1, key)
+        for name, value in attr.items():
+            self._set_attr(i, name, value)
+
+    def add_edge(self, parent: str, child: str, **attr) -> None:
+        """Add an edge between `parent` and `child`.
+
+        If the tree is empty, `parent` becomes the root.
+
+        Raises
+        ------
+        ValueError
+            `parent` is not in the tree
+            or `child` does not start with `parent` and `sep`.
+        """
+        if len(self) == 0:
+            self._add_node(-1, parent)
+        par = self._index_or_error(parent)
+        prefix = parent+self.sep
+        if not child.startswith(prefix):
+            raise ValueError(
+                f'Key `{child}` does not start with its parent key `{prefix}`')
+        label = child[len(prefix):]
+        children = self._children[par]
+        i = children.get(label) if children is not None else None
+        if i is None:
+            i = self._add_node(par, label)
+        for name, value in attr.items():
+            self._set_attr(i, name, value)
+
+    def _index_or_error(self, key: str) -> int:
+        i = self._find(key)
+        if i is None:
+            raise ValueError(f'Node `{key}` is not in the tree')
+        return i
+
+    def successors(self, key: str) -> Iterator[str]:
+        """Iterate over keys of children of a node, in the order of insertion."""
+        children = self._children[self._index(key)]
+        if children is None:
+            return iter(())
+        return (key+self.sep+label for label in children)
+
+    def predecessors(self, key: str) -> Iterator[str]:
+        """Iterate over the key of the parent of a node (if any)."""
+        parent = self._parents[self._index(key)]
+        if parent < 0:
+            return iter(())
+        return iter((self._key(parent),))
+
+    def out_degree(self, key: str) -> int:
+        """Return the number of children of a node."""
+        children = self._children[self._index(key)]
+        return 0 if children is None else len(children)
+
+    def bfs_edges(self, source: str) -> Iterator[tuple[str, str]]:
+        """Iterate over edges of a BFS from `source`, like `networkx.bfs_edges`."""
+        queue = deque([(self._index(source), source)])
+        while queue:
+            i, key = queue.popleft()
+            children = self._children[i]
+            if children is None:
+                continue
+            for label, child in children.items():
+                child_key = key+self.sep+label
+                yield key, child_key
+                queue.append((child, child_key))
+
+    def _get_attr(self, i: int, attr: str):
+        if attr == MODEL:
+            code = self._codes[i]
+            if code == NO_MODEL:
+                raise KeyError(attr)
+            return self.models[code]
+        if attr == UUID:
+            if i in self._raw_uuids:
+                if self._raw_uuids[i] is None:
+                    raise KeyError(attr)
+                return self._raw_uuids[i]
+            return unpack_uuid(bytes(self._uuids[16*i:16*i+16]))
+        return self._extra[i][attr]
+
+    def _set_attr(self, i: int, attr: str, value) -> None:
+        if attr == MODEL and isinstance(value, str):
+            if value not in self._model_codes:
+                if len(self.models) >= NO_MODEL:
+                    raise ValueError(f'Too many models ({len(self.models)})')
+                self._model_codes[value] = len(self.models)
+                self.models.append(value)
+            self._codes[i] = self._model_codes[value]
+            self._extra.get(i, dict()).pop(attr, None)
+        elif attr == UUID and value is not None:
+            packed = pack_uuid(value)
+            if packed is None:
+                self._raw_uuids[i] = value
+            else:
+                self._raw_uuids.pop(i, None)
+                self._uuids[16*i:16*i+16] = packed
+            self._extra.get(i, dict()).pop(attr, None)
+        else:
+            if attr == MODEL:
+                self._codes[i] = NO_MODEL
+            elif attr == UUID:
+                self._raw_uuids[i] = None
+            self._extra.setdefault(i, dict())[attr] = value
+
+    def _del_attr(self, i: int, attr: str) -> None:
+        if attr not in self._attr_names(i):
+            raise KeyError(attr)
+        if attr == MODEL and self._codes[i] != NO_MODEL:
+            self._codes[i] = NO_MODEL
+        elif attr == UUID and self._raw_uuids.get(i, '') is not None:
+            self._raw_uuids[i] = None
+        else:
+            del self._extra[i][attr]
+
+    def _attr_names(self, i: int) -> list[str]:
+        names = []
+        if self._codes[i] != NO_MODEL:
+            names.append(MODEL)
+        if self._raw_uuids.get(i, '') is not None:
+            names.append(UUID)
+        names.extend(self._extra.get(i, ()))
+        return names
+
+    def tree_data(self, root: str) -> dict:
+        """Return the subtree of `root` in the format of `networkx.tree_data`."""
+        def add_children(i: int, key: str) -> list[dict]:
+            children = self._children[i]
+            if children is None:
+                return []
+            data = []
+            for label, child in children.items():
+                child_key = key+self.sep+label
+                d = {**NodeAttrs(self, child), 'id': child_key}
+                c = add_children(child, child_key)
+                if c:
+                    d['children'] = c
+                data.append(d)
+            return data
+
+        i = self._index(root)
+        return {**NodeAttrs(self, i), 'id': root, 'children': add_children(i, root)}
+
+    @classmethod
+    def from_tree_data(cls, data: dict, sep='/') -> 'CompactTree':
+        """Build a tree from the format of `networkx.tree_data`.
+
+        Parameters
+        ----------
+        data : dict
+            Nested dicts with keys `id`, `children` and attributes of nodes.
+        sep : str
+            Separator used in keys, by default `/`.
+
+        Returns
+        -------
+        CompactTree
+            Tree.
+        """
+        tree = cls(sep)
+        tree.add_node(data['id'])
+        stack = [(0, data)]
+        while stack:
+            parent, node = stack.pop()
+            prefix = node['id']+sep
+            children = node.get('children', [])
+            for child in children:
+                if not child['id'].startswith(prefix):
+                    raise ValueError(
+                        f'Key `{child["id"]}` does not start with its parent key `{prefix}`')
+                i = tree._add_node(parent, child['id'][len(prefix):])
+                for name, value in child.items():
+                    if name not in ('id', 'children'):
+                        tree._set_attr(i, name, value)
+                stack.append((i, child))
+        return tree
+
+    def to_arrays(self) -> tuple[list[str], array, bytes, bytes, dict[int, str | None], dict[int, dict]]:
+        """Return the arrays the tree is stored in (see `from_arrays`)."""
+        return (self._labels, self._parents, bytes(self._codes), bytes(self._uuids),
+                self._raw_uuids, self._extra)
+
+    @classmethod
+    def from_arrays(cls, sep: str, labels: list[str], parents: array, codes: bytes, models: list[str],
+                    uuids: bytes, raw_uuids: dict[int, str | None], extra: dict[int, dict]) -> 'CompactTree':
+        """Build a tree from arrays of nodes.
+
+        Parameters
+        ----------
+        sep : str
+            Separator used in keys.
+        labels : list[str]
+            Labels of nodes, the first node is the root and its label is its key.
+        parents : array
+            Indices of parents, every parent precedes its children, `-1` for the root.
+        codes : bytes
+            Codes of models of nodes, `NO_MODEL` if a node has no model.
+        models : list[str]
+            Models, indexed by their codes.
+        uuids : bytes
+            Packed UUIDs of nodes (16 bytes per node).
+        raw_uuids : dict[int, str | None]
+            UUIDs that are not packed, `None` if a node has no UUID.
+        extra : dict[int, dict]
+            Other attributes of nodes.
+
+        Returns
+        -------
+        CompactTree
+            Tree.
+        """
+        tree = cls(sep)
+        tree.models = list(models)
+        tree._model_codes = {model: code for code, model in enumerate(models)}
+        tree._labels = [sys.intern(label) for label in labels]
+        tree._parents = parents
+        tree._codes = bytearray(codes)
+        tree._uuids = bytearray(uuids)
+        tree._raw_uuids = dict(raw_uuids)
+        tree._extra = dict(extra)
+        tree._children = [None]*len(labels)
+        for i in range(1, len(labels)):
+            parent = parents[i]
+            if tree._children[parent] is None:
+                tree._children[parent] = dict()
+            tree._children[parent][tree._labels[i]] = i
+        return tree
+
+    def to_networkx(self) -> nx.DiGraph:
+        """Convert the tree to `networkx.DiGraph`."""
+        graph = nx.DiGraph()
+        keys = self._keys()
+        graph.add_nodes_from((key, dict(NodeAttrs(self, i)))
+                             for i, key in enumerate(keys))
+        graph.add_edges_from((keys[self._parents[i]], keys[i])
+                             for i in range(1, len(keys)))
+        return graph
+
+    @classmethod
+    def from_networkx(cls, graph: nx.DiGraph, root: str, sep='/') -> 'CompactTree':
+        """Build a tree from `networkx.DiGraph`.
+
+        Parameters
+        ----------
+        graph : nx.DiGraph
+            Tree, keys of children start with the key of the parent and `sep`.
+        root : str
+            Root key.
+        sep : str
+            Separator used in keys, by default `/`.
+
+        Returns
+        -------
+        CompactTree
+            Tree.
+        """
+        tree = cls(sep)
+        if root not in graph:
+            return tree
+        tree.add_node(root, **graph.nodes[root])
+        for parent, child in nx.bfs_edges(graph, root):
+            tree.add_edge(parent, child, **graph.nodes[child])
+        return tree
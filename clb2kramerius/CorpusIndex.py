@@ -0,0 +1,451 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import deque
+from typing import Iterator
+import networkx as nx
+from .CompactTree import CompactTree, NO_MODEL, NO_UUID, pack_uuid, unpack_uuid
+from .DwnKramerius import Periodical, load_periodical
+
+# index file: MAGIC, VERSION, number of nodes, length of the header, JSON header,
+# padding to 8 bytes, arrays of nodes sorted by their keys, positions of children
+MAGIC = b'CLBI'
+VERSION = 2
+# key of a node is `per_uuid + KEY_SEP + path`
+KEY_SEP = b'\0'
+NO_PARENT = 0xFFFFFFFF
+
+
+def _padding(pos: int) -> int:
+    return -pos % 8
+
+
+def _typed_view(buf, typecode: str, n: int):
+    """Return `n` little-endian numbers from `buf` without copying if possible."""
+    if sys.byteorder == 'little':
+        return memoryview(buf).cast(typecode)[:n]
+    arr = array(typecode)
+    arr.frombytes(bytes(buf))
+    arr.byteswap()
+    return arr
+
+
+def _to_little_endian(arr: array) -> bytes:
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def build_corpus_index(paths: list[str], out: str) -> None:
+    """Compile downloaded periodicals into one index file (see `CorpusIndex`).
+
+    Parameters
+    ----------
+    paths : list[str]
+        Files saved by `Periodical.save` (any format).
+    out : str
+        Path to the index file.
+    """
+    periodicals = dict()
+    models = []
+    model_codes = dict()
+    # (key, uuid, model code, key of the parent, order among siblings)
+    entries = []
+    for path in paths:
+        try:
+            per = load_periodical(path)
+        except (OSError, ValueError, TypeError, KeyError) as err:
+            logging.error(f'Unable to load `{path}`, skipping it: {err}')
+            continue
+        if per.per_uuid in periodicals:
+            logging.warning(
+                f'Periodical {per.per_uuid} is in the corpus twice, skipping `{path}`')
+            continue
+        periodicals[per.per_uuid] = per._params()
+
+        prefix = per.per_uuid.encode()+KEY_SEP
+        keys = []
+        n_children = dict()
+        for i, (node, attrs) in enumerate(per.tree.nodes(data=True)):
+            keys.append(prefix+node.encode())
+            parent = next(iter(per.tree.predecessors(node)), None)
+            parent_key = None if parent is None else prefix+parent.encode()
+            order = n_children.get(parent_key, 0)
+            n_children[parent_key] = order+1
+
+            model = attrs.get('model')
+            if model is None:
+                code = NO_MODEL
+            else:
+                if model not in model_codes:
+                    model_codes[model] = len(models)
+                    models.append(model)
+                code = model_codes[model]
+            entries.append((keys[i], attrs.get('uuid'),
+                           code, parent_key, order))
+        logging.info(f'Added {len(keys)} nodes of {per}')
+
+    entries.sort(key=lambda entry: entry[0])
+    position = {entry[0]: i for i, entry in enumerate(entries)}
+
+    offsets = array('Q', [0])
+    parents = array('I')
+    codes = bytearray()
+    uuids = bytearray()
+    raw_uuids = dict()
+    # positions of children of every node, in the order of siblings
+    children = [[] for _ in entries]
+    for i, (key, uuid, code, parent_key, order) in enumerate(entries):
+        offsets.append(offsets[-1]+len(key))
+        if parent_key is None:
+            parents.append(NO_PARENT)
+        else:
+            parents.append(position[parent_key])
+            children[position[parent_key]].append((order, i))
+        codes.append(code)
+        packed = None if uuid is None else pack_uuid(uuid)
+        if packed is None:
+            raw_uuids[str(i)] = uuid
+            packed = NO_UUID
+        uuids += packed
+    child_starts = array('I', [0])
+    child_positions = array('I')
+    for siblings in children:
+        siblings.sort()
+        child_positions.extend(i for _, i in siblings)
+        child_starts.append(len(child_positions))
+
+    header = json.dumps({'periodicals': periodicals, 'models': models, 'raw_uuids': raw_uuids},
+                        ensure_ascii=False).encode()
+    start = struct.pack('<BQQI', VERSION, len(entries),
+                        len(child_positions), len(header))
+    pos = len(MAGIC)+len(start)+len(header)
+    parts = [MAGIC, start, header, bytes(_padding(pos))]
+    # 8-byte arrays first, so that all arrays stay aligned
+    for part in [_to_little_endian(offsets), _to_little_endian(parents),
+                 _to_little_endian(child_starts), _to_little_endian(child_positions),
+                 bytes(uuids), bytes(codes)]:
+        parts.append(part)
+    parts.append(b''.join(entry[0] for entry in entries))
+
+    tmp = out+'.tmp'
+    with open(tmp, 'wb') as f:
+        f.writelines(parts)
+    os.replace(tmp, out)
+    logging.info(
+        f'Corpus index `{out}` built ({len(periodicals)} periodicals, {len(entries)} nodes)')
+
+
+class CorpusIndex:
+    """Memory-mapped index of nodes of all downloaded periodicals.
+
+    Built by `build_corpus_index`. Keys `per_uuid + '\\0' + path` are sorted,
+    so a node is found by binary search. Positions of children of every node
+    are stored in the order of siblings, so they are read directly.
+    The file is mapped read-only, worker processes opening the same index
+    share its pages.
+
+    Attributes
+    ----------
+    path : str
+        Path to the index file.
+    periodicals : dict[str, dict]
+        Parameters of periodicals (as saved by `Periodical.save`, without the tree), by `per_uuid`.
+    models : list[str]
+        Models, indexed by their codes.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'`{path}` is not a corpus index')
+        pos = len(MAGIC)
+        version = self._mm[pos]
+        if version != VERSION:
+            raise ValueError(
+                f'Unsupported corpus index version {version}, build the index again')
+        _, n, n_children, header_len = struct.unpack_from('<BQQI', self._mm, pos)
+        pos += struct.calcsize('<BQQI')
+        header = json.loads(self._mm[pos:pos+header_len])
+        pos += header_len
+        pos += _padding(pos)
+
+        self.periodicals = header['periodicals']
+        self.models = header['models']
+        self._raw_uuids = {int(i): uuid for i, uuid in header['raw_uuids'].items()}
+        self._n = n
+        self._offsets = self._view(pos, 'Q', n+1)
+        pos += 8*(n+1)
+        self._parents = self._view(pos, 'I', n)
+        pos += 4*n
+        self._child_starts = self._view(pos, 'I', n+1)
+        pos += 4*(n+1)
+        self._children = self._view(pos, 'I', n_children)
+        pos += 4*n_children
+        self._uuids = memoryview(self._mm)[pos:pos+16*n]
+        pos += 16*n
+        self._codes = memoryview(self._mm)[pos:pos+n]
+        pos += n
+        self._keys_start = pos
+        logging.info(
+            f'Loaded corpus index `{path}` ({len(self.periodicals)} periodicals, {n} nodes)')
+
+    def _view(self, pos: int, typecode: str, n: int):
+        size = array(typecode).itemsize*n
+        return _typed_view(memoryview(self._mm)[pos:pos+size], typecode, n)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _key(self, i: int) -> bytes:
+        return self._mm[self._keys_start+self._offsets[i]:self._keys_start+self._offsets[i+1]]
+
+    def _bisect(self, key: bytes, lo=0) -> int:
+        """Return the position of the first key not smaller than `key`."""
+        hi = self._n
+        while lo < hi:
+            mid = (lo+hi)//2
+            if self._key(mid) < key:
+                lo = mid+1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, per_uuid: str, path: str) -> int | None:
+        key = per_uuid.encode()+KEY_SEP+path.encode()
+        i = self._bisect(key)
+        if i < self._n and self._key(i) == key:
+            return i
+        return None
+
+    def _attrs(self, i: int) -> dict[str, str]:
+        attrs = dict()
+        if self._codes[i] != NO_MODEL:
+            attrs['model'] = self.models[self._codes[i]]
+        if i in self._raw_uuids:
+            if self._raw_uuids[i] is not None:
+                attrs['uuid'] = self._raw_uuids[i]
+        else:
+            attrs['uuid'] = unpack_uuid(bytes(self._uuids[16*i:16*i+16]))
+        return attrs
+
+    def lookup(self, per_uuid: str, path: str) -> dict[str, str] | None:
+        """Return attributes (`model`, `uuid`) of a node.
+
+        Parameters
+        ----------
+        per_uuid : str
+            UUID of the periodical.
+        path : str
+            Key of the node in the tree of the periodical.
+
+        Returns
+        -------
+        dict[str, str] | None
+            Attributes of the node, `None` if there is no such node.
+        """
+        i = self._find(per_uuid, path)
+        return None if i is None else self._attrs(i)
+
+    def successors(self, per_uuid: str, path: str) -> list[str]:
+        """Return keys of children of a node, in the order of Kramerius.
+
+        Parameters
+        ----------
+        per_uuid : str
+            UUID of the periodical.
+        path : str
+            Key of the node in the tree of the periodical.
+
+        Returns
+        -------
+        list[str]
+            Keys of children of the node.
+
+        Raises
+        ------
+        KeyError
+            There is no such node.
+        """
+        i = self._find(per_uuid, path)
+        if i is None:
+            raise KeyError(path)
+        start = len(per_uuid.encode()+KEY_SEP)
+        return [self._key(j)[start:].decode()
+                for j in self._children[self._child_starts[i]:self._child_starts[i+1]]]
+
+    def out_degree(self, per_uuid: str, path: str) -> int:
+        """Return the number of children of a node.
+
+        Raises
+        ------
+        KeyError
+            There is no such node.
+        """
+        i = self._find(per_uuid, path)
+        if i is None:
+            raise KeyError(path)
+        return self._child_starts[i+1]-self._child_starts[i]
+
+    def predecessor(self, per_uuid: str, path: str) -> str | None:
+        """Return the key of the parent of a node, `None` for the root.
+
+        Raises
+        ------
+        KeyError
+            There is no such node.
+        """
+        i = self._find(per_uuid, path)
+        if i is None:
+            raise KeyError(path)
+        if self._parents[i] == NO_PARENT:
+            return None
+        return self._key(self._parents[i])[len(per_uuid.encode()+KEY_SEP):].decode()
+
+    def count_nodes(self, per_uuid: str) -> int:
+        """Return the number of nodes of a periodical."""
+        prefix = per_uuid.encode()+KEY_SEP
+        return self._bisect(prefix[:-1]+bytes([KEY_SEP[0]+1])) - self._bisect(prefix)
+
+    def tree(self, per_uuid: str) -> 'IndexTree':
+        """Return a read-only view of the tree of a periodical."""
+        if per_uuid not in self.periodicals:
+            raise KeyError(per_uuid)
+        return IndexTree(self, per_uuid)
+
+    def periodical(self, per_uuid: str) -> Periodical:
+        """Return a periodical with its tree backed by the index.
+
+        Parameters
+        ----------
+        per_uuid : str
+            UUID of the periodical.
+
+        Returns
+        -------
+        Periodical
+            Periodical, its `tree` is an `IndexTree`.
+        """
+        return Periodical(tree=self.tree(per_uuid), **self.periodicals[per_uuid])
+
+    def close(self) -> None:
+        """Unmap the index file."""
+        for view in [self._offsets, self._parents, self._child_starts, self._children, self._uuids, self._codes]:
+            if isinstance(view, memoryview):
+                view.release()
+        self._mm.close()
+
+
+class NodeLookup:
+    """`tree.nodes` of `IndexTree`.
+
+    `tree.nodes[key]` returns attributes of a node,
+    `tree.nodes(data=True)` iterates over pairs of keys and attributes.
+    """
+    __slots__ = ('_tree',)
+
+    def __init__(self, tree: 'IndexTree') -> None:
+        self._tree = tree
+
+    def __getitem__(self, key: str) -> dict[str, str]:
+        attrs = self._tree.index.lookup(self._tree.per_uuid, key)
+        if attrs is None:
+            raise KeyError(key)
+        return attrs
+
+    def __call__(self, data=False) -> Iterator:
+        if not data:
+            return iter(self._tree)
+        return ((key, self[key]) for key in self._tree)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tree)
+
+    def __len__(self) -> int:
+        return len(self._tree)
+
+    def __contains__(self, key: str) -> bool:
+        return self._tree.index._find(self._tree.per_uuid, key) is not None
+
+
+class IndexTree:
+    """Read-only tree of one periodical in `CorpusIndex`.
+
+    Implements the read-only subset of `CompactTree`:
+    `nodes`, `successors`, `predecessors`, `out_degree`, `bfs_edges`,
+    `tree_data`, `to_networkx`, iteration, `in` and `len`.
+    """
+
+    def __init__(self, index: CorpusIndex, per_uuid: str) -> None:
+        self.index = index
+        self.per_uuid = per_uuid
+        params = index.periodicals[per_uuid]
+        self.root_id = params['root_id']
+        self.sep = params['id_sep']
+        self.nodes = NodeLookup(self)
+
+    def __len__(self) -> int:
+        return self.index.count_nodes(self.per_uuid)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over keys of nodes, parents before their children."""
+        if self.root_id not in self:
+            return
+        yield self.root_id
+        for _, child in self.bfs_edges(self.root_id):
+            yield child
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.nodes
+
+    def number_of_nodes(self) -> int:
+        return len(self)
+
+    def number_of_edges(self) -> int:
+        return max(len(self)-1, 0)
+
+    def successors(self, key: str) -> Iterator[str]:
+        return iter(self.index.successors(self.per_uuid, key))
+
+    def predecessors(self, key: str) -> Iterator[str]:
+        parent = self.index.predecessor(self.per_uuid, key)
+        return iter(() if parent is None else (parent,))
+
+    def out_degree(self, key: str) -> int:
+        return self.index.out_degree(self.per_uuid, key)
+
+    def bfs_edges(self, source: str) -> Iterator[tuple[str, str]]:
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            for child in self.index.successors(self.per_uuid, node):
+                yield node, child
+                queue.append(child)
+
+    def tree_data(self, root: str) -> dict:
+        """Return the subtree of `root` in the format of `networkx.tree_data`."""
+        return self.to_compact(root).tree_data(root)
+
+    def to_networkx(self) -> nx.DiGraph:
+        """Convert the tree to `networkx.DiGraph`."""
+        return self.to_compact().to_networkx()
+
+    def to_compact(self, root: str | None = None) -> CompactTree:
+        """Copy the tree (or the subtree of `root`) to a `CompactTree`."""
+        root = self.root_id if root is None else root
+        tree = CompactTree(self.sep)
+        tree.add_node(root, **self.nodes[root])
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for child in self.index.successors(self.per_uuid, node):
+                tree.add_edge(node, child, **self.nodes[child])
+                stack.append(child)
+        return tree
@@ -3,11 +3,25 @@ import json
 import logging
 from enum import Enum
 import requests as req
-from requests.adapters import HTTPAdapter, Retry
+from requests.adapters import HTTPAdapter
 import csv
 from tqdm import tqdm
 import os
-from .Parse773 import normalize, parse_location
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from urllib.parse import quote, urlparse
+import time
+import random
+from dataclasses import dataclass
+from typing import Any, Iterator, Iterable
+from .Parse773 import normalize, normalize_title, parse_location
+from .ResponseCache import ResponseCache, CacheMiss
+from .Journal import Journal
+from .RateLimit import get_limiter
+from .CompactTree import CompactTree
+from .TreeStore import save_compact, load_tree, decompress, is_compact
+from .Metrics import Metrics
+from .ArticleIndex import DUPLICATE_SUFFIX
 
 
 class Library(Enum):
@@ -46,6 +60,44 @@ class Library(Enum):
     MLP = 'mlp'  # Městská knihovna v Praze
 
 
+class KramRequestError(Exception):
+    """Request to Kramerius API failed (even after retries).
+
+    Attributes
+    ----------
+    url : str
+        Request URL.
+    reason : str
+        Why the request failed.
+    """
+
+    def __init__(self, url: str, reason) -> None:
+        self.url = url
+        self.reason = str(reason)
+        super().__init__(f'Request `{url}` failed: {self.reason}')
+
+
+@dataclass
+class FailedRequest:
+    """A node whose children could not be downloaded.
+
+    Attributes
+    ----------
+    uuid : str
+        UUID of the node.
+    model : str
+        `model` parameter of the node.
+    key : str
+        Key to the node in the tree.
+    error : str
+        Why the request failed.
+    """
+    uuid: str
+    model: str
+    key: str
+    error: str
+
+
 class KramVer(Enum):
     """Kramerius (API) version.
 
@@ -58,6 +110,47 @@ class KramVer(Enum):
     V5 = '5'
 
 
+class DwnMode(Enum):
+    """Mode of downloading a tree from Kramerius.
+
+    Parameters
+    ----------
+    Enum : str
+        `dfs` (recursive, one request at a time),
+        `bfs` (level by level, concurrent requests)
+        `root_pid` (whole tree at once, Kramerius 7 only, otherwise `dfs`)
+        or `clb` (only volumes and issues of the ČLB tree, see `Periodical.build_clb_tree`).
+    """
+    DFS = 'dfs'
+    BFS = 'bfs'
+    ROOT_PID = 'root_pid'
+    CLB = 'clb'
+
+
+# issue number of ČLB records without an issue (see `Periodical.build_clb_tree`)
+NO_ISSUE = 'NO_ISSUE'
+# maximal number of concurrent requests to a library (`bfs` mode)
+DEFAULT_WORKERS = 4
+LIBRARY_WORKERS = {
+    Library.MZK.value: 8,
+    Library.NKP.value: 2,  # kramerius5.nkp.cz is slow and unreliable
+}
+
+
+class TreeFormat(Enum):
+    """Formats of saved periodicals.
+
+    Attributes
+    ----------
+    JSON : str
+        `tree_data` from networkx with parameters of the periodical.
+    COMPACT : str
+        Binary format with interned models and 16-byte UUIDs, see `TreeStore`.
+    """
+    JSON = 'json'
+    COMPACT = 'compact'
+
+
 class KramAPIBase():
     """Base class for Kramerius API.
 
@@ -68,7 +161,7 @@ class KramAPIBase():
         Kramerius API URL. It should not end with `/`.
     sep : str
         Separator used in keys when downloading from Kramerius. By default `/`.
-    tree : nx.DiGraph()
+    tree : CompactTree
         The tree of the digited periodical.
         Keys are made by concatenating volume/issue/page number.
     INFO : str
@@ -86,10 +179,45 @@ class KramAPIBase():
         Save to disk after compeleting a download of a volume. By default `False`.
     tmp_file : str
         File to save partially downloaded tree.
+    journal : Journal
+        Append-only journal of downloaded children, saved to `tmp_file`.
     root_id : str
         Root ID, usually `root`.
     downloaded_vols : set[str]
-        UUIDs of already downloaded volumes.
+        UUIDs of volumes to skip (eg. when updating a tree).
+    done_parents : set[str]
+        Keys of nodes whose children are completely downloaded (from `journal`).
+    workers : int
+        Maximal number of concurrent requests (`bfs` only). By default `1`.
+    BATCH_SIZE : int
+        Number of parents whose children are requested at once (`bfs` only).
+    cache : ResponseCache | None
+        Cache of responses. By default `None`, i.e. no caching.
+    limiter : AdaptiveLimiter
+        Rate and concurrency limiter of the API host, shared within the process.
+    THROTTLE_CODES : set[int]
+        Status codes meaning the host is overloaded (server errors do too).
+    RETRY_CODES : set[int]
+        Status codes of failed requests that are tried again.
+    MAX_ATTEMPTS : int
+        Maximal number of attempts to make a request.
+    BACKOFF : float
+        Base delay between attempts in seconds, doubled after every attempt.
+    failed : list[FailedRequest]
+        Nodes whose children could not be downloaded.
+    articles : bool
+        Download `article` nodes (see `set_articles`). By default `False`.
+    skipped_articles : int
+        Number of `article` nodes skipped because `articles` is not set.
+    FOSTER_PARENTS : str
+        Field of a page with UUIDs of articles on the page.
+    MODIFIED : str | None
+        Field of a child with its modification date, `None` if the API does not return it.
+    DATED_MODELS : set[str]
+        Models whose modification dates are kept in `tree` (attribute `modified`),
+        see `Periodical.update`.
+    metrics : Metrics | None
+        Metrics of requests and downloaded nodes (see `set_metrics`). By default `None`.
     """
     INFO: str
     VER: KramVer
@@ -99,17 +227,34 @@ class KramAPIBase():
     tmp_file: str
     root_id: str
     downloaded_vols: set = set()
-
-    def __init__(self, url: str, sep='/') -> None:
+    done_parents: set = set()
+    workers: int = 1
+    BATCH_SIZE: int = 1
+    articles: bool = False
+    skipped_articles: int = 0
+    FOSTER_PARENTS = 'foster_parents.pids'
+    MODIFIED: str | None = None
+    DATED_MODELS = {'periodicalvolume', 'periodicalitem'}
+    metrics: Metrics | None = None
+    THROTTLE_CODES = {429, 503}
+    # https://developer.mozilla.org/en-US/docs/Web/HTTP/Reference/Status#server_error_responses
+    RETRY_CODES = {429, 500, 502, 503, 504}
+    MAX_ATTEMPTS = 6
+    BACKOFF = 1.0
+
+    def __init__(self, url: str, sep='/', cache: ResponseCache | None = None) -> None:
         self.url = url
         self.sep = sep
-        self.tree = nx.DiGraph()
+        self.cache = cache
+        self.limiter = get_limiter(urlparse(url).netloc)
+        self.tree = CompactTree(sep)
+        self.failed = []
         self.session = req.Session()
-        # https://developer.mozilla.org/en-US/docs/Web/HTTP/Reference/Status#server_error_responses
-        retries = Retry(total=5, backoff_factor=1,
-                        status_forcelist=[500, 502, 503, 504])
-        # https://stackoverflow.com/questions/23267409/how-to-implement-retry-mechanism-into-python-requests-library
-        self.session.mount('https://', HTTPAdapter(max_retries=retries))
+        # retries are made in `get_response`, so that `limiter` sees every attempt
+        self.session.mount('https://', HTTPAdapter())
+        if self.cache is not None and self.cache.offline:
+            logging.info('Offline mode, skipping checks of the API')
+            return
         self._check_version()
         self._check_url()
 
@@ -139,6 +284,12 @@ class KramAPIBase():
     def get_response(self, url: str) -> req.Response:
         """Return response from a request.
 
+        If `cache` is set, the response is served from the cache when possible
+        and successful responses are saved to it.
+        Requests to the API host are limited by `limiter`.
+        Failed requests (request errors, `RETRY_CODES`) are tried again
+        at most `MAX_ATTEMPTS` times with exponential backoff and random jitter.
+
         Parameters
         ----------
         url : str
@@ -151,11 +302,138 @@ class KramAPIBase():
 
         Raises
         ------
-        req.exceptions.ConnectionError
-            Response raises ConnectionError.
+        KramRequestError
+            The request failed even after retries,
+            it returned a client error (4xx)
+            or it is not cached and the cache is offline.
+        """
+        return self._get(url, decode=False)
+
+    def get_json(self, url: str) -> Any:
+        """Return decoded JSON from a request.
+
+        Same as `get_response`, responses that are not valid JSON
+        (e.g. truncated) are tried again as well.
+
+        Parameters
+        ----------
+        url : str
+            URL to API.
+
+        Returns
+        -------
+        Any
+            Decoded JSON of the response.
 
-        req.exceptions.Timeout
-            Connection times out.
+        Raises
+        ------
+        KramRequestError
+            The request failed even after retries,
+            it returned a client error (4xx)
+            or it is not cached and the cache is offline.
+        """
+        return self._get(url, decode=True)
+
+    def _get(self, url: str, decode: bool) -> Any:
+        """Make a request with retries, see `get_response` and `get_json`.
+
+        Parameters
+        ----------
+        url : str
+            URL to API.
+        decode : bool
+            Decode JSON of the response and return it instead of the response.
+
+        Returns
+        -------
+        Any
+            Response object or its decoded JSON.
+
+        Raises
+        ------
+        KramRequestError
+            The request failed.
+        """
+        if self.cache is not None:
+            try:
+                content = self.cache.get(url)
+            except CacheMiss as err:
+                logging.error(err)
+                raise KramRequestError(url, err)
+            if self.metrics is not None:
+                self.metrics.add_event(
+                    url, 'cache_misses' if content is None else 'cache_hits')
+            if content is not None:
+                resp = self._make_cached_response(url, content)
+                if not decode:
+                    return resp
+                try:
+                    return resp.json()
+                except ValueError as err:
+                    logging.warning(f'Cached response of `{url}` is not valid JSON: {err}')
+                    if self.cache.offline:
+                        raise KramRequestError(url, err)
+
+        reason = None
+        for attempt in range(self.MAX_ATTEMPTS):
+            if attempt > 0:
+                delay = self.BACKOFF * 2**(attempt-1) * random.uniform(0.5, 1.5)
+                logging.warning(
+                    f'Trying `{url}` again in {delay:.1f} s ({attempt}/{self.MAX_ATTEMPTS-1}): {reason}')
+                if self.metrics is not None:
+                    self.metrics.add_event(url, 'retries')
+                time.sleep(delay)
+
+            try:
+                resp = self._request(url)
+            except req.RequestException as err:
+                # connection errors, timeouts, broken chunked responses, redirect loops
+                reason = err
+                if self.metrics is not None:
+                    self.metrics.add_event(url, 'errors')
+                continue
+            if resp.status_code in self.RETRY_CODES:
+                reason = f'status code {resp.status_code}'
+                continue
+
+            try:
+                resp.raise_for_status()
+            except req.HTTPError as err:
+                logging.error(err)
+                if self.metrics is not None:
+                    self.metrics.add_event(url, 'failures')
+                raise KramRequestError(url, err)
+
+            if decode:
+                try:
+                    data = resp.json()
+                except ValueError as err:
+                    reason = f'invalid JSON: {err}'
+                    if self.metrics is not None:
+                        self.metrics.add_event(url, 'errors')
+                    continue
+
+            if self.cache is not None:
+                self.cache.put(url, resp.content)
+            return data if decode else resp
+
+        logging.error(f'Request `{url}` failed: {reason}')
+        if self.metrics is not None:
+            self.metrics.add_event(url, 'failures')
+        raise KramRequestError(url, reason)
+
+    def _request(self, url: str) -> req.Response:
+        """Make a single request, limited by `limiter`.
+
+        Parameters
+        ----------
+        url : str
+            URL to API.
+
+        Returns
+        -------
+        req.Response
+            Response object.
         """
         logging.debug(f'Trying url {url}')
         headers = {
@@ -164,19 +442,43 @@ class KramAPIBase():
             'Accept-Language': 'en-US,en;q=0.5',
             'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:140.0) Gecko/20100101 Firefox/140.0',
             'Content-Type': 'application/json'}
-        try:
-            resp = self.session.get(url, headers=headers, timeout=40)
-            resp.raise_for_status()
-        except req.HTTPError as err:
-            logging.error(err)
-            raise SystemExit(err)
-        except req.exceptions.ConnectionError as err:
-            logging.error(err)
-            raise SystemExit(err)
-        except req.exceptions.Timeout as err:
-            logging.error(err)
-            raise SystemExit(err)
+        with self.limiter.slot():
+            start = time.monotonic()
+            try:
+                resp = self.session.get(url, headers=headers, timeout=40)
+            except (req.exceptions.ConnectionError, req.exceptions.Timeout):
+                self.limiter.failure()
+                raise
+            elapsed = time.monotonic()-start
+            if resp.status_code in self.THROTTLE_CODES or resp.status_code >= 500:
+                self.limiter.failure()
+            else:
+                self.limiter.success(elapsed)
+        if self.metrics is not None:
+            self.metrics.observe_request(
+                url, elapsed, len(resp.content), resp.status_code)
+        return resp
 
+    def _make_cached_response(self, url: str, content: bytes) -> req.Response:
+        """Make a response object from a cached content.
+
+        Parameters
+        ----------
+        url : str
+            Request URL.
+        content : bytes
+            Cached content of the response.
+
+        Returns
+        -------
+        req.Response
+            Response object.
+        """
+        resp = req.Response()
+        resp.url = url
+        resp.status_code = 200
+        resp.encoding = 'utf-8'
+        resp._content = content
         return resp
 
     def _check_version(self) -> None:
@@ -213,6 +515,232 @@ class KramAPIBase():
     def _find_node_details(self, node):
         raise NotImplementedError("Subclass needs to define this.")
 
+    def _iter_children(self, uuid: str) -> Iterator[dict]:
+        """Yield children of a given UUID.
+
+        By default, all children are requested at once.
+        Subclasses can request them in pages.
+
+        Parameters
+        ----------
+        uuid : str
+            UUID.
+
+        Yields
+        ------
+        dict
+            Children as returned by `_find_children`.
+        """
+        return iter(self._find_children(uuid))
+
+    def _find_children_batch(self, uuids: list[str]) -> dict[str, list[dict]]:
+        """Find children of several UUIDs.
+
+        By default, children of every UUID are requested separately.
+        Subclasses can request them at once.
+
+        Parameters
+        ----------
+        uuids : list[str]
+            UUIDs of parents.
+
+        Returns
+        -------
+        dict[str, list[dict]]
+            Children (as returned by `_find_children`) of every UUID.
+        """
+        return {uuid: self._find_children(uuid) for uuid in uuids}
+
+    def _add_child(self, par_id: str, model: str, child: dict) -> tuple[str, str, str] | None:
+        """Add a child (as returned by `_find_children`) to `tree`.
+
+        Children that are already downloaded volumes are skipped,
+        so are articles unless `articles` is set.
+
+        Parameters
+        ----------
+        par_id : str
+            Key to the parent node.
+        model : str
+            `model` parameter of the parent node.
+        child : dict
+            Child as returned by `_find_children`.
+
+        Returns
+        -------
+        tuple[str, str, str] | None
+            UUID, model and key of the added child,
+            `None` if the child was skipped.
+        """
+        child_uuid = child['pid']
+        child_model, child_title = self._find_node_details(child)
+        child_id = par_id + self.sep + child_title
+        if child_model == 'article' and not self.articles:
+            logging.debug(f'Skipping article `{child_id}` ({child_uuid})')
+            self.skipped_articles += 1
+            return None
+        if child_uuid in self.downloaded_vols:
+            logging.info(
+                f'Skipping downloaded volume `{child_id}` ({child_uuid})')
+            return None
+        if child_model == 'article':
+            child_id = self._unique_article_id(child_id, child_uuid)
+
+        self.tree.add_edge(par_id, child_id)
+        self.tree.nodes[child_id]['model'] = child_model
+        self.tree.nodes[child_id]['uuid'] = child_uuid
+        modified = self._find_node_modified(child)
+        if modified is not None and child_model in self.DATED_MODELS:
+            self.tree.nodes[child_id]['modified'] = modified
+
+        logging.info(
+            f"Adding edge between `{par_id}` and `{child_id}` ({model}--{child_model})")
+        return (child_uuid, child_model, child_id)
+
+    def _find_node_modified(self, node: dict) -> str | None:
+        """Return the modification date of a child (as returned by `_find_children`).
+
+        Parameters
+        ----------
+        node : dict
+            Child as returned by `_find_children`.
+
+        Returns
+        -------
+        str | None
+            Modification date, `None` if it is unknown.
+        """
+        if self.MODIFIED is None:
+            return None
+        return node.get(self.MODIFIED)
+
+    def _unique_article_id(self, child_id: str, child_uuid: str) -> str:
+        """Return a key of an article that no other node uses.
+
+        Sibling articles can have the same title (eg. `Zprávy`).
+        Keys of the later ones end with `DUPLICATE_SUFFIX`,
+        so that they are not merged into one node.
+
+        Parameters
+        ----------
+        child_id : str
+            Key made from the title of the article.
+        child_uuid : str
+            UUID of the article.
+
+        Returns
+        -------
+        str
+            Key to the article.
+        """
+        key = child_id
+        n = 1
+        while key in self.tree and self.tree.nodes[key].get('uuid') != child_uuid:
+            n += 1
+            key = child_id+DUPLICATE_SUFFIX.format(n)
+        if key != child_id:
+            logging.info(
+                f'Article `{child_id}` ({child_uuid}) has the same title as its sibling, using `{key}`')
+        return key
+
+    def _add_children(self, par_id: str, model: str, children: Iterable[dict], complete=True) -> list[tuple[str, str, str]]:
+        """Add children of a node to `tree`.
+
+        If partial saving is enabled, the children are committed to `journal`
+        once all of them are added. Only complete listings mark the parent
+        as done, so that resumed downloads request children of the others again.
+        Skipped articles are recorded, so that the listing is requested again
+        by a resumed download with `articles` set (see `_load_partial_tree`).
+
+        Parameters
+        ----------
+        par_id : str
+            Key to the parent node.
+        model : str
+            `model` parameter of the parent node.
+        children : Iterable[dict]
+            Children as returned by `_find_children`.
+        complete : bool
+            `children` are all children of the node, by default `True`.
+            `False` if some of them were filtered out (eg. by `dfs_with_clb_tree`).
+
+        Returns
+        -------
+        list[tuple[str, str, str]]
+            UUIDs, models and keys of the added children.
+        """
+        added = []
+        page_refs = dict()
+        skipped_articles = self.skipped_articles
+        for child in children:
+            self._collect_page_refs(child, page_refs)
+            child_added = self._add_child(par_id, model, child)
+            if child_added is not None:
+                added.append(child_added)
+        self._set_page_refs(added, page_refs)
+        filtered = ['article'] if self.skipped_articles > skipped_articles else None
+
+        if len(added) > 0:  # we could also check that model == 'page' or 'article'
+            logging.info(
+                f'Found {len(added)} children of {model} `{par_id}`')
+            if self.metrics is not None:
+                self.metrics.add_nodes(len(added))
+        if self.save_part:
+            # nodes without children are committed too, so that they are not requested again
+            self.journal.append([(par_id, child_id, self.tree.nodes[child_id])
+                                 for _, _, child_id in added], par_id, complete, filtered)
+        return added
+
+    def _collect_page_refs(self, child: dict, page_refs: dict[str, list[str]]) -> None:
+        """Collect articles a page child is on (`isOnPage` of the articles).
+
+        Pages are children of issues, articles only refer to them.
+        Kramerius 7 returns the articles as foster parents of the page
+        (`FOSTER_PARENTS`), other children are ignored.
+
+        Parameters
+        ----------
+        child : dict
+            Child as returned by `_find_children`.
+        page_refs : dict[str, list[str]]
+            UUIDs of pages by UUIDs of articles, updated in place.
+        """
+        for article_uuid in child.get(self.FOSTER_PARENTS, ()):
+            page_refs.setdefault(article_uuid, []).append(child['pid'])
+
+    def _set_page_refs(self, added: list[tuple[str, str, str]], page_refs: dict[str, list[str]]) -> None:
+        """Set the `pages` attribute (UUIDs of pages) of added articles.
+
+        Parameters
+        ----------
+        added : list[tuple[str, str, str]]
+            UUIDs, models and keys of added children.
+        page_refs : dict[str, list[str]]
+            UUIDs of pages by UUIDs of articles (see `_collect_page_refs`).
+        """
+        if len(page_refs) == 0:
+            return
+        for child_uuid, child_model, child_id in added:
+            if child_model == 'article' and child_uuid in page_refs:
+                self.tree.nodes[child_id]['pages'] = page_refs[child_uuid]
+
+    def _stored_children(self, par_id: str) -> list[tuple[str, str, str]]:
+        """Return already downloaded children of a node.
+
+        Parameters
+        ----------
+        par_id : str
+            Key to the parent node.
+
+        Returns
+        -------
+        list[tuple[str, str, str]]
+            UUIDs, models and keys of the children.
+        """
+        logging.info(f'Children of `{par_id}` already downloaded')
+        return [(self.tree.nodes[child]['uuid'], self.tree.nodes[child]['model'], child)
+                for child in self.tree.successors(par_id)]
+
     def dfs(self, parent_uuid: str, model: str, par_id: str) -> None:
         """Perform DFS to find children.
 
@@ -229,72 +757,262 @@ class KramAPIBase():
             Key to the parent node.
             Keys are made by concatenating volume/issue/page number.
         """
-        children = self._find_children(parent_uuid)
+        if par_id in self.done_parents:
+            children = self._stored_children(par_id)
+        else:
+            try:
+                # children are added to the tree as they arrive
+                children = self._add_children(
+                    par_id, model, self._iter_children(parent_uuid))
+            except KramRequestError as err:
+                self._add_failure(parent_uuid, model, par_id, err)
+                return
+
+        for child_uuid, child_model, child_id in children:
+            self.dfs(child_uuid, child_model, child_id)
+            if self.prog_bar and child_model == 'periodicalvolume':  # TODO: try to think of a more robust check
+                self.progress_bar.update(1)
+        return
 
-        if len(children) == 0:
-            return  # we could also check that model == 'page' or 'article'
+    def bfs(self, parent_uuid: str, model: str, par_id: str) -> None:
+        """Perform BFS to find children, one tree level at a time.
 
-        logging.info(
-            f'Found {len(children)} children of {model} `{par_id}` ({parent_uuid})')
-        for child in children:
-            child_uuid = child['pid']
-            child_model, child_title = self._find_node_details(child)
-            child_id = par_id + self.sep + child_title
-            if child_uuid in self.downloaded_vols:
-                logging.info(
-                    f'Skipping downloaded volume `{child_id}` ({child_uuid})')
-                continue
+        Children of all nodes in a level are requested concurrently
+        in batches of `BATCH_SIZE` parents, with at most `workers` requests in flight.
+        The resulting tree is the same as the one built by `dfs`.
 
-            self.tree.add_edge(par_id, child_id)
-            self.tree.nodes[child_id]['model'] = child_model
-            self.tree.nodes[child_id]['uuid'] = child_uuid
+        Volumes (= children of `par_id`) are considered downloaded
+        once none of their nodes wait for a request.
+        Children of nodes in `done_parents` are not requested again.
 
-            logging.info(
-                f"Adding edge between `{par_id}` and `{child_id}` ({model}--{child_model})")
+        Parameters
+        ----------
+        parent_uuid : str
+            UUID of the parent node.
+        model : str
+            `model` parameter of the parent node.
+        par_id : str
+            Key to the parent node.
+            Keys are made by concatenating volume/issue/page number.
+        """
+        # nodes to be expanded: (uuid, model, key, key of its volume)
+        frontier = [(parent_uuid, model, par_id, None)]
+        active_vols = set()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while len(frontier) > 0:
+                to_request = [node[0] for node in frontier
+                              if node[2] not in self.done_parents]
+                if self.metrics is not None:
+                    self.metrics.set_queue_depth(len(to_request))
+                logging.info(f'Requesting children of {len(to_request)} nodes')
+                batches = [to_request[i:i+self.BATCH_SIZE]
+                           for i in range(0, len(to_request), self.BATCH_SIZE)]
+                results = {}
+                for batch, found in zip(batches, pool.map(self._try_find_children_batch, batches)):
+                    if isinstance(found, KramRequestError):
+                        failed = set(batch)
+                        for node in frontier:
+                            if node[0] in failed:
+                                self._add_failure(node[0], node[1], node[2], found)
+                        continue
+                    results.update(found)
+
+                next_frontier = []
+                for node_uuid, node_model, node_id, vol_id in frontier:
+                    if node_id in self.done_parents:
+                        children = self._stored_children(node_id)
+                    elif node_uuid not in results:
+                        continue  # request failed
+                    else:
+                        children = self._add_children(
+                            node_id, node_model, results[node_uuid])
+
+                    for child_uuid, child_model, child_id in children:
+                        child_vol = child_id if vol_id is None else vol_id
+                        active_vols.add(child_vol)
+                        next_frontier.append(
+                            (child_uuid, child_model, child_id, child_vol))
+
+                frontier = next_frontier
+                finished_vols = active_vols - {node[3] for node in frontier}
+                active_vols -= finished_vols
+                self._finish_vols(finished_vols)
+        return
 
-            self.dfs(child_uuid, child_model, child_id)
-            if self.prog_bar and child_model == 'periodicalvolume':  # TODO: try to think of a more robust check
-                self.progress_bar.update(1)
-            if self.save_part and child_model == 'periodicalvolume':
-                self.save_tree(self.tmp_file)
+    def _try_find_children_batch(self, uuids: list[str]) -> dict[str, list[dict]] | KramRequestError:
+        """Find children of several UUIDs, return the error if the request fails.
+
+        Parameters
+        ----------
+        uuids : list[str]
+            UUIDs of parents.
+
+        Returns
+        -------
+        dict[str, list[dict]] | KramRequestError
+            Children (as returned by `_find_children`) of every UUID or the error.
+        """
+        try:
+            return self._find_children_batch(uuids)
+        except KramRequestError as err:
+            return err
+
+    def _add_failure(self, uuid: str, model: str, key: str, err: KramRequestError) -> None:
+        """Add a node whose children could not be downloaded to `failed`.
+
+        Parameters
+        ----------
+        uuid : str
+            UUID of the node.
+        model : str
+            `model` parameter of the node.
+        key : str
+            Key to the node.
+        err : KramRequestError
+            The error.
+        """
+        logging.error(f'Unable to download children of `{key}` ({uuid}): {err.reason}')
+        self.failed.append(FailedRequest(uuid, model, key, err.reason))
+
+    def retry_failed(self) -> list[FailedRequest]:
+        """Try downloading subtrees of nodes in `failed` again.
+
+        Returns
+        -------
+        list[FailedRequest]
+            Nodes that failed again.
+        """
+        to_retry = self.failed
+        self.failed = []
+        if len(to_retry) > 0:
+            logging.info(f'Trying {len(to_retry)} failed nodes again')
+        for node in to_retry:
+            self.dfs(node.uuid, node.model, node.key)
+        return self.failed
+
+    def fetch_whole_tree(self, parent_uuid: str, model: str, par_id: str) -> bool:
+        """Download the whole tree at once.
+
+        Not every Kramerius version supports this,
+        by default nothing is downloaded.
+
+        Parameters
+        ----------
+        parent_uuid : str
+            UUID of the root node.
+        model : str
+            `model` parameter of the root node.
+        par_id : str
+            Key to the root node.
+
+        Returns
+        -------
+        bool
+            `True` if the tree was downloaded, `False` otherwise.
+        """
+        logging.warning(
+            f'Kramerius {self.VER.value} does not support downloading the whole tree at once')
+        return False
+
+    def _build_tree(self, parent_uuid: str, model: str, par_id: str, children: dict[str, list[dict]]) -> None:
+        """Build `tree` from already downloaded children.
+
+        Parameters
+        ----------
+        parent_uuid : str
+            UUID of the root node.
+        model : str
+            `model` parameter of the root node.
+        par_id : str
+            Key to the root node.
+        children : dict[str, list[dict]]
+            Ordered children (as returned by `_find_children`) of every UUID.
+        """
+        queue = deque([(parent_uuid, model, par_id)])
+        while len(queue) > 0:
+            node_uuid, node_model, node_id = queue.popleft()
+            page_refs = dict()
+            siblings = []
+            for child in children.get(node_uuid, []):
+                self._collect_page_refs(child, page_refs)
+                added = self._add_child(node_id, node_model, child)
+                if added is None:
+                    continue
+                siblings.append(added)
+                queue.append(added)
+                if self.metrics is not None:
+                    self.metrics.add_nodes(1)
+                if self.prog_bar and node_id == par_id:
+                    self.progress_bar.update(1)
+            self._set_page_refs(siblings, page_refs)
+        return
+
+    def _finish_vols(self, vol_ids: set[str]) -> None:
+        """Update the progress bar after volumes are downloaded.
+
+        Parameters
+        ----------
+        vol_ids : set[str]
+            Keys of volumes whose download has just finished.
+        """
+        if self.prog_bar:
+            self.progress_bar.update(len(vol_ids))
         return
 
     def _load_partial_tree(self) -> None:
-        """Load a partially downloaded tree from `tmp_file`.
+        """Load a partially downloaded tree from `journal`.
 
         If no file is found, do nothing.
+        If `articles` is set, nodes whose articles were skipped are not done.
+        A tree saved by older versions is converted first (see `_convert_legacy_tree`).
         """
+        if not os.path.exists(self.tmp_file):
+            self._convert_legacy_tree()
+        wanted = {'article'} if self.articles else set()
         try:
-            with open(self.tmp_file) as f:
-                json_tree = json.load(f)
+            self.tree, commits = self.journal.replay(
+                CompactTree(self.sep), wanted)
+            self.done_parents = set(commits)
             logging.info(
-                f'Loading partially downloaded tree from `{self.tmp_file}`')
-            self.tree = nx.tree_graph(json_tree)
+                f'Loaded partially downloaded tree from `{self.tmp_file}` ({len(self.done_parents)} nodes done)')
         except FileNotFoundError:
             logging.info(
                 f'No file with partial downloads found')
         return
 
-    def _get_downloaded_vols(self) -> None:
-        """Find volumes (i.e. children of `root`) in  `tree`.
+    def _convert_legacy_tree(self) -> None:
+        """Convert a partially downloaded tree saved by older versions to `journal`.
 
-        Save UUIDs of these volumes to `downloaed_vols` in the form `set[str]`.
+        Older versions saved the whole tree (`tree_data` format) to a `.json` file
+        instead of the `.jsonl` journal, after every downloaded volume.
+        So the volumes are done, but the root is not.
+        Articles were not downloaded, nodes are committed without them.
+        The old file is removed after the conversion.
         """
-        vols_uuids = set()
-        for vol in self.tree.successors(self.root_id):
-            uuid = self.tree.nodes[vol]['uuid']
-            vols_uuids.add(uuid)
-        self.downloaded_vols = vols_uuids
+        base, ext = os.path.splitext(self.tmp_file)
+        legacy_file = base+'.json'
+        if ext != '.jsonl' or not os.path.exists(legacy_file):
+            return
+        with open(legacy_file) as f:
+            legacy_tree = nx.tree_graph(json.load(f))
+        for node in nx.bfs_tree(legacy_tree, self.root_id):
+            edges = [(node, child, legacy_tree.nodes[child])
+                     for child in legacy_tree.successors(node)]
+            self.journal.append(edges, node, complete=node != self.root_id,
+                                filtered=['article'])
+        self.journal.close()
+        os.remove(legacy_file)
+        logging.info(
+            f'Converted partially downloaded tree `{legacy_file}` to `{self.tmp_file}`')
         return
 
     def prep_partial_down(self) -> None:
         """Prepare the partially downloaded tree.
 
-        First, load it to memory and then get downloaded volumes.
+        Load it to memory together with nodes whose children are downloaded.
         """
         self._load_partial_tree()
-        if len(self.tree) > 0:
-            self._get_downloaded_vols()
         return
 
     def tree_to_json(self):
@@ -307,7 +1025,7 @@ class KramAPIBase():
         dict
             A dictionary with node-link formatted data. 
         """
-        return nx.tree_data(self.tree, root=self.root_id)
+        return self.tree.tree_data(self.root_id)
 
     def save_tree(self, path: str) -> None:
         """Save the (partially) downloaded tree to a JSON file.
@@ -328,46 +1046,151 @@ class KramAPIBase():
     def delete_temp_file(self) -> None:
         if os.path.exists(self.tmp_file):
             logging.info(f'Removing temp file `{self.tmp_file}`')
-            os.remove(self.tmp_file)
+            self.journal.delete()
         else:
             logging.warning(f'Removing temp file failed ({self.tmp_file})')
 
-    def dfs_with_clb_tree(self, parent_uuid: str, model: str, par_id: str, clb_tree: nx.DiGraph, clb_node) -> None:
-        # TODO: complete implementation
-        raise NotImplementedError
-        children = self._find_children(parent_uuid)
+    def _clb_title(self, title: str) -> str:
+        """Normalize a title of a volume or an issue, so that ČLB and Kramerius titles can be compared (see `Parse773.normalize_title`)."""
+        return normalize_title(title)
 
-        if len(children) == 0:
-            return  # we could also check that model == 'page'
+    def dfs_with_clb_tree(self, parent_uuid: str, model: str, par_id: str, clb_tree: nx.DiGraph, clb_node: str) -> None:
+        """Perform DFS only into volumes and issues of a ČLB tree.
 
-        clb_succ = set(clb_tree.successors(clb_node))
-        for child in children:
-            child_uuid = child['pid']
-            child_model, child_title = self._find_node_details(child)
-            child_id = par_id + self.sep + child_title
-            # TODO: vyřešit, když chybí issue
-            if child_id in clb_succ:
-
-                self.tree.add_edge(par_id, child_id)
-                self.tree.nodes[child_id]['model'] = child_model
-                self.tree.nodes[child_id]['uuid'] = child_uuid
-
-                logging.info(
-                    f"Adding edge between `{par_id}` and `{child_id}` ({model}--{child_model})")
-                self.dfs_with_clb_tree(
-                    child_uuid, child_model, child_id, clb_tree, child_id)
-
-    def return_tree(self) -> nx.DiGraph:
+        The ČLB tree is built by `Periodical.build_clb_tree` (root/volume/issue/page).
+        Children are matched by their normalized titles (see `_clb_title`).
+        All children of matched issues are added (children of pages are not requested).
+        A ČLB issue `NO_ISSUE` matches the only child of a volume.
+        If an issue of a ČLB volume matches nothing, the whole volume is downloaded.
+        Failed nodes are retried by `retry_failed` (i.e. by `dfs`).
+
+        Parameters
+        ----------
+        parent_uuid : str
+            UUID of the parent node.
+        model : str
+            `model` parameter of the parent node.
+        par_id : str
+            Key to the parent node.
+        clb_tree : nx.DiGraph
+            ČLB tree, nodes have a `number` attribute.
+        clb_node : str
+            Node of `clb_tree` matching the parent node.
+        """
+        clb_children = {self._clb_title(clb_tree.nodes[child]['number']): child
+                        for child in clb_tree.successors(clb_node)}
+        if len(clb_children) > 0 and all(clb_tree.out_degree(child) == 0 for child in clb_children.values()):
+            # an issue, ČLB children are pages
+            self._dwn_clb_issue(parent_uuid, model, par_id)
+            return
+
+        if par_id in self.done_parents:
+            children = None
+            titles = [child_id[len(par_id+self.sep):]
+                      for _, _, child_id in self._stored_children(par_id)]
+        else:
+            try:
+                children = list(self._iter_children(parent_uuid))
+            except KramRequestError as err:
+                self._add_failure(parent_uuid, model, par_id, err)
+                return
+            titles = [self._find_node_details(child)[1] for child in children]
+
+        def match(title: str) -> str | None:
+            clb_child = clb_children.get(self._clb_title(title))
+            if clb_child is None and len(titles) == 1:
+                clb_child = clb_children.get(NO_ISSUE)
+            return clb_child
+
+        matched = {match(title) for title in titles} - {None}
+        is_vol = clb_node != self.root_id
+        if is_vol and len(matched) < len(clb_children):
+            logging.info(
+                f'Titles of issues of `{par_id}` do not match the ČLB tree, downloading the whole volume')
+            if children is None:
+                added = self._stored_children(par_id)
+            else:
+                added = self._add_children(par_id, model, children)
+            for child_uuid, child_model, child_id in added:
+                self.dfs(child_uuid, child_model, child_id)
+            return
+        if not is_vol and len(matched) < len(clb_children):
+            logging.warning(
+                f'{len(clb_children)-len(matched)} volumes of the ČLB tree not found in Kramerius')
+        if self.prog_bar and not is_vol:
+            # only matched volumes are downloaded
+            self.progress_bar.total = sum(match(title) is not None for title in titles)
+            self.progress_bar.refresh()
+
+        if children is None:
+            added = self._stored_children(par_id)
+        else:
+            matched_children = [child for child, title in zip(children, titles)
+                                if match(title) is not None]
+            added = self._add_children(par_id, model, matched_children,
+                                       complete=len(matched_children) == len(children))
+        for child_uuid, child_model, child_id in added:
+            clb_child = match(child_id[len(par_id+self.sep):])
+            if clb_child is None:
+                continue
+            self.dfs_with_clb_tree(
+                child_uuid, child_model, child_id, clb_tree, clb_child)
+            if self.prog_bar and not is_vol:
+                self.progress_bar.update(1)
+        return
+
+    def _dwn_clb_issue(self, parent_uuid: str, model: str, par_id: str) -> None:
+        """Add all children of an issue, download subtrees of children that are not pages.
+
+        Parameters
+        ----------
+        parent_uuid : str
+            UUID of the issue.
+        model : str
+            `model` parameter of the issue.
+        par_id : str
+            Key to the issue.
+        """
+        if par_id in self.done_parents:
+            children = self._stored_children(par_id)
+        else:
+            try:
+                children = self._add_children(
+                    par_id, model, self._iter_children(parent_uuid))
+            except KramRequestError as err:
+                self._add_failure(parent_uuid, model, par_id, err)
+                return
+        for child_uuid, child_model, child_id in children:
+            if child_model != 'page':
+                self.dfs(child_uuid, child_model, child_id)
+        return
+
+    def return_tree(self) -> CompactTree:
         """Return the downloaded tree.
         Intended to be passed to a `Periodical` object. 
 
         Returns
         -------
-        nx.DiGraph
+        CompactTree
             The downloaded tree.
         """
         return self.tree
 
+    def count_children(self, uuid: str) -> int:
+        """Return the number of children of a given UUID.
+
+        Parameters
+        ----------
+        uuid : str
+            UUID.
+
+        Returns
+        -------
+        int
+            Number of children.
+        """
+        return len(self._find_children(uuid))
+
     def count_vols_to_dwn(self, uuid: str) -> None:
         """Number of volumes (= children of periodical/root) to be downloaded.
 
@@ -398,9 +1221,54 @@ class KramAPIBase():
         logging.info('Enabling progress bar (volumes only)')
         self.prog_bar = True
 
+    def set_workers(self, workers: int) -> None:
+        """Set the maximal number of concurrent requests (used by `bfs`).
+
+        Parameters
+        ----------
+        workers : int
+            Maximal number of concurrent requests.
+
+        Raises
+        ------
+        ValueError
+            `workers` is not positive.
+        """
+        if workers < 1:
+            raise ValueError(f'Number of workers should be positive ({workers=})')
+        self.workers = workers
+        self.limiter.set_max_limit(workers)
+        # keep a connection for every worker
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=workers))
+        logging.info(f'Using {self.workers} concurrent requests')
+
+    def set_articles(self, articles: bool) -> None:
+        """Download `article` nodes or skip them.
+
+        Articles of newer periodicals make trees much larger,
+        so they are skipped by default.
+
+        Parameters
+        ----------
+        articles : bool
+            `True` to download articles.
+        """
+        self.articles = articles
+
+    def set_metrics(self, metrics: Metrics | None) -> None:
+        """Collect metrics of requests and downloaded nodes.
+
+        Parameters
+        ----------
+        metrics : Metrics | None
+            Metrics, can be shared by several APIs. `None` to stop collecting.
+        """
+        self.metrics = metrics
+
     def set_partial_save(self, tmp_path: str) -> None:
         self.save_part = True
         self.tmp_file = tmp_path
+        self.journal = Journal(tmp_path)
         logging.info(f'Enabling partial saving to `{self.tmp_file}`')
 
 
@@ -412,6 +1280,18 @@ class KramAPIv7(KramAPIBase):
     url, sep, tree, INFO, VER
         See superclass.
 
+    BATCH_SIZE
+        See superclass.
+
+    CHILDREN_ROWS : int
+        Number of rows requested at once when finding children.
+
+    BATCH_ROWS : int
+        Number of rows requested at once when finding children of several parents.
+
+    TREE_ROWS : int
+        Number of rows requested at once when downloading the whole tree.
+
     ITEMS, STRUCT, DETAILS : str
         Request URLs. For more details, see
         https://k7.inovatika.dev/search/openapi/client/v7.0/index.html
@@ -421,18 +1301,69 @@ class KramAPIv7(KramAPIBase):
 
     """
     INFO = '/search/api/client/v7.0/info'
-    CHILDREN_PREF = '/search/api/client/v7.0/search?fl=pid,model,title.search&q=own_parent.pid:'
-    CHILDREN_SUFF = '&rows=4000&sort=rels_ext_index.sort asc'
+    CHILDREN_PREF = '/search/api/client/v7.0/search?fl=pid,model,title.search,foster_parents.pids,modifiedDate&q=own_parent.pid:'
+    CHILDREN_SUFF = '&sort=rels_ext_index.sort asc,pid asc'
+    CHILDREN_ROWS = 500
+    BATCH_CHILDREN_PREF = '/search/api/client/v7.0/search?fl=pid,model,title.search,own_parent.pid,foster_parents.pids,modifiedDate&q=own_parent.pid:'
+    BATCH_CHILDREN_SUFF = '&sort=rels_ext_index.sort asc,pid asc'
+    BATCH_ROWS = 4000
+    BATCH_SIZE = 20
+    TREE_PREF = '/search/api/client/v7.0/search?fl=pid,model,title.search,own_parent.pid,rels_ext_index.sort,foster_parents.pids,modifiedDate&q=root.pid:'
+    TREE_SUFF = '&sort=pid asc'
+    TREE_ROWS = 4000
+    MODIFIED = 'modifiedDate'
     VER = KramVer.V7
 
-    def __init__(self, url: str, sep='/') -> None:
-        super().__init__(url, sep)
+    def __init__(self, url: str, sep='/', cache: ResponseCache | None = None) -> None:
+        super().__init__(url, sep, cache)
+
+    def _iter_docs(self, url: str, rows: int) -> Iterator[dict]:
+        """Yield documents of a search request, one page of results at a time.
+
+        Pages are requested with Solr `cursorMark`.
+        If the API does not return `nextCursorMark`, use `start` offsets instead.
+        `url` has to sort by a unique field (eg. `pid`) for the paging to be stable.
+
+        Parameters
+        ----------
+        url : str
+            Search request without `rows`, `start` and `cursorMark` parameters.
+        rows : int
+            Number of documents in a page.
+
+        Yields
+        ------
+        dict
+            Documents from `response.docs`.
+        """
+        cursor = '*'
+        start = 0
+        while True:
+            if cursor is not None:
+                page_url = url + \
+                    f'&rows={rows}&cursorMark={quote(cursor, safe="")}'
+            else:
+                page_url = url+f'&rows={rows}&start={start}'
+            resp = self.get_json(page_url)
+            docs = resp['response']['docs']
+            yield from docs
+
+            start += len(docs)
+            if len(docs) == 0 or start >= resp['response']['numFound']:
+                return
+            next_cursor = resp.get('nextCursorMark')
+            if next_cursor is None:
+                if cursor is not None:
+                    logging.debug('`cursorMark` not supported, using `start`')
+                cursor = None
+            elif next_cursor == cursor:
+                return
+            else:
+                cursor = next_cursor
 
     def _make_children_url(self, uuid: str) -> str:
         """Create URL for a request for children.
 
-        The maximal number of returned children is 4 000 (default by Kramerius).
-
         Parameters
         ----------
         uuid : str
@@ -441,16 +1372,34 @@ class KramAPIv7(KramAPIBase):
         Returns
         -------
         str
-            Link to a children request.
+            Link to a children request (without paging parameters).
         """
         # quotes "..." have to a part of the URL
         return self.url+self.CHILDREN_PREF+f'"{uuid}"'+self.CHILDREN_SUFF
 
+    def _iter_children(self, uuid: str) -> Iterator[dict[str, str]]:
+        """Yield children of a given UUID (JSON requests).
+
+        Children are requested in pages of `CHILDREN_ROWS`,
+        so there is no limit on their number.
+
+        Parameters
+        ----------
+        uuid : str
+            UUID.
+
+        Yields
+        ------
+        dict[str, str]
+            Dictionaries in the form
+            `{'pid':___, 'model':___, 'title.search':___}`,
+            pages also with `foster_parents.pids` (articles on the page)
+        """
+        return self._iter_docs(self._make_children_url(uuid), self.CHILDREN_ROWS)
+
     def _find_children(self, uuid: str) -> list[dict[str, str]]:
         """Find children of a given UUID (JSON request).
 
-        The maximal number of returned children is 4 000 (default by Kramerius).
-
         Parameters
         ----------
         uuid : str
@@ -460,16 +1409,154 @@ class KramAPIv7(KramAPIBase):
         -------
         list[dict[str, str]]
             List of dictionaries in the form
-            `{'pid':___, 'model':___, 'title.search':___}`
+            `{'pid':___, 'model':___, 'title.search':___}`,
+            pages also with `foster_parents.pids` (articles on the page)
         """
-        req_url = self._make_children_url(uuid)
-        resp = self.get_response(req_url)
-        children = resp.json()['response']['docs']
-        if len(children) == 4_000:
-            logging.warning(
-                'Maximal number of rows in a response reached (4 000)')
+        return list(self._iter_children(uuid))
+
+    def count_children(self, uuid: str) -> int:
+        """Return the number of children of a given UUID (JSON request).
+
+        Only `numFound` is requested, not the children.
+
+        Parameters
+        ----------
+        uuid : str
+            UUID.
+
+        Returns
+        -------
+        int
+            Number of children.
+        """
+        req_url = self._make_children_url(uuid)+'&rows=0'
+        return self.get_json(req_url)['response']['numFound']
+
+    def _make_batch_children_url(self, uuids: list[str]) -> str:
+        """Create URL for a request for children of several parents.
+
+        Parameters
+        ----------
+        uuids : list[str]
+            UUIDs of parents.
+
+        Returns
+        -------
+        str
+            Link to a children request (without paging parameters).
+        """
+        parents = ' OR '.join(f'"{uuid}"' for uuid in uuids)
+        return self.url+self.BATCH_CHILDREN_PREF+f'({parents})'+self.BATCH_CHILDREN_SUFF
+
+    def _find_children_batch(self, uuids: list[str]) -> dict[str, list[dict[str, str]]]:
+        """Find children of several UUIDs with a single query (JSON requests).
+
+        Children are sorted by `rels_ext_index.sort`, so regrouping them 
+        per parent keeps the order of siblings.
+        Children are requested in pages of `BATCH_ROWS`.
+
+        Parameters
+        ----------
+        uuids : list[str]
+            UUIDs of parents.
+
+        Returns
+        -------
+        dict[str, list[dict[str, str]]]
+            Children of every UUID as dictionaries in the form
+            `{'pid':___, 'model':___, 'title.search':___, 'own_parent.pid':___}`,
+            pages also with `foster_parents.pids` (articles on the page)
+        """
+        children = {uuid: [] for uuid in uuids}
+        req_url = self._make_batch_children_url(uuids)
+        for doc in self._iter_docs(req_url, self.BATCH_ROWS):
+            parent = doc.get('own_parent.pid')
+            if parent not in children:
+                logging.warning(
+                    f'Unexpected parent `{parent}` of `{doc["pid"]}`, skipping')
+                continue
+            children[parent].append(doc)
         return children
 
+    def _make_tree_url(self, uuid: str) -> str:
+        """Create URL for a request for all objects of a periodical.
+
+        Parameters
+        ----------
+        uuid : str
+            UUID of the periodical (`root.pid`).
+
+        Returns
+        -------
+        str
+            Link to a request (without paging parameters).
+        """
+        return self.url+self.TREE_PREF+f'"{uuid}"'+self.TREE_SUFF
+
+    def _find_descendants(self, uuid: str) -> list[dict]:
+        """Find all objects with a given `root.pid` (JSON requests).
+
+        Parameters
+        ----------
+        uuid : str
+            UUID of the periodical.
+
+        Returns
+        -------
+        list[dict]
+            List of dictionaries in the form
+            `{'pid':___, 'model':___, 'title.search':___, 'own_parent.pid':___, 'rels_ext_index.sort':___}`,
+            pages also with `foster_parents.pids` (articles on the page)
+        """
+        docs = list(self._iter_docs(self._make_tree_url(uuid), self.TREE_ROWS))
+        logging.info(f'Found {len(docs)} objects with `root.pid` {uuid}')
+        return docs
+
+    def _rels_ext_index(self, doc: dict) -> int:
+        """Return position of a child among its siblings."""
+        index = doc['rels_ext_index.sort']
+        return index[0] if isinstance(index, list) else index
+
+    def fetch_whole_tree(self, parent_uuid: str, model: str, par_id: str) -> bool:
+        """Download the whole tree using a few paged `root.pid` queries.
+
+        The tree is rebuilt from `own_parent.pid` of every object,
+        siblings are ordered by `rels_ext_index.sort`.
+        Nothing is added to `tree` if some of the fields are missing.
+
+        Parameters
+        ----------
+        parent_uuid : str
+            UUID of the periodical.
+        model : str
+            `model` parameter of the periodical.
+        par_id : str
+            Key to the root node.
+
+        Returns
+        -------
+        bool
+            `True` if the tree was downloaded, `False` otherwise.
+        """
+        docs = self._find_descendants(parent_uuid)
+        if len(docs) == 0:
+            return False
+
+        children = dict()
+        for doc in docs:
+            if doc['pid'] == parent_uuid:
+                continue
+            if 'own_parent.pid' not in doc or 'rels_ext_index.sort' not in doc:
+                logging.warning(
+                    f'Missing `own_parent.pid` or `rels_ext_index.sort` ({doc["pid"]})')
+                return False
+            children.setdefault(doc['own_parent.pid'], []).append(doc)
+
+        for siblings in children.values():
+            siblings.sort(key=self._rels_ext_index)
+        self._build_tree(parent_uuid, model, par_id, children)
+        return True
+
     def _find_node_details(self, node: dict[str, str]) -> tuple[str, str]:
         """Make a request for details about a UUID.
 
@@ -514,14 +1601,15 @@ class KramAPIv5(KramAPIBase):
     VER = KramVer.V5
     MODEL_TITLE_DICT = {
         # model : title
-        # TODO: podpora pro `article` (eg. https://vufind.ucl.cas.cz/Record/002973863)
         'periodicalvolume': 'volumeNumber',
         'periodicalitem': 'partNumber',
-        'page': 'pagenumber'
+        'page': 'pagenumber',
+        # eg. https://vufind.ucl.cas.cz/Record/002973863, title is not in `details`
+        'article': 'title',
     }
 
-    def __init__(self, url: str, sep='/') -> None:
-        super().__init__(url, sep)
+    def __init__(self, url: str, sep='/', cache: ResponseCache | None = None) -> None:
+        super().__init__(url, sep, cache)
 
     def _make_children_url(self, uuid: str) -> str:
         """Create URL for a children request.
@@ -553,17 +1641,19 @@ class KramAPIv5(KramAPIBase):
             `{'pid':___, 'model':___, 'details':{'volumeNumber':___, 'year':___}}`
         """
         url = self._make_children_url(uuid)
-        resp = self.get_response(url)
+        resp = self.get_json(url)
         lst = []
-        if len(resp.json()) == 0:
+        if len(resp) == 0:
             return lst  # empty
-        for child in resp.json():
+        for child in resp:
             if child['model'] in self.MODEL_TITLE_DICT:
                 d = {
                     'pid': child['pid'],
                     'model': child['model'],
                     'details': child['details']
                 }
+                if child['model'] == 'article':
+                    d['title'] = child.get('title', '')
                 # do not include `internalpart` etc (see eg. https://ndk.cz/periodical/uuid:f037984f-200b-402d-94c3-8df539168e78)
                 lst.append(d)
         return lst
@@ -590,8 +1680,11 @@ class KramAPIv5(KramAPIBase):
             # asi to bude chtít udělat nějaké uuid pro tenhle případ, abych vždycyky měl strom
             return (model, 'n_not_found')
 
-        title = details[self.MODEL_TITLE_DICT[model]].strip()
-        return (model, title)
+        if model == 'article':
+            title = node.get('title') or details.get('title', '')
+        else:
+            title = details[self.MODEL_TITLE_DICT[model]]
+        return (model, title.strip())
 
 
 class Periodical:
@@ -615,8 +1708,10 @@ class Periodical:
         ISSN of the periodical, if it is available.
     ccnb : str
         Číslo národní bibliografie (https://www.registrdigitalizace.cz/rdcz/info/data/ccnb)
-    tree : networkx.DiGraph
+    tree : CompactTree
         The tree of the digited periodical.
+        A `networkx.DiGraph` is converted to `CompactTree`,
+        read-only `IndexTree` from `CorpusIndex` is kept.
         Keys are made by concatenating volume/issue/page number.
     id_sep : str
         Separator used in keys in the tree, by default `/`.
@@ -627,7 +1722,8 @@ class Periodical:
     max_depth : int
         Maximum depth of the downloaded tree (zero-based counting), by default `3`.
     clb_tree : nx.Digraph
-        #TODO: document
+        Volumes, issues and pages of ČLB records (see `build_clb_tree`),
+        nodes have a `number` attribute. Empty by default.
     tmp_path : str
         Path to a folder to save partial downloads.
     is_partial : bool
@@ -643,11 +1739,11 @@ class Periodical:
                  api_url: str,
                  issn: str,
                  ccnb: str,
-                 tree=nx.DiGraph(),
+                 tree: CompactTree | nx.DiGraph | None = None,
                  id_sep='/',
                  root_id='root',
                  link_uuid='uuid',
-                 clb_tree=nx.DiGraph(),
+                 clb_tree: nx.DiGraph | None = None,
                  max_depth=3,
                  tmp_path='data/tmp/',
                  ):
@@ -659,30 +1755,41 @@ class Periodical:
         self.api_url = api_url
         self.issn = issn
         self.ccnb = ccnb
+        if tree is None:
+            tree = CompactTree(id_sep)
+        elif isinstance(tree, nx.DiGraph):
+            tree = CompactTree.from_networkx(tree, root_id, id_sep)
         self.tree = tree
         self.id_sep = id_sep
         self.root_id = root_id
         self.link_uuid = link_uuid
-        self.clb_tree = clb_tree
+        # a new graph for every periodical, a default instance would be shared
+        self.clb_tree = nx.DiGraph() if clb_tree is None else clb_tree
         self.max_depth = max_depth
-        self.tmp_file = tmp_path+self.per_uuid+'.json'
+        self.tmp_path = tmp_path
+        self.tmp_file = tmp_path+self.per_uuid+'.jsonl'
 
         self._check_url()
 
         logging.info(f"Loaded periodical {self}")
 
-    def _select_KramAPI(self) -> None:
+    def _select_KramAPI(self, cache: ResponseCache | None = None) -> None:
         """Select a Kramerius API version.
 
+        Parameters
+        ----------
+        cache : ResponseCache | None
+            Cache of API responses. By default `None`, i.e. no caching.
+
         Raises
         ------
         Exception
             Only V7 and V5 is supported
         """
         if self.kramerius_ver == KramVer.V7.value:
-            self.api = KramAPIv7(self.api_url, self.id_sep)
+            self.api = KramAPIv7(self.api_url, self.id_sep, cache)
         elif self.kramerius_ver == KramVer.V5.value:
-            self.api = KramAPIv5(self.api_url, self.id_sep)
+            self.api = KramAPIv5(self.api_url, self.id_sep, cache)
         else:
             raise Exception('Only V7 and V5 is supported')
 
@@ -700,20 +1807,9 @@ class Periodical:
     def __str__(self) -> str:
         return f"`{self.name}` per_uuid={self.per_uuid}, issn={self.issn}, api_url={self.api_url}, url={self.url}, ver={self.kramerius_ver}, ccnb={self.ccnb}, lib={self.library}"
 
-    def save(self, file: str) -> None:
-        """Save the object parameters to file (in JSON).
-
-        Parameters
-        ----------
-        file : str
-            File to save to.
-        """
-
-        graph = nx.tree_data(self.tree, self.root_id)
-        logging.info(
-            f'Nodes={self.tree.number_of_nodes()} Edges={self.tree.number_of_edges()}')
-
-        params = {
+    def _params(self) -> dict:
+        """Return parameters of the periodical saved besides the tree."""
+        return {
             'name': self.name,
             'per_uuid': self.per_uuid,
             'library': self.library,
@@ -722,44 +1818,335 @@ class Periodical:
             'api_url': self.api_url,
             'issn': self.issn,
             'ccnb': self.ccnb,
-            'tree': graph,
             'id_sep': self.id_sep,
             'root_id': self.root_id,
             'link_uuid': self.link_uuid,
             'max_depth': self.max_depth,
-            'tmp_path': self.tmp_file,
+            'tmp_path': self.tmp_path,
         }
+
+    def save(self, file: str, fmt: TreeFormat = TreeFormat.JSON, compression: str | None = None) -> None:
+        """Save the object parameters to file.
+
+        Parameters
+        ----------
+        file : str
+            File to save to.
+        fmt : TreeFormat
+            `JSON` (default) or `COMPACT` binary format, see `TreeStore`.
+        compression : str | None
+            Compression of the compact format, `gzip`, `zstd` or `None` (default).
+        """
+        logging.info(
+            f'Nodes={self.tree.number_of_nodes()} Edges={self.tree.number_of_edges()}')
+        params = self._params()
+
+        if fmt == TreeFormat.COMPACT:
+            save_compact(file, self.tree, self.root_id,
+                         self.id_sep, params, compression)
+            return
+
+        params['tree'] = self.tree.tree_data(self.root_id)
         with open(file, 'w') as f:
             json.dump(params, f, indent='\t', ensure_ascii=False)
         logging.info(f'JSON saved to `{file}`')
         return
 
-    def _set_KramAPI(self, root_id: str, prog_bar: bool, save_part: bool) -> None:
+    def _set_KramAPI(self, root_id: str, prog_bar: bool, save_part: bool, articles=False) -> None:
         if not hasattr(self, 'api'):
             err_msg = 'No API found. Call `_select_KramAPI()` first.'
             raise SystemExit(err_msg)
 
         self.api._set_root_id(root_id)
+        self.api.set_articles(articles)
 
         if prog_bar:
-            self.api.count_vols_to_dwn(self.per_uuid)
-            self.api.create_progress_bar(self.name)
+            try:
+                self.api.count_vols_to_dwn(self.per_uuid)
+                self.api.create_progress_bar(self.name)
+            except KramRequestError as err:
+                # the download requests the volumes again and reports the failure
+                logging.warning(f'Unable to count volumes, no progress bar: {err}')
 
         if save_part:
             self.api.set_partial_save(self.tmp_file)
             self.api.prep_partial_down()
 
-    def download(self, prog_bar: bool, save_part: bool) -> None:
-        """Use depth-first search to find children starting 
-        from UUID of a periodical.
-        """
-        self._select_KramAPI()
-        self._set_KramAPI(self.root_id, prog_bar, save_part)
+    def download(self, prog_bar: bool, save_part: bool, mode: DwnMode = DwnMode.DFS, workers: int | None = None, cache: ResponseCache | None = None, articles=False, metrics: Metrics | None = None) -> list[FailedRequest]:
+        """Download the tree of the periodical starting from its UUID.
 
-        self.api.dfs(self.per_uuid, 'periodical', self.root_id)
+        Parameters
+        ----------
+        prog_bar : bool
+            Show a progress bar.
+        save_part : bool
+            Save partially downloaded tree after every volume.
+        mode : DwnMode
+            Depth-first search (one request at a time),
+            breadth-first search (concurrent requests)
+            the whole tree at once (falls back to `dfs`)
+            or only volumes and issues of ČLB records (`clb_tree`, see `build_clb_tree`),
+            by default `DwnMode.DFS`.
+        workers : int | None
+            Maximal number of concurrent requests (`DwnMode.BFS` only).
+            By default, use `LIBRARY_WORKERS` for the library of the periodical.
+        cache : ResponseCache | None
+            Cache of API responses. By default `None`, i.e. no caching.
+        articles : bool
+            Download `article` nodes too, by default `False`.
+        metrics : Metrics | None
+            Metrics of the download, flushed when it finishes. By default `None`.
+
+        Returns
+        -------
+        list[FailedRequest]
+            Nodes whose children could not be downloaded (even when tried again).
+            If partial saving is enabled, they are downloaded when resuming.
+
+        Raises
+        ------
+        ValueError
+            Unknown download mode or `DwnMode.CLB` with an empty `clb_tree`.
+        """
+        if mode is DwnMode.CLB and self.clb_tree.number_of_nodes() == 0:
+            raise ValueError('The ČLB tree is empty, call `build_clb_tree()` first')
+        self._select_KramAPI(cache)
+        self.api.set_metrics(metrics)
+        self._set_KramAPI(self.root_id, prog_bar, save_part, articles)
+
+        if mode is DwnMode.DFS:
+            self.api.dfs(self.per_uuid, 'periodical', self.root_id)
+        elif mode is DwnMode.BFS:
+            if workers is None:
+                workers = LIBRARY_WORKERS.get(self.library, DEFAULT_WORKERS)
+            self.api.set_workers(workers)
+            self.api.bfs(self.per_uuid, 'periodical', self.root_id)
+        elif mode is DwnMode.ROOT_PID:
+            try:
+                fetched = self.api.fetch_whole_tree(
+                    self.per_uuid, 'periodical', self.root_id)
+            except KramRequestError as err:
+                logging.warning(err)
+                fetched = False
+            if not fetched:
+                logging.warning('Unable to download the whole tree at once, using `dfs`')
+                self.api.dfs(self.per_uuid, 'periodical', self.root_id)
+        elif mode is DwnMode.CLB:
+            self.api.dfs_with_clb_tree(
+                self.per_uuid, 'periodical', self.root_id, self.clb_tree, self.root_id)
+        else:
+            raise ValueError(f'Unknown download mode `{mode}`')
 
+        failed = self._retry_failed()
         self.tree = self.api.return_tree()
         self.check_tree_depth()
+        if metrics is not None:
+            metrics.flush()
+        return failed
+
+    def _retry_failed(self) -> list[FailedRequest]:
+        """Try downloading nodes that failed during the download again.
+
+        Returns
+        -------
+        list[FailedRequest]
+            Nodes that failed again.
+        """
+        failed = self.api.retry_failed()
+        if len(failed) > 0:
+            logging.error(
+                f'Children of {len(failed)} nodes could not be downloaded: {", ".join(node.key for node in failed)}')
+        return failed
+
+    def update(self, prog_bar: bool, mode: DwnMode = DwnMode.DFS, workers: int | None = None, cache: ResponseCache | None = None, articles=False, metrics: Metrics | None = None) -> list[FailedRequest]:
+        """Update an already downloaded tree.
+
+        Volumes (= children of the root) in `tree` are compared with volumes in Kramerius.
+        Only new volumes and changed volumes are downloaded (see `_is_changed`).
+        Volumes no longer in Kramerius are removed.
+        If the volumes cannot be requested, `tree` is not changed
+        and the periodical is returned as failed.
+
+        Parameters
+        ----------
+        prog_bar : bool
+            Show a progress bar.
+        mode : DwnMode
+            How to download volumes, `DwnMode.DFS` or `DwnMode.BFS`, by default `DwnMode.DFS`.
+        workers : int | None
+            Maximal number of concurrent requests (`DwnMode.BFS` only).
+            By default, use `LIBRARY_WORKERS` for the library of the periodical.
+        cache : ResponseCache | None
+            Cache of API responses. By default `None`, i.e. no caching.
+        articles : bool
+            Download `article` nodes too, by default `False`.
+        metrics : Metrics | None
+            Metrics of the download, flushed when it finishes. By default `None`.
+
+        Returns
+        -------
+        list[FailedRequest]
+            Nodes whose children could not be downloaded (even when tried again).
+
+        Raises
+        ------
+        ValueError
+            Unsupported download mode.
+        """
+        self._select_KramAPI(cache)
+        self.api.set_metrics(metrics)
+        self.api._set_root_id(self.root_id)
+        self.api.set_articles(articles)
+
+        stored_vols = {self.tree.nodes[vol]['uuid']: vol
+                       for vol in self.tree.successors(self.root_id)} if self.root_id in self.tree else dict()
+        try:
+            live_children = self.api._find_children(self.per_uuid)
+        except KramRequestError as err:
+            # the stored tree is kept as it is
+            self.api._add_failure(self.per_uuid, 'periodical', self.root_id, err)
+            if metrics is not None:
+                metrics.flush()
+            return self.api.failed
+
+        live_vols = []  # (uuid, key)
+        unchanged = set()
+        for child in live_children:
+            vol_uuid = child['pid']
+            vol_id = self.root_id + self.id_sep + \
+                self.api._find_node_details(child)[1]
+            live_vols.append((vol_uuid, vol_id))
+            if stored_vols.get(vol_uuid) != vol_id:
+                logging.info(f'New volume `{vol_id}` ({vol_uuid})')
+            elif self._is_changed(vol_id, child):
+                logging.info(f'Changed volume `{vol_id}` ({vol_uuid})')
+            else:
+                unchanged.add(vol_uuid)
+
+        for vol_uuid in stored_vols.keys() - {vol_uuid for vol_uuid, _ in live_vols}:
+            logging.info(
+                f'Removing volume `{stored_vols[vol_uuid]}` ({vol_uuid}) not found in Kramerius')
+
+        logging.info(
+            f'Updating {len(live_vols)-len(unchanged)} of {len(live_vols)} volumes')
+        if len(live_vols) == len(unchanged):
+            self.tree = self._merge_vols(live_vols, unchanged, self.tree)
+            if metrics is not None:
+                metrics.flush()
+            return []
+
+        # unchanged volumes are skipped like partially downloaded ones
+        self.api.downloaded_vols = unchanged
+        if prog_bar:
+            self.api.vols_to_dwn = len(live_vols)-len(unchanged)
+            self.api.create_progress_bar(self.name)
+
+        if mode is DwnMode.DFS:
+            self.api.dfs(self.per_uuid, 'periodical', self.root_id)
+        elif mode is DwnMode.BFS:
+            if workers is None:
+                workers = LIBRARY_WORKERS.get(self.library, DEFAULT_WORKERS)
+            self.api.set_workers(workers)
+            self.api.bfs(self.per_uuid, 'periodical', self.root_id)
+        else:
+            raise ValueError(f'Unsupported download mode `{mode}`')
+
+        failed = self._retry_failed()
+        self.tree = self._merge_vols(
+            live_vols, unchanged, self.api.return_tree())
+        self.check_tree_depth()
+        if metrics is not None:
+            metrics.flush()
+        return failed
+
+    def _is_changed(self, vol_id: str, vol: dict) -> bool:
+        """Compare a stored volume with the volume in Kramerius.
+
+        The volume is changed if its modification date or the modification date
+        of one of its children (issues) differs, or if its children differ
+        (UUIDs or keys). Articles are left out unless they are downloaded.
+        Unknown dates (Kramerius 5, trees downloaded without them) are not compared,
+        dates of unchanged volumes are added to `tree` for the next update.
+        A volume whose children cannot be requested is treated as changed,
+        its download reports the failure if the request fails again.
+
+        Parameters
+        ----------
+        vol_id : str
+            Key to the volume in `tree`.
+        vol : dict
+            The volume as returned by `_find_children`.
+
+        Returns
+        -------
+        bool
+            `True` if the volume has to be downloaded again.
+        """
+        stored = self.tree.nodes[vol_id]
+        modified = self.api._find_node_modified(vol)
+        if modified is not None and stored.get('modified', modified) != modified:
+            return True
+        try:
+            children = self.api._find_children(vol['pid'])
+        except KramRequestError as err:
+            logging.warning(f'Unable to request children of `{vol_id}`: {err}')
+            return True
+
+        stored_children = {self.tree.nodes[child]['uuid']: child
+                           for child in self.tree.successors(vol_id)}
+        dates = [(vol_id, modified)]
+        n_children = 0
+        for child in children:
+            model, title = self.api._find_node_details(child)
+            if model == 'article' and not self.api.articles:
+                continue
+            n_children += 1
+            child_id = stored_children.get(child['pid'])
+            if child_id is None or child_id != vol_id+self.id_sep+title:
+                return True
+            child_modified = self.api._find_node_modified(child)
+            if child_modified is not None and self.tree.nodes[child_id].get('modified', child_modified) != child_modified:
+                return True
+            dates.append((child_id, child_modified))
+        if n_children != len(stored_children):
+            return True
+
+        for key, date in dates:
+            if date is not None:
+                self.tree.nodes[key]['modified'] = date
+        return False
+
+    def _merge_vols(self, live_vols: list[tuple[str, str]], unchanged: set[str], new_tree: CompactTree) -> CompactTree:
+        """Merge unchanged volumes from `tree` with newly downloaded volumes.
+
+        Parameters
+        ----------
+        live_vols : list[tuple[str, str]]
+            UUIDs and keys of volumes in Kramerius (in order).
+        unchanged : set[str]
+            UUIDs of volumes to be taken from `tree`.
+        new_tree : CompactTree
+            Tree with newly downloaded volumes.
+
+        Returns
+        -------
+        CompactTree
+            Merged tree, volumes are in the same order as in Kramerius.
+        """
+        merged = CompactTree(self.id_sep)
+        merged.add_node(self.root_id)
+        for vol_uuid, vol_id in live_vols:
+            source = self.tree if vol_uuid in unchanged else new_tree
+            if vol_id not in source:
+                continue
+            merged.add_edge(self.root_id, vol_id)
+            merged.nodes[vol_id].update(source.nodes[vol_id])
+            for parent, child in source.bfs_edges(vol_id):
+                merged.add_edge(parent, child)
+                merged.nodes[child].update(source.nodes[child])
+        logging.info(
+            f'Merged tree Nodes={merged.number_of_nodes()} Edges={merged.number_of_edges()}')
+        return merged
 
     def check_tree_depth(self) -> None:
         """Check that the downloaded tree is not too deep.
@@ -843,10 +2230,13 @@ class Periodical:
                 for loc in row['location'].split(';'):
                     volume, issue, page = parse_location(loc)
                     if issue is None:
-                        issue = 'no_issue'.upper()  # TODO: unify
+                        issue = NO_ISSUE
                     # modify records HERE
                     vol_iss_pg = normalize(volume, issue, page)
-                    self._add_clb_record(*vol_iss_pg)
+                    try:
+                        self._add_clb_record(*vol_iss_pg)
+                    except ValueError as err:
+                        logging.warning(f'Skipping record `{loc}`: {err}')
         logging.info(
             f'Built ČLB tree with Nodes={self.clb_tree.number_of_nodes()}, Edges={self.clb_tree.number_of_edges()}')
         return
@@ -887,20 +2277,28 @@ class Periodical:
 
 
 def load_periodical(path: str) -> Periodical:
-    """Load class `Periodical` from JSON.
+    """Load class `Periodical` from JSON or the compact format.
+
+    The format and compression are detected automatically.
 
     Parameters
     ----------
     path : str
-        Path to a JSON file.
+        Path to a file saved by `Periodical.save`.
 
     Returns
     -------
     Periodical
         Periodical class.
     """
-    with open(path) as f:
-        json_per = json.load(f)
-    json_per['tree'] = nx.tree_graph(json_per['tree'])
+    with open(path, 'rb') as f:
+        data = decompress(f.read())
+    if is_compact(data):
+        tree, json_per = load_tree(data)
+        json_per['tree'] = tree
+    else:
+        json_per = json.loads(data)
+        json_per['tree'] = CompactTree.from_tree_data(
+            json_per['tree'], json_per.get('id_sep', '/'))
     per = Periodical(**json_per)
     return per
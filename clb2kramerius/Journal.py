@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import networkx as nx
+
+
+class Journal:
+    """Append-only journal of a partially downloaded tree (JSON Lines).
+
+    Edges are appended in batches (eg. all children of a node).
+    Every batch ends with a commit line and is flushed at once,
+    the file is synced to disk every `sync_every` batches.
+    When replaying, edges after the last commit are ignored.
+    A batch can be marked incomplete (eg. some children were filtered out),
+    its edges are replayed, but it is not reported as committed.
+    A batch can also record models of children left out on purpose
+    (eg. articles), it is complete unless these models are wanted when replaying.
+
+    Lines have the form
+    `{"parent": ___, "child": ___, "model": ___, "uuid": ___}` (edge,
+    other attributes of the child, eg. `pages` of articles, are added if set),
+    `{"commit": ___}` (end of a batch),
+    `{"commit": ___, "complete": false}` (end of an incomplete batch)
+    or `{"commit": ___, "filtered": [___]}` (end of a batch without some models).
+
+    Attributes
+    ----------
+    path : str
+        Path to the journal.
+    sync_every : int
+        Number of batches between syncs to disk, by default `100`.
+    """
+
+    def __init__(self, path: str, sync_every=100) -> None:
+        self.path = path
+        self.sync_every = sync_every
+        self._file = None
+        self._unsynced = 0
+
+    def append(self, edges: list[tuple[str, str, dict]], commit: str, complete=True, filtered: list[str] | None = None) -> None:
+        """Append a batch of edges to the journal.
+
+        Parameters
+        ----------
+        edges : list[tuple[str, str, dict]]
+            Edges as parent key, child key and attributes of the child
+            (`model`, `uuid` and optionally others, eg. `pages`).
+        commit : str
+            Identifier of the batch, eg. key of the parent node.
+        complete : bool
+            The batch is complete, by default `True`.
+            Incomplete batches are not returned by `replay` as committed.
+        filtered : list[str] | None
+            Models of children left out of the batch, by default `None`.
+        """
+        if self._file is None:
+            self._file = open(self.path, 'a')
+
+        lines = [json.dumps({'parent': parent, 'child': child, 'model': attrs['model'], 'uuid': attrs['uuid'],
+                             **{name: value for name, value in attrs.items() if name not in ('model', 'uuid')}},
+                            ensure_ascii=False) for parent, child, attrs in edges]
+        end = {'commit': commit}
+        if not complete:
+            end['complete'] = False
+        if filtered:
+            end['filtered'] = filtered
+        lines.append(json.dumps(end, ensure_ascii=False))
+        self._file.write('\n'.join(lines)+'\n')
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self._sync()
+        logging.debug(
+            f'Journal `{self.path}`: appended {len(edges)} edges ({commit}{"" if complete else ", incomplete"})')
+
+    def _sync(self) -> None:
+        """Sync the journal file to disk."""
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def replay(self, tree=None, wanted: set[str] = frozenset()) -> tuple[nx.DiGraph, list[str]]:
+        """Rebuild the tree from committed batches.
+
+        Edges of incomplete batches are added too,
+        but their identifiers are not returned.
+
+        Parameters
+        ----------
+        tree : CompactTree | nx.DiGraph | None
+            Empty tree to add the edges to, by default a new `nx.DiGraph`.
+        wanted : set[str]
+            Models that are downloaded now, batches without them
+            (see `filtered` of `append`) are incomplete. By default none.
+
+        Returns
+        -------
+        tuple[nx.DiGraph, list[str]]
+            Tree and identifiers of committed complete batches.
+
+        Raises
+        ------
+        FileNotFoundError
+            There is no journal.
+        """
+        if tree is None:
+            tree = nx.DiGraph()
+        commits = []
+        batch = []
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(
+                        f'Journal `{self.path}`: skipping incomplete line')
+                    break
+                if 'commit' in entry:
+                    for parent, child, attrs in batch:
+                        tree.add_edge(parent, child)
+                        for name, value in attrs.items():
+                            tree.nodes[child][name] = value
+                    if entry.get('complete', True) and wanted.isdisjoint(entry.get('filtered', [])):
+                        commits.append(entry['commit'])
+                    batch = []
+                else:
+                    parent, child = entry.pop('parent'), entry.pop('child')
+                    batch.append((parent, child, entry))
+
+        if len(batch) > 0:
+            logging.warning(
+                f'Journal `{self.path}`: ignoring {len(batch)} uncommitted edges')
+        return tree, commits
+
+    def close(self) -> None:
+        """Close the journal file."""
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def delete(self) -> None:
+        """Close and remove the journal file."""
+        self.close()
+        os.remove(self.path)
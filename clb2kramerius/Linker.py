@@ -1,10 +1,14 @@
 import logging
+import sys
 from enum import Enum, auto
 import csv
+from bisect import bisect_right
 from dataclasses import dataclass, field
-import networkx as nx
+from typing import Iterable, Iterator
 from .DwnKramerius import Periodical
-from .Parse773 import parse_location, normalize
+from .CompactTree import CompactTree
+from .ArticleIndex import ArticleIndex
+from .Parse773 import parse_normalized, normalize_title
 
 
 class ErrorCodes(Enum):
@@ -36,6 +40,10 @@ class ErrorCodes(Enum):
         Volume number was not found in the 773q field. 
     MISSING_MULTIPLE
         More than one part of 773q is missing.
+    PER_NOT_DIGI
+        No downloaded periodical matches the record (by ISSN or ČČNB).
+    AMBIGUOUS_PAGE
+        Issue number is missing and the page is in more than one issue of the volume.
 
     """
     TO_LINK = auto()
@@ -54,11 +62,22 @@ class ErrorCodes(Enum):
     MISSING_VOL = auto()
     MISSING_MULTIPLE = auto()
 
+    PER_NOT_DIGI = auto()
+    AMBIGUOUS_PAGE = auto()
 
-@dataclass
+
+# columns of linked records saved by `Kram2CLB.to_csv`
+RESULT_FIELDS = ['id', 'location', 'volume',
+                 'issue', 'page', 'error_code', 'link']
+
+
+@dataclass(slots=True)
 class Record:
     """A single record from MARC.
 
+    Records are slotted and the parsed strings are interned,
+    because the same locations repeat across the catalogue.
+
     Attributes
     -----------
     id : str
@@ -69,25 +88,101 @@ class Record:
         Error code assigned to this record.
     link : str
         URL to digitized version.
+    title : str | None
+        Title of the article (field `245a` in marc), if it is available.
     volume : str | None
         Volume number, parsed from `raw_loc`.
     issue : str | None
         Issue number, parsed from `raw_loc`.
     page : str | None
         Page number, parsed from `raw_loc`.
+    pos : int
+        Position in `Kram2CLB.records`, `-1` if the record is not added to a linker.
     """
     id: str
     raw_loc: str
     error_code: ErrorCodes = ErrorCodes.TO_LINK
     link: str | None = None
+    title: str | None = None
 
     volume: str | None = field(init=False)
     issue: str | None = field(init=False)
     page: str | None = field(init=False)
+    pos: int = field(default=-1, repr=False, compare=False)
 
     def __post_init__(self) -> None:
-        self.volume, self.issue, self.page = normalize(
-            *parse_location(self.raw_loc))
+        self.raw_loc = sys.intern(self.raw_loc)
+        self.volume, self.issue, self.page = (None if part is None else sys.intern(part)
+                                              for part in parse_normalized(self.raw_loc))
+
+
+@dataclass(slots=True)
+class VolumePages:
+    """Issues of a volume and their pages (see `Kram2CLB.build_page_index`).
+
+    Attributes
+    ----------
+    issues : list[str]
+        Titles of issues (not paths), in the order of the tree.
+    pages : dict[str, list[str]]
+        Titles of issues by normalized titles of their pages.
+    starts : list[int]
+        First numeric pages of issues with numeric pages, sorted.
+    ranges : list[tuple[int, int, str]]
+        First and last numeric page and the title of an issue, sorted like `starts`.
+    overlapping : bool
+        `True` if page ranges of issues overlap, `ranges` are not used then.
+    """
+    issues: list[str] = field(default_factory=list)
+    pages: dict[str, list[str]] = field(default_factory=dict)
+    starts: list[int] = field(default_factory=list)
+    ranges: list[tuple[int, int, str]] = field(default_factory=list)
+    overlapping: bool = False
+
+    def add_issue(self, issue: str, pages: list[str]) -> None:
+        """Add an issue with (normalized) titles of its pages."""
+        self.issues.append(issue)
+        numbers = []
+        for page in pages:
+            issues = self.pages.setdefault(page, [])
+            if len(issues) == 0 or issues[-1] != issue:
+                issues.append(issue)
+            if page.isdigit():
+                numbers.append(int(page))
+        if len(numbers) > 0:
+            self.ranges.append((min(numbers), max(numbers), issue))
+
+    def finish(self) -> None:
+        """Sort page ranges once all issues are added."""
+        self.ranges.sort()
+        self.starts = [first for first, _, _ in self.ranges]
+        self.overlapping = any(prev[1] >= next[0]
+                               for prev, next in zip(self.ranges, self.ranges[1:]))
+
+    def find_issues(self, page: str) -> list[str]:
+        """Find issues containing a page.
+
+        The page is looked up by its title first,
+        a numeric page is then looked up in page ranges of issues.
+
+        Parameters
+        ----------
+        page : str
+            Normalized title of the page.
+
+        Returns
+        -------
+        list[str]
+            Titles of issues.
+        """
+        if page in self.pages:
+            return self.pages[page]
+        if not page.isdigit() or self.overlapping:
+            return []
+        i = bisect_right(self.starts, int(page))-1
+        if i >= 0 and self.ranges[i][1] >= int(page):
+            return [self.ranges[i][2]]
+        return []
 
 
 class Kram2CLB:
@@ -97,7 +192,7 @@ class Kram2CLB:
     -----------
     records : list[Record]
         A list of records read from `marc_path` file.
-    tree : nx.DiGraph
+    tree : CompactTree
         The tree of the digited periodical.
     root_id : str
         Root identifier, by default `root`.
@@ -111,20 +206,35 @@ class Kram2CLB:
         The base URL of the library.
     link_uuid : str
         Part of URL linking to a particular UUID, by default `uuid`.
+    norm_index : dict[tuple[str, ...], list[str]] | None
+        Keys of nodes by their normalized titles (volume, issue, page),
+        built by `normalize_tree` when exact paths are not found.
+    page_index : dict[str, VolumePages] | None
+        Issues and pages of volumes by keys of volumes,
+        built by `build_page_index` when records with a missing issue are fixed.
+    article_index : ArticleIndex | None
+        Articles in the tree, built when records with a title are not linked to a page.
     """
 
-    def __init__(self, perio: Periodical, marc_path: str) -> None:
+    def __init__(self, perio: Periodical, marc_path: str | None = None) -> None:
         self.records: list[Record] = list()
+        # positions of records in `records` by their error codes
+        self._buckets: dict[ErrorCodes, set[int]] = {
+            code: set() for code in ErrorCodes}
 
-        self.tree: nx.DiGraph = perio.tree
+        self.tree: CompactTree = perio.tree
         self.root_id: str = perio.root_id
         self.id_sep: str = perio.id_sep
         self.name: str = perio.name
         self.issn: str | None = perio.issn
         self.url: str = perio.url
         self.link_uuid: str = perio.link_uuid
+        self.norm_index: dict[tuple[str, ...], list[str]] | None = None
+        self.page_index: dict[str, VolumePages] | None = None
+        self.article_index: ArticleIndex | None = None
 
-        self.load_marc(marc_path)
+        if marc_path is not None:
+            self.load_marc(marc_path)
 
     def load_marc(self, path: str):
         """Load marc records from a csv to `self.records`.
@@ -132,16 +242,30 @@ class Kram2CLB:
         Parameters
         ----------
         path : str
-            Path to csv file with marc records.
+            Path to csv file with marc records of this periodical.
+            Records of many periodicals are linked by `BatchLinker`.
         """
-        # so far, we only support handmade csv with records from a single periodical
-        # TODO: full support (ie. match periodicals 😬)
         with open(path) as f:
             reader = csv.DictReader(f, delimiter=';')
-            for line in reader:
-                id = line['id']
-                for raw_loc in line["location"].split(';'):
-                    self.records.append(Record(id, raw_loc))
+            self.add_records((line['id'], line['location'], line.get('title'))
+                             for line in reader)
+
+    def add_records(self, rows: Iterable[tuple[str, ...]]) -> None:
+        """Add marc records to `self.records`.
+
+        Parameters
+        ----------
+        rows : Iterable[tuple[str, ...]]
+            Record identifiers (`001`), locations (`773q`, separated by `;`)
+            and optionally titles of articles (`245a`, can be `None`).
+        """
+        for rec_id, location, *title in rows:
+            title = title[0] if len(title) > 0 and title[0] else None
+            for raw_loc in location.split(';'):
+                rec = Record(rec_id, raw_loc, title=title,
+                             pos=len(self.records))
+                self._buckets[rec.error_code].add(rec.pos)
+                self.records.append(rec)
 
     def make_url(self, uuid: str) -> str:
         """Generate a URL to issue/volume/page.
@@ -176,12 +300,35 @@ class Kram2CLB:
         list[Record]
             Records with error code other than SUCCESS or TO_LINK.
         """
-        fails = filter(lambda rec: rec.error_code is not
-                       ErrorCodes.SUCCESS and rec.error_code is not ErrorCodes.TO_LINK, self.records)
-        return list(fails)
+        return self._filter_error_codes(*(code for code in ErrorCodes
+                                          if code is not ErrorCodes.SUCCESS and code is not ErrorCodes.TO_LINK))
+
+    def rows(self) -> Iterator[dict[str, str | None]]:
+        """Iterate over records as rows of the result.
 
-    def to_csv(self):
-        raise NotImplementedError
+        Yields
+        ------
+        dict[str, str | None]
+            Record identifier, location, parsed volume, issue, page,
+            name of the error code and the link (see `RESULT_FIELDS`).
+        """
+        for rec in self.records:
+            yield {'id': rec.id, 'location': rec.raw_loc, 'volume': rec.volume, 'issue': rec.issue,
+                   'page': rec.page, 'error_code': rec.error_code.name, 'link': rec.link}
+
+    def to_csv(self, path: str) -> None:
+        """Save linked records to a csv file.
+
+        Parameters
+        ----------
+        path : str
+            Path to the csv file (delimited by `;`).
+        """
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, RESULT_FIELDS, delimiter=';')
+            writer.writeheader()
+            writer.writerows(self.rows())
+        logging.info(f'Saved {len(self.records)} records to `{path}`')
 
     def diagnose_fails(self):
         """Diagnose why linking failed.
@@ -189,9 +336,47 @@ class Kram2CLB:
         self._diagnose_773q()
         return
 
-    def normalize_tree(self):
-        # normalizuj strom třeba tak, aby odstranil závorky a názvech atd.
-        raise NotImplementedError
+    def normalize_tree(self) -> None:
+        """Build `norm_index`, a secondary index of the tree by normalized titles.
+
+        Titles of nodes are normalized by `normalize_title`
+        (eg. volume `2 (29)` is `2`), the tree itself is not changed.
+        More nodes can have the same normalized titles.
+        """
+        self.norm_index = dict()
+        stack = [(self.root_id, ())]
+        while stack:
+            node, norm_key = stack.pop()
+            start = len(node)+len(self.id_sep)
+            for child in self.tree.successors(node):
+                child_key = norm_key + (normalize_title(child[start:]),)
+                self.norm_index.setdefault(child_key, []).append(child)
+                stack.append((child, child_key))
+        logging.info(
+            f'Built index of {len(self.norm_index)} normalized titles of `{self.name}`')
+
+    def _find_normalized(self, parts: list[str | None]) -> str | None:
+        """Find a node by normalized titles (see `normalize_tree`).
+
+        Parameters
+        ----------
+        parts : list[str | None]
+            Volume, issue, page (anything can be omitted).
+
+        Returns
+        -------
+        str | None
+            Key of the node, `None` if there is no such node or more of them.
+        """
+        if self.norm_index is None:
+            self.normalize_tree()
+        norm_key = tuple(normalize_title(part) for part in parts if part)
+        candidates = self.norm_index.get(norm_key, [])
+        if len(candidates) > 1:
+            logging.info(
+                f'`{self.id_sep.join(norm_key)}` matches {len(candidates)} nodes: {candidates}')
+            return None
+        return candidates[0] if len(candidates) == 1 else None
 
     def success_rate(self) -> float:
         """Return linking success rate.
@@ -201,7 +386,7 @@ class Kram2CLB:
         float
             Linking success rate.
         """
-        return len(self.return_successes())/len(self.records)
+        return len(self._buckets[ErrorCodes.SUCCESS])/len(self.records)
 
     def fix_errors(self) -> None:
         """Fix failed matches based on their error code.
@@ -245,21 +430,95 @@ class Kram2CLB:
             page_url = self.make_url(page_node['uuid'])
             return page_url
 
+    def build_article_index(self) -> None:
+        """Build `article_index` of `article` nodes in the tree."""
+        self.article_index = ArticleIndex.from_tree(
+            self.tree, self.root_id, self.id_sep)
+
+    def _link_article(self, rec: Record) -> str | None:
+        """Try making a URL to the article of a record.
+
+        The article is found by words of `rec.title`
+        in the volume and the issue of the record and on its page.
+        Records whose volume or issue is not in the tree are not linked.
+
+        Parameters
+        ----------
+        rec : Record
+            Record with a title.
+
+        Returns
+        -------
+        str | None
+            URL to the article or `None` if there is not exactly one such article.
+        """
+        if self.article_index is None:
+            self.build_article_index()
+        if len(self.article_index) == 0:
+            return None
+        # the volume and the issue of the record, if they are known
+        parts = [part for part in [rec.volume, rec.issue] if part is not None]
+        parent = None
+        if len(parts) > 0:
+            parent = self._make_path_to_node([self.root_id, *parts])
+            if parent not in self.tree:
+                parent = self._find_normalized(parts)
+            if parent is None:
+                return None
+        issue = parent if len(parts) == 2 else None
+        found = self.article_index.find(rec.title, rec.page, issue)
+        if issue is None and parent is not None:
+            found = [i for i in found
+                     if self.article_index.keys[i].startswith(parent+self.id_sep)]
+        if len(found) != 1:
+            logging.info(f'{rec.id} `{rec.title}` matches {len(found)} articles')
+            return None
+        return self.make_url(self.article_index.uuids[found[0]])
+
     def link(self):
         """Try linking records with code `TO_LINK`.
+
+        Paths not found in the tree are looked up by normalized titles
+        (see `normalize_tree`), then records with a title by articles
+        (see `_link_article`).
         """
         to_process = self._filter_error_codes(ErrorCodes.TO_LINK)
         for rec in to_process:
-            path_to_page = self._make_path_to_node(
-                [self.root_id, rec.volume, rec.issue, rec.page])
-            link_to_page = self._link(path_to_page)
-            if link_to_page is not None:
-                logging.info(f'{rec.id} `{path_to_page}` --> `{link_to_page}`')
-                rec.error_code = ErrorCodes.SUCCESS
-                rec.link = link_to_page
-            else:
-                logging.info(f'{rec.id} `{path_to_page}` not found')
-                rec.error_code = ErrorCodes.TO_DIAGNOSE
+            if not self._link_record(rec):
+                self.set_code(rec, ErrorCodes.TO_DIAGNOSE)
+
+    def _link_record(self, rec: Record) -> bool:
+        """Try linking a record, set its link and code `SUCCESS` if it is found.
+
+        Parameters
+        ----------
+        rec : Record
+            Record from `records`.
+
+        Returns
+        -------
+        bool
+            `True` if the record was linked, its code is not changed otherwise.
+        """
+        path_to_page = self._make_path_to_node(
+            [self.root_id, rec.volume, rec.issue, rec.page])
+        link_to_page = self._link(path_to_page)
+        if link_to_page is None:
+            # eg. volume `2 (29)` in Kramerius is `2` in ČLB
+            norm_path = self._find_normalized(
+                [rec.volume, rec.issue, rec.page])
+            if norm_path is not None:
+                path_to_page = norm_path
+                link_to_page = self._link(norm_path)
+        if link_to_page is None and rec.title is not None:
+            link_to_page = self._link_article(rec)
+        if link_to_page is None:
+            logging.info(f'{rec.id} `{path_to_page}` not found')
+            return False
+        logging.info(f'{rec.id} `{path_to_page}` --> `{link_to_page}`')
+        self.set_code(rec, ErrorCodes.SUCCESS)
+        rec.link = link_to_page
+        return True
 
     def _diagnose_773q(self) -> None:
         """Look for inconsitencies in the 773q field.
@@ -269,92 +528,129 @@ class Kram2CLB:
             nones = filter(lambda x: x is None, [
                            rec.volume, rec.issue, rec.page])
             if len(list(nones)) > 1:
-                rec.error_code = ErrorCodes.MISSING_MULTIPLE
+                self.set_code(rec, ErrorCodes.MISSING_MULTIPLE)
                 continue
 
             if rec.volume is None:
-                rec.error_code = ErrorCodes.MISSING_VOL
+                self.set_code(rec, ErrorCodes.MISSING_VOL)
             if rec.issue is None:
-                rec.error_code = ErrorCodes.MISSING_ISSUE
+                self.set_code(rec, ErrorCodes.MISSING_ISSUE)
             if rec.page is None:
-                rec.error_code = ErrorCodes.MISSING_PAGE
+                self.set_code(rec, ErrorCodes.MISSING_PAGE)
         return
 
-    def _filter_error_codes(self, err_code: ErrorCodes) -> list[Record]:
-        """Filter `records` based on an error code.
+    def _filter_error_codes(self, *err_codes: ErrorCodes) -> list[Record]:
+        """Filter `records` based on error codes.
 
         Parameters
         ----------
-        err_code : ErrorCodes
-            Error code used for filtering.
+        *err_codes : ErrorCodes
+            Error codes used for filtering.
 
         Returns
         -------
         list[Record]
-            List of Records with error code matching the provided `err_code`.
+            List of Records with error code matching one of `err_codes`,
+            in the order of `records`.
         """
-        filtered = filter(lambda rec: rec.error_code is err_code, self.records)
-        return list(filtered)
+        positions = set().union(*(self._buckets[code] for code in err_codes))
+        return [self.records[pos] for pos in sorted(positions)]
 
-    def _fix_missing_issue(self) -> None:
-        """Try fixing records that have a missing issue number.
-        """
-        wrong_issues = self._filter_error_codes(ErrorCodes.MISSING_ISSUE)
-        for rec in wrong_issues:
-            if self._volume_has_one_issue(rec.volume):
-                new_issue = self._find_only_child_of_vol(rec.volume)
-                logging.info(
-                    f'Volume `{rec.volume}` has only one issue: `{new_issue}`, using it as a new issue')
-                rec.issue = new_issue
-                rec.error_code = ErrorCodes.TO_LINK
-            else:
-                logging.info(
-                    f'Volume `{rec.volume}` has more than one child, unable to fix.')
-        return
+    def set_code(self, rec: Record, err_code: ErrorCodes) -> None:
+        """Set the error code of a record.
 
-    def _volume_has_one_issue(self, volume: str | None) -> bool:
-        """Check that given volume has only one child (= one issue).
+        Always use this instead of setting `rec.error_code`,
+        so that filtering by error codes stays consistent.
 
         Parameters
         ----------
-        volume : str | None
-            Volume number (not a path).
-
-        Returns
-        -------
-        bool
-            `True` if volume has one child, `False` otherwise.
+        rec : Record
+            Record from `records`.
+        err_code : ErrorCodes
+            New error code.
         """
-        path_to_vol = self._make_path_to_node([self.root_id, volume])
-        try:
-            self.tree.nodes[path_to_vol]
-        except KeyError:
-            return False
-        children = list(self.tree.successors(path_to_vol))
-        return True if len(children) == 1 else False
+        self._buckets[rec.error_code].discard(rec.pos)
+        self._buckets[err_code].add(rec.pos)
+        rec.error_code = err_code
+
+    def build_page_index(self) -> None:
+        """Build `page_index`, issues of every volume by titles of their pages.
 
-    def _find_only_child_of_vol(self, volume: str | None) -> str:
-        """Find issue number of an issue that is the only child of a volume.
+        The tree is walked once, titles of pages are normalized by `normalize_title`.
+        """
+        self.page_index = dict()
+        sep_len = len(self.id_sep)
+        for vol in self.tree.successors(self.root_id):
+            vol_pages = VolumePages()
+            for issue in self.tree.successors(vol):
+                pages = [normalize_title(page[len(issue)+sep_len:])
+                         for page in self.tree.successors(issue)]
+                vol_pages.add_issue(issue[len(vol)+sep_len:], pages)
+            vol_pages.finish()
+            self.page_index[vol] = vol_pages
+        logging.info(
+            f'Built page index of {len(self.page_index)} volumes of `{self.name}`')
+
+    def _volume_pages(self, volume: str | None) -> VolumePages | None:
+        """Return issues and pages of a volume.
 
         Parameters
         ----------
         volume : str | None
-            Volume number (not a path).
+            Volume number (not a path), normalized titles are tried too.
 
         Returns
         -------
-        str
-            Issue number (not a path).
-
-        Raises
-        ------
-        ValueError
-            Volume has more than one child.
+        VolumePages | None
+            Issues and pages of the volume, `None` if there is no such volume.
         """
+        if volume is None:
+            return None
+        if self.page_index is None:
+            self.build_page_index()
         path_to_vol = self._make_path_to_node([self.root_id, volume])
-        children = list(self.tree.successors(path_to_vol))
-        if len(children) != 1:
-            raise ValueError('More than one child!')
-        issue_path = children[0]
-        issue = issue_path.split('/')[-1]
-        return issue
+        if path_to_vol not in self.page_index:
+            path_to_vol = self._find_normalized([volume])
+        return self.page_index.get(path_to_vol)
+
+    def _fix_missing_issue(self) -> None:
+        """Try fixing records that have a missing issue number.
+
+        The issue is the only issue of the volume
+        or the only issue containing the page (see `VolumePages.find_issues`).
+        Records with pages in more than one issue get `AMBIGUOUS_PAGE`.
+        Records are linked with the new issue at once, if that fails,
+        the issue is not kept and the code stays `MISSING_ISSUE`.
+        """
+        wrong_issues = self._filter_error_codes(ErrorCodes.MISSING_ISSUE)
+        for rec in wrong_issues:
+            vol_pages = self._volume_pages(rec.volume)
+            if vol_pages is None:
+                logging.info(
+                    f'Volume `{rec.volume}` not found, unable to fix.')
+                continue
+            if len(vol_pages.issues) == 1:
+                new_issue = vol_pages.issues[0]
+                logging.info(
+                    f'Volume `{rec.volume}` has only one issue: `{new_issue}`, using it as a new issue')
+            else:
+                issues = [] if rec.page is None else vol_pages.find_issues(
+                    normalize_title(rec.page))
+                if len(issues) > 1:
+                    logging.info(
+                        f'Page `{rec.page}` is in issues {issues} of volume `{rec.volume}`, unable to fix.')
+                    self.set_code(rec, ErrorCodes.AMBIGUOUS_PAGE)
+                    continue
+                if len(issues) == 0:
+                    logging.info(
+                        f'Page `{rec.page}` not found in volume `{rec.volume}`, unable to fix.')
+                    continue
+                new_issue = issues[0]
+                logging.info(
+                    f'Page `{rec.page}` of volume `{rec.volume}` is in issue `{new_issue}`, using it as a new issue')
+            rec.issue = new_issue
+            if not self._link_record(rec):
+                logging.info(
+                    f'{rec.id} not found in issue `{new_issue}`, keeping the issue missing')
+                rec.issue = None
+        return
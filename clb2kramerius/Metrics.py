@@ -0,0 +1,289 @@
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+# upper bounds of latency buckets in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# events counted per host
+EVENTS = ('retries', 'errors', 'failures', 'cache_hits', 'cache_misses')
+CAPTURE_PID = re.compile(r'uuid:[^/?&"]+')
+
+
+def endpoint_of(url: str) -> tuple[str, str]:
+    """Return the host and the endpoint of a request URL.
+
+    UUIDs in the path are replaced with `{pid}`. Search requests
+    (Kramerius 7) are told apart by the field of their query,
+    eg. `/search/api/client/v7.0/search?q=own_parent.pid`.
+
+    Parameters
+    ----------
+    url : str
+        Request URL.
+
+    Returns
+    -------
+    tuple[str, str]
+        Host and endpoint.
+    """
+    parsed = urlparse(url)
+    endpoint = CAPTURE_PID.sub('{pid}', parsed.path)
+    query = parse_qs(parsed.query).get('q')
+    if query:
+        endpoint += '?q='+query[0].split(':')[0].lstrip('(')
+    return parsed.netloc, endpoint
+
+
+class Histogram:
+    """Histogram of latencies with fixed buckets (`LATENCY_BUCKETS`).
+
+    Attributes
+    ----------
+    counts : list[int]
+        Number of observations in every bucket (not cumulative), the last one is `+Inf`.
+    sum : float
+        Sum of observations.
+    count : int
+        Number of observations.
+    """
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self) -> None:
+        self.counts = [0]*(len(LATENCY_BUCKETS)+1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = 0
+        while i < len(LATENCY_BUCKETS) and value > LATENCY_BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> dict[str, int]:
+        """Return cumulative counts by upper bounds of buckets (as in Prometheus)."""
+        buckets = dict()
+        total = 0
+        for bound, count in zip(list(LATENCY_BUCKETS)+['+Inf'], self.counts):
+            total += count
+            buckets[str(bound)] = total
+        return buckets
+
+
+class Metrics:
+    """Metrics of downloading from Kramerius, see `KramAPIBase.set_metrics`.
+
+    Collects latencies, transferred bytes and status codes of requests
+    by host and endpoint, retries, errors and cache hits by host,
+    the number of downloaded nodes and the depth of the queue of nodes
+    waiting for a request (`bfs`). Metrics are written to `sinks`
+    by `flush`, which is also called every `interval` seconds
+    while requests are made. Thread-safe.
+
+    Attributes
+    ----------
+    sinks : list
+        Objects with a `write(snapshot: dict)` method,
+        eg. `JsonLinesSink` or `PrometheusSink`.
+    labels : dict[str, str]
+        Labels of all metrics (eg. the periodical).
+    interval : float | None
+        Flush every `interval` seconds, `None` to flush only when asked.
+    """
+
+    def __init__(self, sinks: list | None = None, labels: dict[str, str] | None = None, interval: float | None = 60.0) -> None:
+        self.sinks = [] if sinks is None else sinks
+        self.labels = dict() if labels is None else labels
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start = time.monotonic()
+        self._last_flush = self._start
+        self._latency: dict[tuple[str, str], Histogram] = dict()
+        self._bytes: dict[tuple[str, str], int] = dict()
+        self._statuses: dict[tuple[str, str], dict[int, int]] = dict()
+        self._events: dict[str, dict[str, int]] = dict()
+        self._nodes = 0
+        self._queue_depth = 0
+
+    def observe_request(self, url: str, seconds: float, n_bytes: int, status: int) -> None:
+        """Record a finished request.
+
+        Parameters
+        ----------
+        url : str
+            Request URL.
+        seconds : float
+            Latency of the request.
+        n_bytes : int
+            Size of the response body.
+        status : int
+            Status code.
+        """
+        key = endpoint_of(url)
+        with self._lock:
+            if key not in self._latency:
+                self._latency[key] = Histogram()
+                self._bytes[key] = 0
+                self._statuses[key] = dict()
+            self._latency[key].observe(seconds)
+            self._bytes[key] += n_bytes
+            self._statuses[key][status] = self._statuses[key].get(status, 0)+1
+        self._maybe_flush()
+
+    def add_event(self, url: str, event: str) -> None:
+        """Count an event (one of `EVENTS`) of the host of `url`."""
+        host = urlparse(url).netloc
+        with self._lock:
+            events = self._events.setdefault(host, dict.fromkeys(EVENTS, 0))
+            events[event] += 1
+
+    def add_nodes(self, n: int) -> None:
+        """Count downloaded nodes."""
+        with self._lock:
+            self._nodes += n
+
+    def set_queue_depth(self, depth: int) -> None:
+        """Set the number of nodes waiting for a request."""
+        with self._lock:
+            self._queue_depth = depth
+
+    def snapshot(self) -> dict:
+        """Return all metrics as a JSON-serializable dictionary."""
+        with self._lock:
+            elapsed = time.monotonic()-self._start
+            endpoints = [{'host': host, 'endpoint': endpoint,
+                          'requests': hist.count,
+                          'bytes': self._bytes[(host, endpoint)],
+                          'statuses': {str(status): n for status, n in self._statuses[(host, endpoint)].items()},
+                          'latency': {'buckets': hist.cumulative(), 'sum': hist.sum, 'count': hist.count}}
+                         for (host, endpoint), hist in self._latency.items()]
+            return {'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'labels': dict(self.labels),
+                    'elapsed': elapsed,
+                    'nodes': self._nodes,
+                    'nodes_per_sec': self._nodes/elapsed if elapsed > 0 else 0.0,
+                    'queue_depth': self._queue_depth,
+                    'endpoints': endpoints,
+                    'hosts': {host: dict(events) for host, events in self._events.items()}}
+
+    def flush(self) -> None:
+        """Write a snapshot of metrics to all sinks."""
+        with self._flush_lock:
+            self._last_flush = time.monotonic()
+            snapshot = self.snapshot()
+            for sink in self.sinks:
+                try:
+                    sink.write(snapshot)
+                except OSError as err:
+                    logging.error(f'Unable to write metrics to {sink}: {err}')
+
+    def _maybe_flush(self) -> None:
+        if self.interval is None or time.monotonic()-self._last_flush < self.interval:
+            return
+        # only one thread flushes, the others do not wait
+        if self._flush_lock.locked():
+            return
+        self.flush()
+
+
+class JsonLinesSink:
+    """Append snapshots of metrics to a JSON Lines file.
+
+    Attributes
+    ----------
+    path : str
+        Path to the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def __str__(self) -> str:
+        return f'JsonLinesSink({self.path})'
+
+    def write(self, snapshot: dict) -> None:
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(snapshot, ensure_ascii=False)+'\n')
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if len(labels) == 0:
+        return ''
+    return '{'+','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())+'}'
+
+
+class PrometheusSink:
+    """Write the last snapshot of metrics to a file in the Prometheus text format.
+
+    The file is replaced atomically, so it can be read
+    (eg. by the textfile collector of node exporter) at any time.
+
+    Attributes
+    ----------
+    path : str
+        Path to the file (usually `*.prom`).
+    prefix : str
+        Prefix of names of metrics, by default `clb2kramerius_`.
+    """
+
+    def __init__(self, path: str, prefix='clb2kramerius_') -> None:
+        self.path = path
+        self.prefix = prefix
+
+    def __str__(self) -> str:
+        return f'PrometheusSink({self.path})'
+
+    def render(self, snapshot: dict) -> str:
+        """Return a snapshot of metrics in the Prometheus text format."""
+        p = self.prefix
+        common = snapshot['labels']
+        lines = []
+
+        def metric(name: str, kind: str, description: str, samples: list[tuple[str, dict, float]]) -> None:
+            lines.append(f"# HELP {p}{name} {description}")
+            lines.append(f'# TYPE {p}{name} {kind}')
+            for suffix, labels, value in samples:
+                lines.append(f'{p}{name}{suffix}{_labels(common | labels)} {value}')
+
+        latency = []
+        for ep in snapshot['endpoints']:
+            labels = {'host': ep['host'], 'endpoint': ep['endpoint']}
+            for bound, count in ep['latency']['buckets'].items():
+                latency.append(('_bucket', labels | {'le': bound}, count))
+            latency.append(('_sum', labels, ep['latency']['sum']))
+            latency.append(('_count', labels, ep['latency']['count']))
+        metric('request_duration_seconds', 'histogram',
+               'Latency of requests to Kramerius.', latency)
+        metric('response_bytes_total', 'counter', 'Size of response bodies.',
+               [('', {'host': ep['host'], 'endpoint': ep['endpoint']}, ep['bytes'])
+                for ep in snapshot['endpoints']])
+        metric('responses_total', 'counter', 'Responses by status code.',
+               [('', {'host': ep['host'], 'endpoint': ep['endpoint'], 'status': status}, n)
+                for ep in snapshot['endpoints'] for status, n in ep['statuses'].items()])
+        for event in EVENTS:
+            metric(f'{event}_total', 'counter', f'Number of {event.replace("_", " ")} by host.',
+                   [('', {'host': host}, events[event]) for host, events in snapshot['hosts'].items()])
+        metric('nodes_total', 'counter', 'Downloaded nodes.',
+               [('', {}, snapshot['nodes'])])
+        metric('nodes_per_second', 'gauge', 'Downloaded nodes per second.',
+               [('', {}, snapshot['nodes_per_sec'])])
+        metric('queue_depth', 'gauge', 'Nodes waiting for a request.',
+               [('', {}, snapshot['queue_depth'])])
+        return '\n'.join(lines)+'\n'
+
+    def write(self, snapshot: dict) -> None:
+        tmp = self.path+'.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.render(snapshot))
+        os.replace(tmp, self.path)
@@ -1,4 +1,25 @@
 import re
+from functools import lru_cache
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # only needed by `parse_locations`
+    pd = None
+
+PAGE_SEP_CHAR = '<'
+ISSUE_SEP_CHAR = ':'
+CAPTURE_VOLUME = re.compile(r'^(.+):')
+CAPTURE_ISSUE = re.compile(r':(.+)<')
+CAPTURE_PAGE = re.compile(r'<(.+)$', re.IGNORECASE)
+CAPTURE_NUMBERS = re.compile(r'(\d+)')
+CAPTURE_BRACKETS = re.compile(r'\([^()]*\)|\[[^\[\]]*\]')
+CAPTURE_WHITESPACE = re.compile(r'\s+')
+CAPTURE_DASH = re.compile(r'\s*-\s*')
+ROMAN_NUMERAL = re.compile(
+    r'^M{0,3}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})$', re.IGNORECASE)
+ROMAN_VALUES = {'I': 1, 'V': 5, 'X': 10, 'L': 50, 'C': 100, 'D': 500, 'M': 1000}
+# number of distinct 773q values remembered by `parse_location` and `parse_normalized`
+CACHE_SIZE = 2**16
 
 
 def standardize_loc(loc: str) -> str:
@@ -20,24 +41,25 @@ def standardize_loc(loc: str) -> str:
     str
         773q field in the form `volume:issue<page`.
     """
-    PAGE_SEP_CHAR = '<'
-    ISSUE_SEP_CHAR = ':'
-    issue_sep = re.search(ISSUE_SEP_CHAR, loc)
-    page_sep = re.search(PAGE_SEP_CHAR, loc)
+    has_issue_sep = ISSUE_SEP_CHAR in loc
+    has_page_sep = PAGE_SEP_CHAR in loc
 
-    if issue_sep is None and page_sep is None:
+    if not has_issue_sep and not has_page_sep:
         return loc+ISSUE_SEP_CHAR+PAGE_SEP_CHAR
-    if issue_sep is None:
-        return re.sub(PAGE_SEP_CHAR, ISSUE_SEP_CHAR+PAGE_SEP_CHAR, loc)
-    if page_sep is None:
+    if not has_issue_sep:
+        return loc.replace(PAGE_SEP_CHAR, ISSUE_SEP_CHAR+PAGE_SEP_CHAR)
+    if not has_page_sep:
         return loc+PAGE_SEP_CHAR
     return loc
 
 
+@lru_cache(maxsize=CACHE_SIZE)
 def parse_location(loc: str) -> tuple[str | None, str | None, str | None]:
     """Parse subfield 773q.
 
     Format is volume:issue<page.
+    The common form with a single `:` followed by a single `<` is split
+    without regular expressions, results are memoized.
 
     Parameters
     ----------
@@ -50,13 +72,21 @@ def parse_location(loc: str) -> tuple[str | None, str | None, str | None]:
         volume, issue, page
     """
     fixed_loc = standardize_loc(loc)
-    capture_volume = r'^(.+):'
-    capture_issue = r':(.+)<'
-    capture_page = r'<(.+)$'
 
-    vol_match = re.search(capture_volume, fixed_loc)
-    issue_match = re.search(capture_issue, fixed_loc)
-    page_match = re.search(capture_page, fixed_loc, re.IGNORECASE)
+    issue_sep = fixed_loc.find(ISSUE_SEP_CHAR)
+    page_sep = fixed_loc.find(PAGE_SEP_CHAR)
+    if (issue_sep < page_sep and '\n' not in fixed_loc
+            and fixed_loc.find(ISSUE_SEP_CHAR, issue_sep+1) == -1
+            and fixed_loc.find(PAGE_SEP_CHAR, page_sep+1) == -1):
+        # same as the regular expressions below (they require non-empty parts)
+        vol = fixed_loc[:issue_sep] or None
+        issue = fixed_loc[issue_sep+1:page_sep] or None
+        page = fixed_loc[page_sep+1:] or None
+        return (vol, issue, page)
+
+    vol_match = CAPTURE_VOLUME.search(fixed_loc)
+    issue_match = CAPTURE_ISSUE.search(fixed_loc)
+    page_match = CAPTURE_PAGE.search(fixed_loc)
 
     vol = vol_match[1] if vol_match is not None else None
     issue = issue_match[1] if issue_match is not None else None
@@ -87,7 +117,7 @@ def replace_separators(vol: str | None, issue: str | None, page: str | None) ->
 
     """
     if issue is not None:
-        issue = re.sub('/', '-', issue)
+        issue = issue.replace('/', '-')
 
     return (vol, issue, page)
 
@@ -109,22 +139,83 @@ def remove_leading_zeros(vol: str | None, issue: str | None, page: str | None) -
     tuple[str | None, str | None, str | None]
         Volume, issue, page.
     """
-    if issue is not None:
-        match = re.findall(r'(\d+)', issue)
-        trimmed = []
-        # remove leading zeros
-        for num in match:
-            trimmed.append(re.sub(r'^0+', '', num))
-
-        # place numbers with removed zeros back to the original string
-        for orig, new in zip(match, trimmed):
-            issue = re.sub(orig, new, issue)
+    # without `0`, there is nothing to remove
+    if issue is not None and '0' in issue:
+        # every number is trimmed in place, so `05/105` is `5/105`
+        issue = CAPTURE_NUMBERS.sub(lambda num: num[1].lstrip('0'), issue)
 
     return (vol, issue, page)
 
 
-def remove_brackets():
-    raise NotImplementedError
+def remove_brackets(title: str) -> str:
+    """Remove bracketed parts of a title.
+
+    Kramerius sometimes adds another numbering in brackets,
+    eg. volume `2 (29)` or `1 [28]` is volume `2` or `1` in ČLB.
+    If nothing but brackets is left, only the brackets are removed.
+
+    Parameters
+    ----------
+    title : str
+        Title of a volume/issue/page.
+
+    Returns
+    -------
+    str
+        Title without bracketed parts.
+    """
+    removed = CAPTURE_BRACKETS.sub(' ', title)
+    if removed.strip() == '':
+        removed = title.translate(str.maketrans('', '', '()[]'))
+    return removed
+
+
+def roman_to_arabic(num: str) -> str | None:
+    """Convert a roman numeral to an arabic one.
+
+    Parameters
+    ----------
+    num : str
+        Roman numeral (upper or lower case).
+
+    Returns
+    -------
+    str | None
+        Arabic numeral, `None` if `num` is not a roman numeral.
+    """
+    if num == '' or ROMAN_NUMERAL.match(num) is None:
+        return None
+    values = [ROMAN_VALUES[char] for char in num.upper()]
+    total = sum(-val if val < next_val else val
+                for val, next_val in zip(values, values[1:]+[0]))
+    return str(total)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_title(title: str) -> str:
+    """Normalize a title of a volume/issue/page for fuzzy matching.
+
+    Brackets are removed (see `remove_brackets`), `/` is replaced with `-`,
+    whitespace is collapsed, leading zeros are removed from numbers
+    and roman numerals (between `-`) are converted to arabic ones.
+    Results are memoized.
+
+    Parameters
+    ----------
+    title : str
+        Title from Kramerius or a part of 773q.
+
+    Returns
+    -------
+    str
+        Normalized title.
+    """
+    title = remove_brackets(title).replace('/', '-')
+    title = CAPTURE_WHITESPACE.sub(' ', title).strip()
+    title = CAPTURE_DASH.sub('-', title)
+    title = CAPTURE_NUMBERS.sub(lambda num: str(int(num[1])), title)
+    parts = title.split('-')
+    return '-'.join(roman_to_arabic(part) or part for part in parts)
 
 
 def normalize(vol: str | None, issue: str | None, page: str | None) -> tuple[str | None, str | None, str | None]:
@@ -134,6 +225,23 @@ def normalize(vol: str | None, issue: str | None, page: str | None) -> tuple[str
     return normalized
 
 
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_normalized(loc: str) -> tuple[str | None, str | None, str | None]:
+    """Parse and normalize subfield 773q, results are memoized.
+
+    Parameters
+    ----------
+    loc : str
+        773$q value
+
+    Returns
+    -------
+    tuple[str | None, str | None, str | None]
+        Normalized volume, issue, page.
+    """
+    return normalize(*parse_location(loc))
+
+
 def check_format(loc: str) -> bool:
     """Check that 773q field is standard.
 
@@ -155,11 +263,84 @@ def check_format(loc: str) -> bool:
     parsed = parse_location(loc)
     # problematic symbols in 773q we want to pay special attention to
     # we can deal with `/`, `[]`
-    PROBLEMS = r'[\ ]'
+    PROBLEMS = ' '
     for item in parsed:
         if item is None:
             return False
         else:
-            if re.search(PROBLEMS, item) is not None:
+            if PROBLEMS in item:
                 return False
     return True
+
+
+def parse_locations(locations: 'pd.Series') -> 'pd.DataFrame':
+    """Parse and normalize a column of 773q fields at once.
+
+    Fields with several locations (separated by `;`) are split into rows.
+    Every distinct location is parsed only once, by column-wise string operations.
+    The result is the same as `parse_normalized` and `check_format`
+    applied to every location.
+
+    Parameters
+    ----------
+    locations : pd.Series
+        Raw 773q values, missing values are treated as empty strings.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns `location` (a single location), `volume`, `issue`, `page`
+        (normalized, `None` if missing) and `is_standard` (see `check_format`).
+        The index is the index of `locations`, repeated for split fields.
+    """
+    if pd is None:
+        raise ImportError('`parse_locations` requires package `pandas`')
+    fields = locations.fillna('').astype(str)
+    # the same fields repeat across the catalogue, so only distinct ones are split and parsed
+    codes, unique_fields = pd.factorize(fields.to_numpy(dtype=object))
+    split = pd.Series(unique_fields, dtype=object).str.split(';')
+    counts = split.str.len().to_numpy()
+    parsed = _parse_unique_locations(
+        split.explode().reset_index(drop=True))
+
+    # rows of `parsed` belonging to every field, in the order of `locations`
+    starts = np.cumsum(counts)-counts
+    n_locs = counts[codes]
+    first = np.cumsum(n_locs)-n_locs
+    positions = np.repeat(starts[codes]-first, n_locs)+np.arange(n_locs.sum())
+    parsed = parsed.take(positions)
+    parsed.index = locations.index.repeat(n_locs)
+    return parsed
+
+
+def _parse_unique_locations(locs: 'pd.Series') -> 'pd.DataFrame':
+    """Parse and normalize distinct locations, see `parse_locations`."""
+    has_issue_sep = locs.str.contains(ISSUE_SEP_CHAR, regex=False)
+    has_page_sep = locs.str.contains(PAGE_SEP_CHAR, regex=False)
+    fixed = locs.where(has_issue_sep | has_page_sep,
+                       locs+ISSUE_SEP_CHAR+PAGE_SEP_CHAR)
+    fixed = fixed.where(has_issue_sep | ~has_page_sep,
+                        locs.str.replace(PAGE_SEP_CHAR, ISSUE_SEP_CHAR+PAGE_SEP_CHAR, regex=False))
+    fixed = fixed.where(~has_issue_sep | has_page_sep, locs+PAGE_SEP_CHAR)
+
+    parsed = pd.DataFrame({'location': locs})
+    parsed['volume'] = fixed.str.extract(CAPTURE_VOLUME, expand=False)
+    parsed['issue'] = fixed.str.extract(CAPTURE_ISSUE, expand=False)
+    parsed['page'] = fixed.str.extract(CAPTURE_PAGE, expand=False)
+
+    is_standard = pd.Series(True, index=locs.index)
+    for col in ['volume', 'issue', 'page']:
+        has_space = parsed[col].str.contains(' ', regex=False)
+        is_standard &= parsed[col].notna() & (has_space != True)
+    parsed['is_standard'] = is_standard
+
+    # leading zeros are removed only from issues with `0`, see `remove_leading_zeros`
+    issue = parsed['issue']
+    with_zero = issue.str.contains('0', regex=False) == True
+    issue = issue.where(~with_zero, issue[with_zero].map(
+        lambda value: remove_leading_zeros(None, value, None)[1]))
+    parsed['issue'] = issue.str.replace('/', '-', regex=False)
+
+    for col in ['volume', 'issue', 'page']:
+        parsed[col] = parsed[col].astype(object).where(parsed[col].notna(), None)
+    return parsed
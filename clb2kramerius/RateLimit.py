@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# maximal number of requests per second to a host
+DEFAULT_RATE = 10.0
+HOST_RATES = {
+    'kramerius5.nkp.cz': 2.0,
+}
+# maximal number of concurrent requests to a host
+DEFAULT_MAX_LIMIT = 16
+HOST_MAX_LIMITS = {
+    'kramerius5.nkp.cz': 2,
+}
+
+
+class TokenBucket:
+    """Token bucket limiting the rate of requests.
+
+    Attributes
+    ----------
+    rate : float
+        Number of tokens added per second.
+    capacity : float
+        Maximal number of tokens, i.e. the largest burst of requests.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take a token, wait until one is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now-self._last)*self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1-self._tokens)/self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """Limiter of requests to a single host.
+
+    The rate of requests is limited by a token bucket.
+    The number of concurrent requests is adjusted by AIMD:
+    it starts at `INITIAL_LIMIT`, grows by one per `limit` fast responses
+    and it is halved after a failure (server errors, connection errors, timeouts).
+    Slow responses (above `latency_target`) shrink it slightly.
+
+    Attributes
+    ----------
+    host : str
+        Host name.
+    bucket : TokenBucket
+        Rate limit.
+    limit : float
+        Current maximal number of concurrent requests.
+    min_limit, max_limit : int
+        Bounds of `limit`.
+    cap : int
+        Largest `max_limit` allowed for the host (see `set_max_limit`).
+    latency_target : float
+        Responses slower than `latency_target` seconds mean the host is overloaded.
+    in_flight : int
+        Number of requests in flight.
+    """
+    DECREASE = 0.5
+    SLOW_DECREASE = 0.9
+    INITIAL_LIMIT = 4
+
+    def __init__(self, host: str, rate: float, min_limit=1, max_limit=DEFAULT_MAX_LIMIT, latency_target=2.0) -> None:
+        self.host = host
+        self.bucket = TokenBucket(rate, max(rate, 1))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.cap = max_limit
+        self.limit = float(min(max(self.INITIAL_LIMIT, min_limit), max_limit))
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        """Wait for a free slot and a token, then make the request."""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        try:
+            self.bucket.acquire()
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def success(self, latency: float) -> None:
+        """Adjust `limit` after a successful response.
+
+        Parameters
+        ----------
+        latency : float
+            Response time in seconds.
+        """
+        with self._cond:
+            if latency <= self.latency_target:
+                self.limit = min(self.max_limit, self.limit + 1/self.limit)
+            else:
+                self.limit = max(self.min_limit,
+                                 self.limit*self.SLOW_DECREASE)
+            self._cond.notify_all()
+
+    def set_max_limit(self, max_limit: int) -> None:
+        """Set `max_limit` (eg. to the number of workers), at most `cap`.
+
+        Parameters
+        ----------
+        max_limit : int
+            Maximal number of concurrent requests.
+        """
+        with self._cond:
+            self.max_limit = max(self.min_limit, min(max_limit, self.cap))
+            self.limit = min(self.limit, float(self.max_limit))
+            self._cond.notify_all()
+
+    def failure(self) -> None:
+        """Halve `limit` after a throttling or server error response, a connection error or a timeout."""
+        with self._cond:
+            self.limit = max(self.min_limit, self.limit*self.DECREASE)
+        logging.warning(
+            f'`{self.host}` is overloaded, lowering concurrency to {int(self.limit)}')
+
+
+_limiters: dict[str, AdaptiveLimiter] = dict()
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(host: str) -> AdaptiveLimiter:
+    """Return the limiter of a host, shared by all API objects in the process.
+
+    Parameters
+    ----------
+    host : str
+        Host name.
+
+    Returns
+    -------
+    AdaptiveLimiter
+        Limiter of the host.
+    """
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveLimiter(
+                host, HOST_RATES.get(host, DEFAULT_RATE),
+                max_limit=HOST_MAX_LIMITS.get(host, DEFAULT_MAX_LIMIT))
+        return _limiters[host]
@@ -0,0 +1,150 @@
+import sqlite3
+import hashlib
+import logging
+import threading
+import time
+import zlib
+
+
+class CacheMiss(LookupError):
+    """Response is not in the cache and the cache is offline."""
+
+
+class ResponseCache:
+    """Persistent on-disk cache of responses from Kramerius API.
+
+    Responses are stored (compressed) in a SQLite database,
+    keyed by a hash of the request URL.
+
+    Attributes
+    ----------
+    path : str
+        Path to the SQLite database.
+    ttl : float | None
+        Responses older than `ttl` seconds are not used.
+        By default `None`, i.e. responses never expire.
+    max_size : int | None
+        Maximal size of stored (compressed) responses in bytes.
+        The least recently used responses are evicted first.
+        By default 1 GB, `None` for unlimited size.
+    offline : bool
+        Serve responses only from the cache, never ask the API.
+        Expired responses are served as well. By default `False`.
+    size : int
+        Size of stored (compressed) responses in bytes.
+    """
+
+    def __init__(self, path: str, ttl: float | None = None, max_size: int | None = 1_000_000_000, offline=False) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        self._lock = threading.Lock()
+        # responses are read and saved from several threads when downloading with `bfs`
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY,
+                                url TEXT NOT NULL,
+                                content BLOB NOT NULL,
+                                size INTEGER NOT NULL,
+                                stored REAL NOT NULL,
+                                accessed REAL NOT NULL)''')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self._conn.commit()
+        self.size = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        logging.info(
+            f'Using response cache `{self.path}` ({self.size} B, {ttl=}, {max_size=}, {offline=})')
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def _make_key(self, url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def get(self, url: str) -> bytes | None:
+        """Return a cached response to a request.
+
+        Parameters
+        ----------
+        url : str
+            Request URL.
+
+        Returns
+        -------
+        bytes | None
+            Content of the response, `None` if it is not cached or it expired.
+
+        Raises
+        ------
+        CacheMiss
+            The response is not cached and the cache is offline.
+        """
+        key = self._make_key(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT content, stored FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                content, stored = row
+                if self.offline or self.ttl is None or now - stored <= self.ttl:
+                    self._conn.execute(
+                        'UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+                    self._conn.commit()
+                    logging.debug(f'Cache hit `{url}`')
+                    return zlib.decompress(content)
+                logging.debug(f'Cached response expired `{url}`')
+
+        if self.offline:
+            raise CacheMiss(f'Response to `{url}` is not cached')
+        return None
+
+    def put(self, url: str, content: bytes) -> None:
+        """Save a response to the cache.
+
+        Parameters
+        ----------
+        url : str
+            Request URL.
+        content : bytes
+            Content of the response.
+        """
+        key = self._make_key(url)
+        compressed = zlib.compress(content)
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute(
+                'SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if old is not None:
+                self.size -= old[0]
+            self._conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                               (key, url, compressed, len(compressed), now, now))
+            self.size += len(compressed)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Remove the least recently used responses until the cache fits to `max_size`."""
+        if self.max_size is None:
+            return
+        while self.size > self.max_size:
+            row = self._conn.execute(
+                'SELECT key, size FROM responses ORDER BY accessed LIMIT 1').fetchone()
+            if row is None:
+                return
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (row[0],))
+            self.size -= row[1]
+
+    def clear(self) -> None:
+        """Remove all responses from the cache."""
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+            self.size = 0
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
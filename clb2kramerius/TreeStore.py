@@ -0,0 +1,201 @@
+import gzip
+import json
+import logging
+import struct
+import sys
+from array import array
+import networkx as nx
+from .CompactTree import CompactTree, NO_MODEL, NO_UUID
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# compact file: MAGIC, VERSION, length of the header, JSON header, node arrays
+MAGIC = b'CLBT'
+VERSION = 1
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def _to_little_endian(arr: array) -> array:
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr
+
+
+def dump_tree(tree: CompactTree | nx.DiGraph, root_id: str, sep: str, params: dict) -> bytes:
+    """Serialize a tree and parameters of a periodical to the compact format.
+
+    Nodes are stored in the order of `CompactTree`
+    as arrays of parent indices, model codes and 16-byte UUIDs.
+    Keys are stored as the last segment only,
+    the full key is `parent key + sep + segment`.
+
+    Parameters
+    ----------
+    tree : CompactTree | nx.DiGraph
+        Tree of a periodical, nodes have attributes `model` and `uuid`.
+    root_id : str
+        Root ID.
+    sep : str
+        Separator used in keys in the tree.
+    params : dict
+        Other parameters of the periodical, saved as JSON.
+
+    Returns
+    -------
+    bytes
+        Serialized tree.
+
+    Raises
+    ------
+    ValueError
+        A key is not made from the key of its parent.
+    """
+    if not isinstance(tree, CompactTree) or tree.sep != sep or tree._find(root_id) != 0:
+        tree = CompactTree.from_networkx(
+            tree if isinstance(tree, nx.DiGraph) else tree.to_networkx(), root_id, sep)
+    labels, parents, codes, uuids, raw_uuids, extra = tree.to_arrays()
+    if len(labels) == 0:
+        labels, parents, codes, uuids = [root_id], array('i', [-1]), bytes([NO_MODEL]), NO_UUID
+        raw_uuids, extra = {0: None}, dict()
+
+    header = dict(params, root_id=root_id, id_sep=sep, n_nodes=len(parents), models=tree.models,
+                  raw_uuids={str(i): uuid for i, uuid in raw_uuids.items()},
+                  extra={str(i): attrs for i, attrs in extra.items() if attrs})
+    header = json.dumps(header, ensure_ascii=False).encode()
+    labels = '\0'.join(['']+labels[1:]).encode()
+    return b''.join([MAGIC, struct.pack('<BI', VERSION, len(header)), header,
+                     _to_little_endian(array('i', parents)).tobytes(), codes, uuids,
+                     struct.pack('<I', len(labels)), labels])
+
+
+def load_tree(data: bytes) -> tuple[CompactTree, dict]:
+    """Deserialize a tree and parameters of a periodical from the compact format.
+
+    Parameters
+    ----------
+    data : bytes
+        Serialized tree (uncompressed).
+
+    Returns
+    -------
+    tuple[CompactTree, dict]
+        Tree and other parameters of the periodical.
+
+    Raises
+    ------
+    ValueError
+        Data are not in the compact format.
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a compact tree file')
+    pos = len(MAGIC)
+    version, header_len = struct.unpack_from('<BI', data, pos)
+    if version != VERSION:
+        raise ValueError(f'Unsupported compact tree version {version}')
+    pos += struct.calcsize('<BI')
+    params = json.loads(data[pos:pos+header_len])
+    pos += header_len
+
+    n = params.pop('n_nodes')
+    models = params.pop('models')
+    raw_uuids = params.pop('raw_uuids')
+    root_id = params['root_id']
+    sep = params['id_sep']
+
+    parents = array('i')
+    parents.frombytes(data[pos:pos+n*parents.itemsize])
+    _to_little_endian(parents)
+    pos += n*parents.itemsize
+    codes = data[pos:pos+n]
+    pos += n
+    uuids = data[pos:pos+16*n]
+    pos += 16*n
+    (labels_len,) = struct.unpack_from('<I', data, pos)
+    pos += 4
+    labels = data[pos:pos+labels_len].decode().split('\0')
+
+    labels[0] = root_id
+    extra = {int(i): attrs for i, attrs in params.pop('extra', dict()).items()}
+    tree = CompactTree.from_arrays(sep, labels, parents, codes, models, uuids,
+                                   {int(i): uuid for i, uuid in raw_uuids.items()}, extra)
+    return tree, params
+
+
+def compress(data: bytes, compression: str | None) -> bytes:
+    """Compress data.
+
+    Parameters
+    ----------
+    data : bytes
+        Data to compress.
+    compression : str | None
+        `gzip`, `zstd` (requires package `zstandard`) or `None`.
+
+    Returns
+    -------
+    bytes
+        Compressed data.
+    """
+    if compression is None:
+        return data
+    if compression == 'gzip':
+        return gzip.compress(data, mtime=0)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError('Compression `zstd` requires package `zstandard`')
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    raise ValueError(f'Unknown compression `{compression}`')
+
+
+def decompress(data: bytes) -> bytes:
+    """Decompress data compressed by gzip or zstd, return other data unchanged.
+
+    Parameters
+    ----------
+    data : bytes
+        Data, possibly compressed.
+
+    Returns
+    -------
+    bytes
+        Decompressed data.
+    """
+    if data[:len(GZIP_MAGIC)] == GZIP_MAGIC:
+        return gzip.decompress(data)
+    if data[:len(ZSTD_MAGIC)] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ImportError('File is compressed by zstd, install package `zstandard`')
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def is_compact(data: bytes) -> bool:
+    """Return `True` if (decompressed) data are in the compact format."""
+    return data[:len(MAGIC)] == MAGIC
+
+
+def save_compact(file: str, tree: CompactTree | nx.DiGraph, root_id: str, sep: str, params: dict, compression: str | None = None) -> None:
+    """Save a tree and parameters of a periodical to a compact file.
+
+    Parameters
+    ----------
+    file : str
+        File to save to.
+    tree : CompactTree | nx.DiGraph
+        Tree of a periodical.
+    root_id : str
+        Root ID.
+    sep : str
+        Separator used in keys in the tree.
+    params : dict
+        Other parameters of the periodical.
+    compression : str | None
+        `gzip`, `zstd` or `None` (default).
+    """
+    data = compress(dump_tree(tree, root_id, sep, params), compression)
+    with open(file, 'wb') as f:
+        f.write(data)
+    logging.info(f'Compact tree saved to `{file}` ({len(data)} B)')
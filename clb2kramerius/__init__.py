@@ -1,3 +1,12 @@
 from .DwnKramerius import *
 from .Linker import *
 from .Parse773 import *
+from .ResponseCache import *
+from .Journal import *
+from .RateLimit import *
+from .TreeStore import *
+from .CompactTree import *
+from .CorpusIndex import *
+from .BatchLinker import *
+from .ArticleIndex import *
+from .Metrics import *
@@ -1,10 +1,19 @@
-from clb2kramerius.DwnKramerius import Periodical, load_periodical
+from clb2kramerius.DwnKramerius import Periodical, DwnMode, load_periodical
+from clb2kramerius.Metrics import Metrics, JsonLinesSink, PrometheusSink
 import logging
 import datetime
 import time
 import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import pandas as pd
 
+# maximal number of periodicals downloaded at once from a library (`main_batch`)
+DEFAULT_PERIODICALS_PER_LIB = 1
+PERIODICALS_PER_LIB = {
+    'mzk': 2,
+}
+
 
 def main_mass():
 
@@ -51,7 +60,11 @@ def main_mass():
                 ccnb=str(row.ccnb)
             )
 
-            per.download(prog_bar, save_part=True)
+            failed = per.download(prog_bar, save_part=True, mode=DwnMode.BFS)
+            if len(failed) > 0:
+                # the partial download is resumed in the next run
+                root_logger.removeHandler(text_log)
+                continue
             per.save(f'{BASE_PATH}{log_title}.json')
             per.delete_temp_file()
 
@@ -63,6 +76,218 @@ def main_mass():
             print(f'Skipping {row.title}')  # TODO: přidat do nějakého logu ?
 
 
+def open_state(path: str) -> sqlite3.Connection:
+    """Open a database with downloaded periodicals.
+
+    Parameters
+    ----------
+    path : str
+        Path to the SQLite database.
+
+    Returns
+    -------
+    sqlite3.Connection
+        Connection to the database.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE IF NOT EXISTS downloaded (
+                        uuid TEXT PRIMARY KEY,
+                        finished TEXT NOT NULL)''')
+    conn.commit()
+    return conn
+
+
+def download_periodical(row: dict, base_path: str, logs_path: str) -> int:
+    """Download a single periodical and save it to `base_path`.
+
+    Intended to be run in a worker process, logs go to a separate file.
+    Metrics of the download go to `logs_path` (`metrics.jsonl`, appended)
+    and `<uuid>.prom` (the last state, Prometheus text format).
+
+    Parameters
+    ----------
+    row : dict
+        Row from `source.csv`.
+    base_path : str
+        Where to save the periodical.
+    logs_path : str
+        Where to save the log.
+
+    Returns
+    -------
+    int
+        Number of nodes whose children could not be downloaded.
+        If it is not zero, the periodical is not saved and the partial download is kept.
+    """
+    log_formatter = logging.Formatter(
+        '%(asctime)s:%(name)s:%(levelname)s:%(message)s')
+    root_logger = logging.getLogger()
+    log_lvl = logging.INFO
+    root_logger.setLevel(log_lvl)
+
+    now = datetime.datetime.now()
+    timestamp = now.strftime(r"%m%d%H%M")
+    text_log = logging.FileHandler(
+        f'{logs_path}{timestamp}_{row["uuid"]}.log', mode='w')
+    text_log.setFormatter(log_formatter)
+    text_log.setLevel(log_lvl)
+    root_logger.addHandler(text_log)
+
+    try:
+        per = Periodical(
+            name=str(row['title']),
+            per_uuid=str(row['uuid']),
+            library=str(row['lib']),
+            kramerius_ver=str(row['kram_ver']),
+            url=str(row['url']),
+            api_url=str(row['api_url']),
+            issn=str(row['issn']),
+            ccnb=str(row['ccnb'])
+        )
+
+        metrics = Metrics([JsonLinesSink(f'{logs_path}metrics.jsonl'),
+                           PrometheusSink(f'{logs_path}{per.per_uuid}.prom')],
+                          labels={'periodical': per.per_uuid, 'library': per.library})
+        failed = per.download(prog_bar=False, save_part=True,
+                              mode=DwnMode.BFS, metrics=metrics)
+        if len(failed) == 0:
+            per.save(f'{base_path}{per.per_uuid}.json')
+            per.delete_temp_file()
+    finally:
+        # worker processes are reused for other periodicals
+        root_logger.removeHandler(text_log)
+        text_log.close()
+    return len(failed)
+
+
+def main_batch(processes=4):
+    """Download several periodicals from `source.csv` at once.
+
+    At most `PERIODICALS_PER_LIB` periodicals are downloaded from a library at once.
+    Downloaded periodicals are recorded in `data/downloaded.sqlite`, `source.csv` is not modified.
+
+    Parameters
+    ----------
+    processes : int
+        Number of worker processes, by default `4`.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s:%(name)s:%(levelname)s:%(message)s')
+
+    BASE_PATH = 'data/'
+    SOURCE_CSV = BASE_PATH+'source.csv'
+    LOGS_PATH = BASE_PATH+'logs/'
+    STATE_DB = BASE_PATH+'downloaded.sqlite'
+    with open(SOURCE_CSV) as f:
+        csv = pd.read_csv(f, delimiter=';', keep_default_na=False)
+
+    state = open_state(STATE_DB)
+    done = {uuid for (uuid,) in state.execute('SELECT uuid FROM downloaded')}
+
+    # periodicals to download, grouped by library
+    queues = dict()
+    for row in csv.to_dict('records'):
+        if row['downloaded'] == 'T' or row['uuid'] in done:
+            print(f'Skipping {row["title"]}')
+            continue
+        queues.setdefault(row['lib'], []).append(row)
+    running = {lib: 0 for lib in queues}
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = dict()
+
+        def submit_ready():
+            # round robin over libraries
+            submitted = True
+            while submitted and len(futures) < processes:
+                submitted = False
+                for lib, rows in queues.items():
+                    limit = PERIODICALS_PER_LIB.get(
+                        lib, DEFAULT_PERIODICALS_PER_LIB)
+                    if len(rows) == 0 or running[lib] >= limit or len(futures) >= processes:
+                        continue
+                    row = rows.pop(0)
+                    futures[pool.submit(download_periodical,
+                                        row, BASE_PATH, LOGS_PATH)] = row
+                    running[lib] += 1
+                    submitted = True
+                    logging.info(f'Downloading `{row["title"]}` ({row["uuid"]})')
+
+        submit_ready()
+        while len(futures) > 0:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                row = futures.pop(future)
+                running[row['lib']] -= 1
+                try:
+                    n_failed = future.result()
+                except (Exception, SystemExit) as err:
+                    logging.error(
+                        f'Downloading `{row["title"]}` ({row["uuid"]}) failed: {err}')
+                    continue
+                if n_failed > 0:
+                    logging.warning(
+                        f'Downloading `{row["title"]}` ({row["uuid"]}) incomplete, {n_failed} nodes failed')
+                    continue
+                state.execute('INSERT OR REPLACE INTO downloaded VALUES (?, ?)',
+                              (row['uuid'], datetime.datetime.now().isoformat()))
+                state.commit()
+                logging.info(f'Downloaded `{row["title"]}` ({row["uuid"]})')
+            submit_ready()
+    state.close()
+
+
+def main_update():
+    """Update already downloaded periodicals, download only new or changed volumes."""
+    log_formatter = logging.Formatter(
+        '%(asctime)s:%(name)s:%(levelname)s:%(message)s')
+    root_logger = logging.getLogger()
+    log_lvl = logging.INFO
+    root_logger.setLevel(log_lvl)
+
+    BASE_PATH = 'data/'
+    SOURCE_CSV = BASE_PATH+'source.csv'
+    LOGS_PATH = BASE_PATH+'logs/'
+    STATE_DB = BASE_PATH+'downloaded.sqlite'
+    with open(SOURCE_CSV) as f:
+        csv = pd.read_csv(f, delimiter=';', keep_default_na=False)
+    state = open_state(STATE_DB)
+    done = {uuid for (uuid,) in state.execute('SELECT uuid FROM downloaded')}
+    state.close()
+
+    for row in csv.itertuples():
+        json_path = f'{BASE_PATH}{row.uuid}.json'
+        is_downloaded = row.downloaded == 'T' or row.uuid in done
+        if not is_downloaded or not os.path.exists(json_path):
+            print(f'Skipping {row.title}')
+            continue
+
+        now = datetime.datetime.now()
+        timestamp = now.strftime(r"%m%d%H%M")
+        log_path = f'{LOGS_PATH}{timestamp}_{row.uuid}_update.log'
+
+        text_log = logging.FileHandler(log_path, mode='w')
+        text_log.setFormatter(log_formatter)
+        text_log.setLevel(log_lvl)
+        root_logger.addHandler(text_log)
+
+        try:
+            per = load_periodical(json_path)
+            failed = per.update(prog_bar=True, mode=DwnMode.BFS)
+            if len(failed) == 0:
+                per.save(json_path)
+            else:
+                logging.warning(
+                    f'Updating `{row.title}` ({row.uuid}) incomplete, {len(failed)} nodes failed')
+        except (Exception, SystemExit) as err:
+            # continue with the next periodical
+            logging.error(f'Updating `{row.title}` ({row.uuid}) failed: {err}')
+        finally:
+            root_logger.removeHandler(text_log)
+            text_log.close()
+
+
 def main_single():  # TODO: remove
     prog_bar = False
     if not prog_bar:
@@ -98,6 +323,7 @@ def main_single():  # TODO: remove
 
 if __name__ == '__main__':
     # main_mass()
+    # main_batch()
     # start = time.time()
     main_single()
     # print(f'it took {time.time()-start:.1f} sec')
@@ -0,0 +1,13 @@
+from clb2kramerius.BatchLinker import link_corpus
+import logging
+
+FORMAT = "[%(asctime)s %(funcName)s():]%(levelname)s: %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.INFO)
+
+# build the index first with `scripts/build_corpus_index.py`
+path_to_index = 'data/corpus.idx'
+path_to_marc = 'data/marc_data/all_marc.csv'
+path_to_result = 'data/linked_all.csv'
+
+if __name__ == "__main__":
+    link_corpus(path_to_marc, path_to_index, path_to_result, processes=4)
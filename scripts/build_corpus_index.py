@@ -0,0 +1,10 @@
+from clb2kramerius.CorpusIndex import build_corpus_index
+import glob
+import logging
+
+FORMAT = "[%(asctime)s %(funcName)s():]%(levelname)s: %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.INFO)
+
+# periodicals saved by the downloader (`data/<per_uuid>.json`)
+paths = sorted(glob.glob('data/uuid:*'))
+build_corpus_index(paths, 'data/corpus.idx')
@@ -1,4 +1,4 @@
-from DwnKramerius import KramAPIv7, Periodical
+from DwnKramerius import DwnMode, Periodical
 from Parse773 import parse_location, normalize
 import logging
 import csv
@@ -21,10 +21,7 @@ per = Periodical(
 per.build_clb_tree('data/marc_data/frenstat_marc.csv')
 print(list(per.clb_tree.successors('root')))
 
-per._select_KramAPI()
-per.api.dfs_with_clb_tree(
-    per.per_uuid, 'periodical', per.root_id, per.clb_tree, per.root_id)
-per.tree = per.api.return_tree()
+per.download(prog_bar=False, save_part=False, mode=DwnMode.CLB)
 print(per.tree)
 per.save('data/frenstat_clb_tree.json')
 
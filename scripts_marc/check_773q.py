@@ -1,28 +1,17 @@
-from clb2kramerius.Parse773 import check_format
-import csv
-from pandas import DataFrame
+from clb2kramerius.Parse773 import parse_locations
+import pandas as pd
 
 path_to_marc = 'data/marc_data/all_marc.csv'
-data = []
 
-with open(path_to_marc) as f:
-    i = 0
-    reader = csv.DictReader(f, delimiter=';')
-    for row in reader:
-        loc = row["location"].split(';')
-        for item in loc:
-            standard = check_format(item)
-            if standard:
-                # print(row['id'], item)
-                # i += 1
-                tpl = (row['periodical'], 1, 0)
-            else:
-                tpl = (row['periodical'], 0, 1)
-            data.append(tpl)
-# print(f'# of nonstandard: {i}')
+marc = pd.read_csv(path_to_marc, delimiter=';', dtype=str,
+                   usecols=['periodical', 'location'], keep_default_na=False)
+parsed = parse_locations(marc['location'])
 
-df = DataFrame(data, columns=['periodical', 'standard', 'nonstandard'])
+df = pd.DataFrame({'periodical': marc['periodical'].loc[parsed.index].to_numpy(),
+                   'standard': parsed['is_standard'].astype(int).to_numpy()})
+df['nonstandard'] = 1-df['standard']
 print(df)
+# print(f'# of nonstandard: {df["nonstandard"].sum()}')
 
 out = df.groupby(['periodical']).sum()
 print(out)
@@ -1,7 +1,9 @@
-from pymarc import MARCReader
-from pandas import DataFrame
-import re
+from pymarc import Record
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import csv
+import os
+import shutil
 """
 Save a periodical from marc to a smaller csv
 """
@@ -17,8 +19,8 @@ def get_856(record) -> list[tuple[str, str]] | list[None]:
     return lst
 
 
-def get_773(record) -> list[tuple[str, str, str | None]] | list[None]:
-    # title; 773q; issn
+def get_773(record) -> list[tuple[str, str, str | None, str | None]] | list[None]:
+    # title; 773q; issn; ččnb of the periodical
     # https://www.loc.gov/marc/bibliographic/bd773.html
     lst = []
     for field in record.get_fields('773'):
@@ -26,10 +28,23 @@ def get_773(record) -> list[tuple[str, str, str | None]] | list[None]:
         per_title = per_title_lst[0] if len(per_title_lst) > 0 else ''
         location = field.get_subfields('q')  # can be a list
         issn = field.get_subfields('x')  # can be a list
-        lst.append((per_title, ';'.join(location), ';'.join(issn)))
+        # record control numbers of the periodical, ččnb starts with `cnb`
+        ccnb = [w for w in field.get_subfields('w') if w.startswith('cnb')]
+        lst.append((per_title, ';'.join(location),
+                   ';'.join(issn), ';'.join(ccnb)))
     return lst
 
 
+def get_245(record) -> str | None:
+    # title of the article
+    # https://www.loc.gov/marc/bibliographic/bd245.html
+    field = record.get('245')
+    if field is None:
+        return None
+    title = ' '.join(field.get_subfields('a'))
+    return title.strip(' /:;=.') or None
+
+
 def get_rec_creation_year(record) -> str | None:
     # první CAT je datum založení záznamu
     cats = record.get_fields('CAT')
@@ -52,7 +67,7 @@ def get_record_id(record) -> str:
     return record.get('001').value()
 
 
-def create_record(record_id, list_773, list_856, pub_year, rec_create_year) -> dict:
+def create_record(record_id, list_773, list_856, pub_year, rec_create_year, title=None) -> dict:
     # i only care about the first one rn
     d = dict()
     d['id'] = record_id
@@ -60,8 +75,9 @@ def create_record(record_id, list_773, list_856, pub_year, rec_create_year) -> d
         d['periodical'] = list_773[0][0].lower().strip()
         d['location'] = list_773[0][1]
         d['issn'] = list_773[0][2]
+        d['ccnb'] = list_773[0][3]
     else:
-        d['periodical'], d['location'], d['issn'] = None, None, None
+        d['periodical'], d['location'], d['issn'], d['ccnb'] = None, None, None, None
 
     if len(list_856) > 0:
         d['digi'] = list_856[0][1]
@@ -71,6 +87,7 @@ def create_record(record_id, list_773, list_856, pub_year, rec_create_year) -> d
         d['link'] = None
     d['pub_year'] = pub_year
     d['create_year'] = rec_create_year
+    d['title'] = title
 
     return d
 
@@ -83,26 +100,131 @@ def is_serial(record) -> bool:
     return record.leader[7] == 'b'
 
 
-if __name__ == "__main__":
-    data = []
-    reader = MARCReader(open('/home/clb/data/ucla_all_v4.mrc', 'rb'))
-    total_records = 2_359_694  # for ucla_all_v4.mrc
-
-    with tqdm(total=total_records, disable=False) as pbar:
-        for record in reader:
-            rec_id = get_record_id(record)
-            lst_856 = get_856(record)
+# the whole dump is split to chunks (more than processes, so that they finish evenly)
+CHUNKS_PER_PROCESS = 8
+# rows are written to disk in batches of this size
+WRITE_BATCH = 10_000
+RECORD_TERMINATOR = b'\x1d'
+MAX_RECORD_LEN = 99_999
+LEADER_LEN = 24
+DIRECTORY_ENTRY_LEN = 12
+COLUMNS = ['id', 'periodical', 'location', 'issn', 'ccnb',
+           'digi', 'link', 'pub_year', 'create_year', 'title']
+
+
+def find_record_start(f, pos: int) -> int:
+    # first record starting at `pos` or later, records end with the terminator
+    # and start with their length (5 digits, so a record has less than 100 000 bytes)
+    if pos == 0:
+        return 0
+    f.seek(pos-1)
+    window = f.read(2*MAX_RECORD_LEN)
+    i = window.find(RECORD_TERMINATOR)
+    while i != -1:
+        if window[i+1:i+6].isdigit():
+            return pos+i
+        i = window.find(RECORD_TERMINATOR, i+1)
+    return pos-1+len(window)
+
+
+def find_chunks(path: str, n_chunks: int) -> list[tuple[int, int]]:
+    # split the file to chunks of whole records
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        bounds = [find_record_start(f, size*i//n_chunks)
+                  for i in range(n_chunks)]
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def iter_raw_records(f, start: int, end: int):
+    # raw records starting in [start, end), broken records are skipped
+    pos = start
+    f.seek(pos)
+    while pos < end:
+        length = f.read(5)
+        if len(length) < 5:
+            break
+        if length.isdigit() and int(length) > 5:
+            rest = f.read(int(length)-5)
+            if rest.endswith(RECORD_TERMINATOR):
+                yield length+rest
+                pos += len(length)+len(rest)
+                continue
+        # continue with the next record after the terminator
+        next_pos = find_record_start(f, pos+1)
+        print(f'Skipping a broken record at {pos} ({next_pos-pos} bytes)')
+        pos = next_pos
+        f.seek(pos)
+
+
+def may_have_773q(raw: bytes) -> bool:
+    # cheap check of the leader and the directory before decoding the record
+    if len(raw) < LEADER_LEN or raw[7:8] != b'b':
+        return False
+    try:
+        base = int(raw[12:17])
+    except ValueError:
+        return True  # let pymarc decide
+    directory = raw[LEADER_LEN:base-1]
+    return any(directory[i:i+3] == b'773' for i in range(0, len(directory), DIRECTORY_ENTRY_LEN))
+
+
+def extract_chunk(path: str, start: int, end: int, part_path: str) -> tuple[int, int]:
+    # extract serials with 773q from one chunk, return # of read and written records
+    n_read, n_written = 0, 0
+    rows = []
+    with open(path, 'rb') as f, open(part_path, 'w', newline='') as out:
+        writer = csv.DictWriter(out, COLUMNS, delimiter=';')
+        for raw in iter_raw_records(f, start, end):
+            n_read += 1
+            if not may_have_773q(raw):
+                continue
+            try:
+                record = Record(data=raw)
+            except Exception as err:
+                print(f'Skipping a broken record at {f.tell()-len(raw)}: {err}')
+                continue
+
             lst_773 = get_773(record)
-            publish_year = get_rec_publish_year(record)
-            rec_create_year = get_rec_creation_year(record)
+            if not (is_serial(record) and len(lst_773) > 0 and rec_has_773q(lst_773[0][1])):
+                continue
+            rec = create_record(get_record_id(record), lst_773, get_856(record),
+                                get_rec_publish_year(record), get_rec_creation_year(record),
+                                get_245(record))
+            rows.append(rec)
+            if len(rows) >= WRITE_BATCH:
+                writer.writerows(rows)
+                n_written += len(rows)
+                rows = []
+        writer.writerows(rows)
+        n_written += len(rows)
+    return n_read, n_written
+
+
+def main(path: str, out_path: str, processes: int) -> None:
+    chunks = find_chunks(path, processes*CHUNKS_PER_PROCESS)
+    part_paths = [f'{out_path}.part{i}' for i in range(len(chunks))]
+    n_read, n_written = 0, 0
+    with ProcessPoolExecutor(max_workers=processes) as pool, tqdm(total=len(chunks)) as pbar:
+        futures = [pool.submit(extract_chunk, path, start, end, part)
+                   for (start, end), part in zip(chunks, part_paths)]
+        for future in as_completed(futures):
+            read, written = future.result()
+            n_read += read
+            n_written += written
+            pbar.update(1)
 
-            rec = create_record(rec_id, lst_773, lst_856,
-                                publish_year, rec_create_year)
+    # concatenate parts in the order of the dump
+    with open(out_path, 'w', newline='') as out:
+        csv.writer(out, delimiter=';').writerow(COLUMNS)
+        for part in part_paths:
+            with open(part, newline='') as f:
+                shutil.copyfileobj(f, out)
+            os.remove(part)
+    print(f'Read {n_read} records, saved {n_written} to {out_path}')
 
-            if is_serial(record) and rec_has_773q(rec['location']):
-                data.append(rec)
-            pbar.update(1)
 
-    df = DataFrame(data)
-    with open('data/marc_data/all_marc_v2.csv', 'w') as f:
-        df.to_csv(f, sep=';', index=False)
+if __name__ == "__main__":
+    main('/home/clb/data/ucla_all_v4.mrc',
+         'data/marc_data/all_marc_v2.csv', processes=os.cpu_count())
@@ -0,0 +1,48 @@
+"""Fakes of the Kramerius API shared by tests."""
+from clb2kramerius.DwnKramerius import KramAPIBase, KramVer
+import networkx as nx
+import requests as req
+import json
+
+
+class FakeKramAPI(KramAPIBase):
+    """Offline Kramerius API serving children from a downloaded tree."""
+    VER = KramVer.V7
+
+    def __init__(self, path: str) -> None:
+        with open(path) as f:
+            json_per = json.load(f)
+        tree = nx.tree_graph(json_per['tree'])
+        self.per_uuid = json_per['per_uuid']
+        self.children = {}
+        for parent, child in nx.bfs_edges(tree, 'root'):
+            parent_uuid = tree.nodes[parent].get('uuid', self.per_uuid)
+            node = tree.nodes[child]
+            title = child[len(parent)+1:]
+            self.children.setdefault(parent_uuid, []).append(
+                {'pid': node['uuid'], 'model': node['model'], 'title.search': title})
+        super().__init__('https://fake.kramerius')
+
+    def _check_version(self) -> None:
+        return
+
+    def _check_url(self) -> None:
+        return
+
+    def _find_children(self, uuid: str) -> list[dict[str, str]]:
+        return self.children.get(uuid, [])
+
+    def _find_node_details(self, node: dict[str, str]) -> tuple[str, str]:
+        return (node['model'], node['title.search'])
+
+
+class FakeSession:
+    def __init__(self, status_codes: list[int]) -> None:
+        self.status_codes = status_codes
+
+    def get(self, url, headers, timeout):
+        resp = req.Response()
+        resp.status_code = self.status_codes.pop(0)
+        resp._content = b'{}'
+        resp.url = url
+        return resp
@@ -0,0 +1,65 @@
+from clb2kramerius.ArticleIndex import ArticleIndex, tokenize
+from clb2kramerius.CompactTree import CompactTree
+
+
+def make_tree() -> CompactTree:
+    # pages are children of issues, articles refer to them (`pages`)
+    tree = CompactTree('/')
+    tree.add_edge('root', 'root/1', model='periodicalvolume', uuid='uuid:v1')
+    for issue in ['1', '2']:
+        tree.add_edge('root/1', f'root/1/{issue}',
+                      model='periodicalitem', uuid=f'uuid:i{issue}')
+    issue_pages = {'root/1/1': ['3', '4', '5', '6', '7', 'VIII'],
+                   'root/1/2': ['1', '2', '20']}
+    for issue, pages in issue_pages.items():
+        for page in pages:
+            tree.add_edge(issue, f'{issue}/{page}', model='page',
+                          uuid=f'uuid:{issue[-1]}-{page}')
+    articles = {'root/1/1/Lidové písně z Valašska': ['3', '4', '5'],
+                'root/1/1/Písně a tance': ['5', '6'],
+                'root/1/1/Zprávy': ['7', 'VIII'],
+                'root/1/2/Zprávy': [],
+                'root/1/2/Dřevěné stavby 1/2': ['2', '20']}
+    for i, (article, pages) in enumerate(articles.items()):
+        issue = article[:len('root/1/1')]
+        tree.add_edge(issue, article, model='article', uuid=f'uuid:a{i}')
+        if pages:
+            tree.nodes[article]['pages'] = [
+                f'uuid:{issue[-1]}-{page}' for page in pages]
+    return tree
+
+
+def test_tokenize():
+    assert tokenize('Lidové písně z Valašska, díl 1') == {
+        'lidové', 'písně', 'valašska', 'díl'}
+
+
+def test_find_articles():
+    index = ArticleIndex.from_tree(make_tree(), 'root', '/')
+    assert len(index) == 5
+    assert index.keys[4] == 'root/1/2/Dřevěné stavby 1/2'
+    assert (index.first_pages[4], index.last_pages[4]) == (2, 20)
+
+    def uuids(found):
+        return [index.uuids[i] for i in found]
+    assert uuids(index.find('Písně')) == ['uuid:a0', 'uuid:a1']
+    assert uuids(index.find('lidové PÍSNĚ')) == ['uuid:a0']
+    assert uuids(index.find('Zprávy', issue='root/1/2')) == ['uuid:a3']
+    assert uuids(index.find('Zprávy', '8', 'root/1/1')) == ['uuid:a2']
+    assert uuids(index.find(None, '5', 'root/1/1')) == ['uuid:a0', 'uuid:a1']
+    assert uuids(index.find('písně', '6', 'root/1/1')) == ['uuid:a1']
+    assert uuids(index.find(None, '10', 'root/1/2')) == ['uuid:a4']
+    assert index.find('Písně', '9', 'root/1/1') == []
+    assert index.find('Noviny') == []
+
+
+def test_pages_nested_under_articles():
+    # Kramerius 5 lists pages of an article as its children
+    tree = CompactTree('/')
+    tree.add_edge('root', 'root/1', model='periodicalitem', uuid='uuid:i1')
+    tree.add_edge('root/1', 'root/1/Zprávy', model='article', uuid='uuid:a')
+    for page in ['04', '5']:
+        tree.add_edge('root/1/Zprávy', f'root/1/Zprávy/{page}',
+                      model='page', uuid=f'uuid:p{page}')
+    index = ArticleIndex.from_tree(tree, 'root', '/')
+    assert (index.first_pages[0], index.last_pages[0]) == (4, 5)
@@ -0,0 +1,40 @@
+from clb2kramerius.DwnKramerius import load_periodical
+from clb2kramerius.CorpusIndex import build_corpus_index
+from clb2kramerius.BatchLinker import link_corpus, link_periodical
+from clb2kramerius.Linker import Kram2CLB
+import csv
+
+
+def test_link_corpus(tmp_path):
+    with open('test_data/frenstat_test.json') as f:
+        text = f.read().replace('"issn"', '"ccnb": "cnb000123456",\n\t"issn"', 1)
+    per_file = tmp_path/'per.json'
+    per_file.write_text(text)
+    per = load_periodical(per_file)
+    index_file = str(tmp_path/'corpus.idx')
+    build_corpus_index([str(per_file)], index_file)
+
+    # records of the test periodical routed by ISSN or ČČNB, and one of another periodical
+    with open('test_data/frenstat_marc.csv') as f:
+        records = list(csv.DictReader(f, delimiter=';'))
+    marc_file = tmp_path/'all_marc.csv'
+    with open(marc_file, 'w', newline='') as f:
+        writer = csv.DictWriter(
+            f, ['id', 'periodical', 'location', 'issn', 'ccnb'], delimiter=';')
+        writer.writeheader()
+        for i, rec in enumerate(records):
+            writer.writerow(rec | ({'issn': ' 1210-1532'} if i % 2 else {'ccnb': 'cnb000123456'}))
+        writer.writerow({'id': 'other', 'location': '1:2<3', 'issn': '0000-0000'})
+
+    out_file = tmp_path/'linked.csv'
+    link_corpus(str(marc_file), index_file, str(out_file), processes=1)
+
+    expected = Kram2CLB(per, 'test_data/frenstat_marc.csv')
+    link_periodical(expected)
+    with open(out_file) as f:
+        linked = list(csv.DictReader(f, delimiter=';'))
+    assert linked[0]['id'] == 'other'
+    assert linked[0]['error_code'] == 'PER_NOT_DIGI'
+    assert [row['error_code'] for row in linked[1:]] == [rec.error_code.name for rec in expected.records]
+    assert [row['link'] or None for row in linked[1:]] == [rec.link for rec in expected.records]
+    assert {row['per_uuid'] for row in linked[1:]} == {per.per_uuid}
@@ -0,0 +1,50 @@
+from clb2kramerius.CompactTree import CompactTree
+import networkx as nx
+import pytest
+import json
+
+
+def load_tree_data():
+    with open('test_data/frenstat_test.json') as f:
+        return json.load(f)['tree']
+
+
+def test_same_as_networkx():
+    data = load_tree_data()
+    graph = nx.tree_graph(data)
+    tree = CompactTree.from_tree_data(data)
+
+    assert len(tree) == len(graph)
+    assert tree.number_of_edges() == graph.number_of_edges()
+    assert tree.tree_data('root') == nx.tree_data(graph, 'root')
+    for node in graph:
+        assert node in tree
+        assert tree.nodes[node] == graph.nodes[node]
+        assert list(tree.successors(node)) == list(graph.successors(node))
+        assert list(tree.predecessors(node)) == list(graph.predecessors(node))
+    assert list(tree.bfs_edges('root/12')) == list(nx.bfs_edges(graph, 'root/12'))
+    assert nx.tree_data(tree.to_networkx(), 'root') == data
+    assert CompactTree.from_networkx(graph, 'root').tree_data('root') == data
+
+
+def test_keys_and_attributes():
+    tree = CompactTree()
+    tree.add_edge('root', 'root/1', model='periodicalvolume', uuid='uuid:1')
+    tree.add_edge('root/1', 'root/1/2/3')
+    tree.add_edge('root/1', 'root/1/2')
+    tree.add_edge('root/1/2', 'root/1/2/4')
+    tree.nodes['root/1/2']['uuid'] = 'uuid:2cd5fa80-56e0-11e5-b7d6-5ef3fc9bb22f'
+    tree.nodes['root/1/2']['number'] = '2'
+
+    # labels may contain the separator
+    assert list(tree.successors('root/1')) == ['root/1/2/3', 'root/1/2']
+    assert 'root/1/2/4' in tree
+    assert 'root/1/2/5' not in tree
+    assert tree.nodes['root/1'] == {'model': 'periodicalvolume', 'uuid': 'uuid:1'}
+    assert tree.nodes['root/1/2'] == {'uuid': 'uuid:2cd5fa80-56e0-11e5-b7d6-5ef3fc9bb22f',
+                                      'number': '2'}
+    assert tree.nodes['root/1/2/3'] == {}
+    with pytest.raises(KeyError):
+        tree.nodes['root/2']
+    with pytest.raises(ValueError):
+        tree.add_edge('root/2', 'root/2/1')
@@ -0,0 +1,46 @@
+from clb2kramerius.DwnKramerius import load_periodical, TreeFormat
+from clb2kramerius.CorpusIndex import build_corpus_index, CorpusIndex
+
+
+def test_corpus_index(tmp_path):
+    with open('test_data/frenstat_test.json') as f:
+        text = f.read().replace('"issn"', '"ccnb": null,\n\t"issn"', 1)
+    json_file = tmp_path/'per.json'
+    json_file.write_text(text)
+    per = load_periodical(json_file)
+    per.tree.nodes['root/12']['uuid'] = 'not-a-uuid'
+    compact_file = str(tmp_path/'per.bin')
+    per.save(compact_file, TreeFormat.COMPACT)
+
+    index_file = str(tmp_path/'corpus.idx')
+    build_corpus_index([compact_file], index_file)
+    index = CorpusIndex(index_file)
+
+    assert len(index) == len(per.tree)
+    assert index.lookup(per.per_uuid, 'root/12') == {'model': 'periodicalvolume',
+                                                      'uuid': 'not-a-uuid'}
+    assert index.lookup(per.per_uuid, 'root/12/xxx') is None
+    assert index.lookup('uuid:other', 'root/12') is None
+
+    indexed = index.periodical(per.per_uuid)
+    assert indexed._params() == per._params()
+    assert len(indexed.tree) == len(per.tree)
+    for node in per.tree:
+        assert indexed.tree.nodes[node] == per.tree.nodes[node]
+        assert list(indexed.tree.successors(node)) == list(per.tree.successors(node))
+        assert indexed.tree.out_degree(node) == per.tree.out_degree(node)
+        assert list(indexed.tree.predecessors(node)) == list(per.tree.predecessors(node))
+    assert indexed.tree.to_compact().tree_data('root') == per.tree.tree_data('root')
+    assert list(indexed.tree) == [
+        'root']+[child for _, child in per.tree.bfs_edges('root')]
+    assert dict(indexed.tree.nodes(data=True)) == dict(per.tree.nodes(data=True))
+    assert indexed.tree.tree_data('root/12') == per.tree.tree_data('root/12')
+
+    # a periodical backed by the index can be saved
+    indexed.save(str(tmp_path/'saved.json'))
+    assert load_periodical(str(tmp_path/'saved.json')).tree.tree_data('root') == \
+        per.tree.tree_data('root')
+    indexed.save(str(tmp_path/'saved.bin'), TreeFormat.COMPACT)
+    assert load_periodical(str(tmp_path/'saved.bin')).tree.tree_data('root') == \
+        per.tree.tree_data('root')
+    index.close()
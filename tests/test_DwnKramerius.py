@@ -1,5 +1,14 @@
-from clb2kramerius.DwnKramerius import Periodical, KramAPIv5, KramAPIv7
+from clb2kramerius.DwnKramerius import Periodical, KramAPIv5, KramAPIv7, KramRequestError, DwnMode, NO_ISSUE
+from clb2kramerius.RateLimit import get_limiter, AdaptiveLimiter
+from clb2kramerius.CompactTree import CompactTree
+from clb2kramerius.ArticleIndex import ArticleIndex
+from clb2kramerius.Parse773 import normalize_title
+import networkx as nx
+import requests as req
+import pytest
+import json
 import logging
+from fakes import FakeKramAPI, FakeSession
 # TODO: potřebuje to nějaké testy pro scrapery, ne????
 logging.basicConfig(level=logging.INFO)
 
@@ -35,3 +44,539 @@ def test_KramScraperV7_find_children():
     expected = [{'pid': 'uuid:40288e00-56e4-11e5-b7d6-5ef3fc9bb22f', 'relation': 'hasIntCompPart'}, {'pid': 'uuid:a158b831-56df-11e5-b7d6-5ef3fc9bb22f', 'relation': 'hasItem'},
                 {'pid': 'uuid:6c855dc0-56e4-11e5-b7d6-5ef3fc9bb22f', 'relation': 'hasItem'}, {'pid': 'uuid:9ca50940-56e1-11e5-b7d6-5ef3fc9bb22f', 'relation': 'hasItem'}]
     assert children == expected
+
+
+def test_bfs_builds_same_tree_as_dfs():
+    dfs_api = FakeKramAPI('test_data/frenstat_test.json')
+    dfs_api._set_root_id('root')
+    dfs_api.dfs(dfs_api.per_uuid, 'periodical', 'root')
+
+    bfs_api = FakeKramAPI('test_data/frenstat_test.json')
+    bfs_api._set_root_id('root')
+    bfs_api.set_workers(4)
+    bfs_api.BATCH_SIZE = 7
+    bfs_api.bfs(bfs_api.per_uuid, 'periodical', 'root')
+
+    assert bfs_api.tree_to_json() == dfs_api.tree_to_json()
+
+
+def test_KramAPIv7_find_children_batch(monkeypatch):
+    api = KramAPIv7.__new__(KramAPIv7)
+    api.url = 'https://fake.kramerius'
+    api.BATCH_ROWS = 2
+    docs = [{'pid': 'uuid:c1', 'model': 'page', 'own_parent.pid': 'uuid:a'},
+            {'pid': 'uuid:c2', 'model': 'page', 'own_parent.pid': 'uuid:b'},
+            {'pid': 'uuid:c3', 'model': 'page', 'own_parent.pid': 'uuid:a'}]
+
+    def get_json(url):
+        # no `nextCursorMark`, paging falls back to `start`
+        start = int(url.split('&start=')[1]) if '&start=' in url else 0
+        return {'response': {'numFound': len(docs), 'docs': docs[start:start+2]}}
+    monkeypatch.setattr(api, 'get_json', get_json)
+
+    children = api._find_children_batch(['uuid:a', 'uuid:b', 'uuid:d'])
+    assert [c['pid'] for c in children['uuid:a']] == ['uuid:c1', 'uuid:c3']
+    assert [c['pid'] for c in children['uuid:b']] == ['uuid:c2']
+    assert children['uuid:d'] == []
+
+
+def test_KramAPIv7_fetch_whole_tree(monkeypatch):
+    fake = FakeKramAPI('test_data/frenstat_test.json')
+    fake._set_root_id('root')
+    fake.dfs(fake.per_uuid, 'periodical', 'root')
+
+    docs = [{'pid': fake.per_uuid, 'model': 'periodical'}]
+    for parent, children in fake.children.items():
+        for i, child in enumerate(children):
+            docs.append(child | {'own_parent.pid': parent, 'rels_ext_index.sort': i})
+    docs.sort(key=lambda doc: doc['pid'])
+
+    api = KramAPIv7.__new__(KramAPIv7)
+    api.url = 'https://fake.kramerius'
+    api.sep = '/'
+    api.tree = CompactTree('/')
+    api._set_root_id('root')
+    api.TREE_ROWS = 1000
+
+    def get_json(url):
+        cursor = url.split('&cursorMark=')[1]
+        start = 0 if cursor == '%2A' else int(cursor)
+        end = min(start+api.TREE_ROWS, len(docs))
+        return {'response': {'numFound': len(docs), 'docs': docs[start:end]},
+                'nextCursorMark': str(end)}
+    monkeypatch.setattr(api, 'get_json', get_json)
+
+    assert api.fetch_whole_tree(fake.per_uuid, 'periodical', 'root')
+    assert api.tree_to_json() == fake.tree_to_json()
+
+
+def test_update_crawls_only_changed_volumes(monkeypatch):
+    with open('test_data/frenstat_test.json') as f:
+        json_per = json.load(f)
+    json_per['ccnb'] = ''
+    full_tree = nx.tree_graph(json_per.pop('tree'))
+
+    vols = list(full_tree.successors('root'))
+    stored = full_tree.copy()
+    stored.remove_nodes_from(nx.descendants(full_tree, vols[-1]) | {vols[-1]})
+    changed_issue = next(full_tree.successors(vols[0]))
+    stored.remove_nodes_from(
+        nx.descendants(full_tree, changed_issue) | {changed_issue})
+
+    fake = FakeKramAPI('test_data/frenstat_test.json')
+    requested = []
+    find_children = fake._find_children
+
+    def logged_find_children(uuid):
+        requested.append(uuid)
+        return find_children(uuid)
+    monkeypatch.setattr(fake, '_find_children', logged_find_children)
+
+    per = Periodical(tree=stored, **json_per)
+    monkeypatch.setattr(per, '_select_KramAPI',
+                        lambda cache=None: setattr(per, 'api', fake))
+    per.update(prog_bar=False)
+
+    assert per.tree.tree_data('root') == nx.tree_data(full_tree, 'root')
+    # children of issues are requested only in downloaded volumes
+    crawled_vols = {vol for vol in vols
+                    if any(full_tree.nodes[issue]['uuid'] in requested
+                           for issue in full_tree.successors(vol))}
+    assert crawled_vols == {vols[0], vols[-1]}
+
+
+def test_update_compares_modification_dates(monkeypatch):
+    with open('test_data/frenstat_test.json') as f:
+        json_per = json.load(f)
+    json_per['ccnb'] = ''
+    json_per.pop('tree')
+
+    fake = FakeKramAPI('test_data/frenstat_test.json')
+    fake.MODIFIED = 'modifiedDate'
+    for children in fake.children.values():
+        for child in children:
+            child['modifiedDate'] = '2024-01-01T00:00:00Z'
+    fake._set_root_id('root')
+    fake.dfs(fake.per_uuid, 'periodical', 'root')
+    stored = fake.return_tree()
+    vols = list(stored.successors('root'))
+    assert stored.nodes[vols[0]]['modified'] == '2024-01-01T00:00:00Z'
+
+    # a new page of an issue, the volume is not modified
+    fake = FakeKramAPI('test_data/frenstat_test.json')
+    fake.MODIFIED = 'modifiedDate'
+    for children in fake.children.values():
+        for child in children:
+            child['modifiedDate'] = '2024-01-01T00:00:00Z'
+    vol_uuid = stored.nodes[vols[1]]['uuid']
+    issue = next(child for child in fake.children[vol_uuid]
+                 if child['model'] == 'periodicalitem')
+    issue['modifiedDate'] = '2025-01-01T00:00:00Z'
+    fake.children[issue['pid']].append(
+        {'pid': 'uuid:new-page', 'model': 'page', 'title.search': '999'})
+    # articles are not downloaded, so they do not change volumes
+    fake.children[stored.nodes[vols[2]]['uuid']].append(
+        {'pid': 'uuid:article', 'model': 'article', 'title.search': 'Zprávy'})
+    requested = []
+    find_children = fake._find_children
+    monkeypatch.setattr(fake, '_find_children',
+                        lambda uuid: requested.append(uuid) or find_children(uuid))
+
+    per = Periodical(tree=stored, **json_per)
+    monkeypatch.setattr(per, '_select_KramAPI',
+                        lambda cache=None: setattr(per, 'api', fake))
+    assert per.update(prog_bar=False) == []
+    issue_id = next(node for node in per.tree.successors(vols[1])
+                    if per.tree.nodes[node]['uuid'] == issue['pid'])
+    assert issue_id+'/999' in per.tree
+    assert per.tree.nodes[issue_id]['modified'] == '2025-01-01T00:00:00Z'
+    crawled_vols = {vol for vol in vols
+                    if any(per.tree.nodes[issue]['uuid'] in requested
+                           for issue in per.tree.successors(vol))}
+    assert crawled_vols == {vols[1]}
+
+
+def test_failed_requests_do_not_stop_update(monkeypatch):
+    with open('test_data/frenstat_test.json') as f:
+        json_per = json.load(f)
+    json_per['ccnb'] = ''
+    full_tree = nx.tree_graph(json_per.pop('tree'))
+
+    def fail(uuid):
+        raise KramRequestError(uuid, 'Timeout')
+
+    fake = FakeKramAPI('test_data/frenstat_test.json')
+    monkeypatch.setattr(fake, '_find_children', fail)
+    per = Periodical(tree=full_tree.copy(), **json_per)
+    monkeypatch.setattr(per, '_select_KramAPI',
+                        lambda cache=None: setattr(per, 'api', fake))
+    failed = per.update(prog_bar=True)
+    assert [(f.uuid, f.key) for f in failed] == [(per.per_uuid, 'root')]
+    assert per.tree.number_of_nodes() == full_tree.number_of_nodes()
+
+    # volumes whose children cannot be requested are downloaded again
+    fake = FakeKramAPI('test_data/frenstat_test.json')
+    failing = {full_tree.nodes[vol]['uuid'] for vol in full_tree.successors('root')}
+    find_children = fake._find_children
+
+    def fail_once(uuid):
+        if uuid in failing:
+            failing.remove(uuid)
+            fail(uuid)
+        return find_children(uuid)
+    monkeypatch.setattr(fake, '_find_children', fail_once)
+    per = Periodical(tree=full_tree.copy(), **json_per)
+    monkeypatch.setattr(per, '_select_KramAPI',
+                        lambda cache=None: setattr(per, 'api', fake))
+    assert per.update(prog_bar=False) == []
+    assert per.tree.tree_data('root') == nx.tree_data(full_tree, 'root')
+
+
+def test_failed_count_of_volumes_does_not_stop_download(monkeypatch):
+    with open('test_data/frenstat_test.json') as f:
+        json_per = json.load(f)
+    json_per['ccnb'] = ''
+    json_per.pop('tree')
+
+    fake = FakeKramAPI('test_data/frenstat_test.json')
+
+    def fail(uuid):
+        raise KramRequestError(uuid, 'Timeout')
+    monkeypatch.setattr(fake, '_find_children', fail)
+    monkeypatch.setattr(fake, '_iter_children', fail)
+    per = Periodical(**json_per)
+    monkeypatch.setattr(per, '_select_KramAPI',
+                        lambda cache=None: setattr(per, 'api', fake))
+    failed = per.download(prog_bar=True, save_part=False)
+    assert [(f.uuid, f.key) for f in failed] == [(per.per_uuid, 'root')]
+
+
+def test_resume_from_journal(tmp_path, monkeypatch):
+    journal = str(tmp_path / 'journal.jsonl')
+    api = FakeKramAPI('test_data/frenstat_test.json')
+    api._set_root_id('root')
+    api.set_partial_save(journal)
+    api.dfs(api.per_uuid, 'periodical', 'root')
+    api.journal.close()
+
+    # interrupt the download in the middle of a batch
+    with open(journal) as f:
+        lines = f.readlines()
+    with open(journal, 'w') as f:
+        f.writelines(lines[:len(lines)//2])
+        f.write(lines[len(lines)//2][:10])
+
+    resumed = FakeKramAPI('test_data/frenstat_test.json')
+    requested = []
+    find_children = resumed._find_children
+    monkeypatch.setattr(resumed, '_find_children',
+                        lambda uuid: requested.append(uuid) or find_children(uuid))
+    resumed._set_root_id('root')
+    resumed.set_partial_save(journal)
+    resumed.prep_partial_down()
+    resumed.bfs(resumed.per_uuid, 'periodical', 'root')
+
+    assert resumed.tree_to_json() == api.tree_to_json()
+    assert len(requested) == len(api.tree) - len(resumed.done_parents)
+
+
+def test_resume_from_legacy_tree(tmp_path, monkeypatch):
+    full = FakeKramAPI('test_data/frenstat_test.json')
+    full._set_root_id('root')
+    full.dfs(full.per_uuid, 'periodical', 'root')
+
+    # older versions saved the tree after every volume to `<uuid>.json`
+    legacy = nx.tree_graph(full.tree_to_json())
+    vols = list(legacy.successors('root'))
+    legacy.remove_nodes_from(
+        {node for vol in vols[2:] for node in nx.descendants(legacy, vol) | {vol}})
+    with open(tmp_path / 'per.json', 'w') as f:
+        json.dump(nx.tree_data(legacy, 'root'), f)
+
+    resumed = FakeKramAPI('test_data/frenstat_test.json')
+    requested = []
+    find_children = resumed._find_children
+    monkeypatch.setattr(resumed, '_find_children',
+                        lambda uuid: requested.append(uuid) or find_children(uuid))
+    resumed._set_root_id('root')
+    resumed.set_partial_save(str(tmp_path / 'per.jsonl'))
+    resumed.prep_partial_down()
+    assert not (tmp_path / 'per.json').exists()
+    assert 'root' not in resumed.done_parents
+    assert set(vols[:2]) <= resumed.done_parents
+    resumed.dfs(resumed.per_uuid, 'periodical', 'root')
+
+    assert resumed.tree_to_json() == full.tree_to_json()
+    assert len(requested) == len(full.tree) - len(legacy) + 1
+
+
+def test_get_response_retries():
+    api = KramAPIv7.__new__(KramAPIv7)
+    api.cache = None
+    api.limiter = get_limiter('fake.kramerius')
+    api.BACKOFF = 0
+
+    api.session = FakeSession([503, 500, 200])
+    assert api.get_response('https://fake.kramerius/a').status_code == 200
+
+    api.session = FakeSession([404])
+    with pytest.raises(KramRequestError):
+        api.get_response('https://fake.kramerius/a')
+
+    api.session = FakeSession([503]*api.MAX_ATTEMPTS)
+    with pytest.raises(KramRequestError):
+        api.get_response('https://fake.kramerius/a')
+
+
+def test_get_json_retries_broken_responses():
+    class BrokenSession(FakeSession):
+        def get(self, url, headers, timeout):
+            if self.status_codes[0] == 'chunked':
+                self.status_codes.pop(0)
+                raise req.exceptions.ChunkedEncodingError('connection broken')
+            resp = super().get(url, headers, timeout)
+            if resp.status_code == 'truncated':
+                resp.status_code = 200
+                resp._content = b'{"response": {'
+            return resp
+
+    api = KramAPIv7.__new__(KramAPIv7)
+    api.cache = None
+    api.limiter = get_limiter('fake.kramerius')
+    api.BACKOFF = 0
+
+    api.session = BrokenSession(['chunked', 'truncated', 200])
+    assert api.get_json('https://fake.kramerius/a') == {}
+
+    api.session = BrokenSession(['truncated']*api.MAX_ATTEMPTS)
+    with pytest.raises(KramRequestError):
+        api.get_json('https://fake.kramerius/a')
+
+
+def test_limiter_backs_off_on_errors():
+    class FailingSession:
+        def get(self, url, headers, timeout):
+            raise req.exceptions.ConnectionError('connection reset')
+
+    api = KramAPIv7.__new__(KramAPIv7)
+    api.cache = None
+    api.BACKOFF = 0
+    api.limiter = AdaptiveLimiter('fake.kramerius', rate=1000)
+    api.session = FakeSession([500])
+    api._request('https://fake.kramerius/a')
+    assert api.limiter.limit == AdaptiveLimiter.INITIAL_LIMIT/2
+
+    api.session = FailingSession()
+    with pytest.raises(req.exceptions.ConnectionError):
+        api._request('https://fake.kramerius/a')
+    assert api.limiter.limit == AdaptiveLimiter.INITIAL_LIMIT/4
+
+
+def test_failed_nodes_are_retried(monkeypatch):
+    expected = FakeKramAPI('test_data/frenstat_test.json')
+    expected._set_root_id('root')
+    expected.dfs(expected.per_uuid, 'periodical', 'root')
+
+    api = FakeKramAPI('test_data/frenstat_test.json')
+    api._set_root_id('root')
+    flaky = {expected.tree.nodes[vol]['uuid']
+             for vol in list(expected.tree.successors('root'))[:3]}
+    find_children = api._find_children
+
+    def flaky_find_children(uuid):
+        if uuid in flaky:
+            flaky.remove(uuid)
+            raise KramRequestError(uuid, 'status code 503')
+        return find_children(uuid)
+    monkeypatch.setattr(api, '_find_children', flaky_find_children)
+
+    api.bfs(api.per_uuid, 'periodical', 'root')
+    assert len(api.failed) == 3
+    assert api.retry_failed() == []
+    assert len(api.tree) == len(expected.tree)
+
+
+def test_download_guided_by_clb_tree(monkeypatch):
+    with open('test_data/frenstat_test.json') as f:
+        json_per = json.load(f)
+    json_per['ccnb'] = ''
+    full_tree = nx.tree_graph(json_per.pop('tree'))
+
+    fake = FakeKramAPI('test_data/frenstat_test.json')
+    # volume `16` with a single issue
+    vol_16 = full_tree.nodes['root/16']['uuid']
+    fake.children[vol_16] = fake.children[vol_16][:1]
+    only_issue = 'root/16/'+fake.children[vol_16][0]['title.search']
+    requested = []
+    find_children = fake._find_children
+    monkeypatch.setattr(fake, '_find_children',
+                        lambda uuid: requested.append(uuid) or find_children(uuid))
+
+    per = Periodical(**json_per)
+    monkeypatch.setattr(per, '_select_KramAPI',
+                        lambda cache=None: setattr(per, 'api', fake))
+    with pytest.raises(ValueError):
+        per.download(prog_bar=False, save_part=False, mode=DwnMode.CLB)
+
+    per._add_clb_record('12', '3-4', '5')
+    per._add_clb_record('13', 'I-II', '1')  # roman numerals
+    per._add_clb_record('14', '01', '2')  # leading zero
+    per._add_clb_record('15', '99', '1')  # no such issue
+    per._add_clb_record('16', NO_ISSUE, '3')
+    per._add_clb_record('99', '1', '1')  # no such volume
+    assert per.download(prog_bar=True, save_part=False,
+                        mode=DwnMode.CLB) == []
+    # the progress bar counts only matched volumes
+    assert per.api.progress_bar.total == per.api.progress_bar.n == 5
+
+    assert list(per.tree.successors('root')) == [
+        'root/12', 'root/13', 'root/14', 'root/15', 'root/16']
+    assert list(per.tree.successors('root/12')) == ['root/12/3-4']
+    assert list(per.tree.successors('root/13')) == ['root/13/1-2']
+    assert list(per.tree.successors('root/14')) == ['root/14/1']
+    assert list(per.tree.successors('root/16')) == [only_issue]
+    # the whole volume `15` is downloaded
+    assert set(per.tree.successors('root/15')) == set(
+        full_tree.successors('root/15'))
+    for issue in ['root/12/3-4', 'root/14/1', only_issue]:
+        assert list(per.tree.successors(issue)) == list(
+            full_tree.successors(issue))
+    # children of pages of matched issues are not requested
+    pages = {full_tree.nodes[page]['uuid']
+             for issue in ['root/12/3-4', 'root/14/1', only_issue]
+             for page in full_tree.successors(issue)}
+    assert pages.isdisjoint(requested)
+
+
+def test_full_download_resumes_guided_download(tmp_path, monkeypatch):
+    with open('test_data/frenstat_test.json') as f:
+        json_per = json.load(f)
+    json_per['ccnb'] = ''
+    full_tree = nx.tree_graph(json_per.pop('tree'))
+
+    guided = Periodical(**json_per)
+    guided.tmp_file = str(tmp_path / 'journal.jsonl')
+    fake = FakeKramAPI('test_data/frenstat_test.json')
+    monkeypatch.setattr(guided, '_select_KramAPI',
+                        lambda cache=None: setattr(guided, 'api', fake))
+    guided._add_clb_record('12', '3-4', '5')
+    guided._add_clb_record('14', '01', '2')
+    assert guided.download(prog_bar=False, save_part=True,
+                           mode=DwnMode.CLB) == []
+    guided.api.journal.close()
+    assert guided.tree.number_of_nodes() < full_tree.number_of_nodes()
+
+    full = Periodical(**json_per)
+    full.tmp_file = guided.tmp_file
+    resumed = FakeKramAPI('test_data/frenstat_test.json')
+    monkeypatch.setattr(full, '_select_KramAPI',
+                        lambda cache=None: setattr(full, 'api', resumed))
+    assert full.download(prog_bar=False, save_part=True,
+                         mode=DwnMode.BFS) == []
+    # filtered listings (root, volumes) are requested again, matched issues are not
+    assert {'root', 'root/12', 'root/14'}.isdisjoint(resumed.done_parents)
+    assert {'root/12/3-4', 'root/14/1'} <= resumed.done_parents
+    assert full.tree.number_of_nodes() == full_tree.number_of_nodes()
+    assert set(full.tree.bfs_edges('root')) == set(full_tree.edges)
+
+
+def test_articles_are_downloaded_on_request():
+    def article_keys(articles):
+        api = FakeKramAPI('test_data/frenstat_test.json')
+        issue = api.children[api.per_uuid][0]['pid']
+        api.children[api.children[issue][1]['pid']].append(
+            {'pid': 'uuid:article', 'model': 'article', 'title.search': 'Noviny / zprávy'})
+        api._set_root_id('root')
+        api.set_articles(articles)
+        api.dfs(api.per_uuid, 'periodical', 'root')
+        return [node for node, attrs in api.tree.nodes(data=True)
+                if attrs.get('model') == 'article']
+
+    assert article_keys(False) == []
+    assert len(article_keys(True)) == 1
+
+
+def test_articles_are_downloaded_when_resuming(tmp_path):
+    journal = str(tmp_path / 'journal.jsonl')
+
+    def download(articles, dwn=True):
+        api = FakeKramAPI('test_data/frenstat_test.json')
+        issue = api.children[api.per_uuid][0]['pid']
+        api.children[api.children[issue][1]['pid']].append(
+            {'pid': 'uuid:article', 'model': 'article', 'title.search': 'Zprávy'})
+        api._set_root_id('root')
+        api.set_articles(articles)
+        api.set_partial_save(journal)
+        api.prep_partial_down()
+        if dwn:
+            api.dfs(api.per_uuid, 'periodical', 'root')
+        api.journal.close()
+        return api
+
+    without = download(False)
+    assert without.skipped_articles == 1
+    # without articles, the listing with the skipped article is done
+    assert len(download(False, dwn=False).done_parents) == len(without.tree)
+    assert len(download(True, dwn=False).done_parents) == len(without.tree)-1
+    resumed = download(True)
+    assert len([node for node, attrs in resumed.tree.nodes(data=True)
+                if attrs.get('model') == 'article']) == 1
+
+
+def test_articles_with_the_same_title_are_kept_apart():
+    api = FakeKramAPI('test_data/frenstat_test.json')
+    issue = api.children[api.per_uuid][0]['pid']
+    page = api.children[issue][1]['pid']
+    for uuid in ['uuid:article1', 'uuid:article2']:
+        api.children[page].append(
+            {'pid': uuid, 'model': 'article', 'title.search': 'Zprávy'})
+    api._set_root_id('root')
+    api.set_articles(True)
+    api.dfs(api.per_uuid, 'periodical', 'root')
+    articles = {attrs['uuid']: node for node, attrs in api.tree.nodes(data=True)
+                if attrs.get('model') == 'article'}
+    assert len(articles) == 2
+    assert articles['uuid:article2'] == articles['uuid:article1']+' #2'
+
+    # adding the same children again (eg. when resuming) adds no nodes
+    n_nodes = api.tree.number_of_nodes()
+    page_id = api.tree.predecessors(articles['uuid:article1'])
+    api._add_children(next(page_id), 'page', api.children[page])
+    assert api.tree.number_of_nodes() == n_nodes
+
+    index = ArticleIndex.from_tree(api.tree, 'root', api.sep)
+    assert sorted(index.uuids[i] for i in index.find('Zprávy')) == [
+        'uuid:article1', 'uuid:article2']
+
+
+def test_articles_refer_to_pages_of_issues(tmp_path):
+    api = FakeKramAPI('test_data/frenstat_test.json')
+    vol = api.children[api.per_uuid][0]['pid']
+    issue = api.children[vol][0]['pid']
+    pages = [child for child in api.children[issue] if child['model'] == 'page'][:2]
+    for page in pages:
+        page['foster_parents.pids'] = ['uuid:article', 'uuid:collection']
+    api.children[issue].append(
+        {'pid': 'uuid:article', 'model': 'article', 'title.search': 'Zprávy'})
+    api._set_root_id('root')
+    api.set_articles(True)
+    api.set_partial_save(str(tmp_path / 'journal.jsonl'))
+    api.dfs(api.per_uuid, 'periodical', 'root')
+    api.journal.close()
+
+    article = next(node for node, attrs in api.tree.nodes(data=True)
+                   if attrs.get('model') == 'article')
+    assert api.tree.nodes[article]['pages'] == [page['pid'] for page in pages]
+    replayed, _ = api.journal.replay(CompactTree(api.sep))
+    assert replayed.nodes[article]['pages'] == api.tree.nodes[article]['pages']
+
+    index = ArticleIndex.from_tree(api.tree, 'root', api.sep)
+    first_page = normalize_title(pages[0]['title.search'])
+    assert index.find('Zprávy', first_page, article.rsplit(api.sep, 1)[0]) == [0]
+
+
+def test_KramAPIv5_article_title():
+    api = KramAPIv5.__new__(KramAPIv5)
+    node = {'pid': 'uuid:a', 'model': 'article',
+            'details': {}, 'title': ' Lidové písně '}
+    assert api._find_node_details(node) == ('article', 'Lidové písně')
@@ -0,0 +1,44 @@
+from clb2kramerius.Journal import Journal
+
+
+def test_replay_ignores_uncommitted_edges(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = Journal(path)
+    journal.append([('root', 'root/1', {'model': 'periodicalvolume', 'uuid': 'uuid:1'}),
+                    ('root/1', 'root/1/1', {'model': 'periodicalitem', 'uuid': 'uuid:11'})],
+                   'uuid:1')
+    journal.close()
+    # interrupted write of the next batch
+    with open(path, 'a') as f:
+        f.write('{"parent": "root", "child": "root/2", "model": "periodicalvolume", "uuid": "uuid:2"}\n')
+        f.write('{"parent": "root/2", "chi')
+
+    tree, commits = Journal(path).replay()
+    assert commits == ['uuid:1']
+    assert list(tree.edges) == [('root', 'root/1'), ('root/1', 'root/1/1')]
+    assert tree.nodes['root/1/1'] == {'model': 'periodicalitem', 'uuid': 'uuid:11'}
+
+
+def test_replay_does_not_report_incomplete_batches(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = Journal(path)
+    journal.append([('root', 'root/1', {'model': 'periodicalvolume', 'uuid': 'uuid:1'})],
+                   'root', complete=False)
+    journal.append([('root/1', 'root/1/1', {'model': 'periodicalitem', 'uuid': 'uuid:11'})],
+                   'root/1')
+    journal.close()
+
+    tree, commits = Journal(path).replay()
+    assert commits == ['root/1']
+    assert list(tree.edges) == [('root', 'root/1'), ('root/1', 'root/1/1')]
+
+
+def test_replay_reports_filtered_batches_unless_wanted(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = Journal(path)
+    journal.append([('root/1', 'root/1/1', {'model': 'page', 'uuid': 'uuid:11'})],
+                   'root/1', filtered=['article'])
+    journal.close()
+
+    assert Journal(path).replay()[1] == ['root/1']
+    assert Journal(path).replay(wanted={'article'})[1] == []
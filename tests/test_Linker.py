@@ -1,5 +1,6 @@
-from clb2kramerius.Linker import Kram2CLB, ErrorCodes
-from clb2kramerius.DwnKramerius import load_periodical
+from clb2kramerius.Linker import Kram2CLB, ErrorCodes, Record
+from clb2kramerius.DwnKramerius import Periodical, load_periodical
+from clb2kramerius.CompactTree import CompactTree
 
 
 def test_diagnose_773q():
@@ -13,3 +14,104 @@ def test_diagnose_773q():
                 ErrorCodes.MISSING_MULTIPLE]
     for f, err in zip(linker.return_fails(), expected):
         assert f.error_code is err
+
+
+def test_error_code_buckets(tmp_path):
+    with open('test_data/frenstat_test.json') as f:
+        text = f.read().replace('"issn"', '"ccnb": null,\n\t"issn"', 1)
+    per_file = tmp_path/'per.json'
+    per_file.write_text(text)
+    linker = Kram2CLB(load_periodical(per_file), 'test_data/frenstat_marc.csv')
+    linker.link()
+    linker.diagnose_fails()
+    linker.fix_errors()
+    linker.link()
+
+    for code in ErrorCodes:
+        assert linker._filter_error_codes(code) == [
+            rec for rec in linker.records if rec.error_code is code]
+    assert linker.return_fails() == [rec for rec in linker.records
+                                     if rec.error_code not in (ErrorCodes.SUCCESS, ErrorCodes.TO_LINK)]
+    assert linker.success_rate() == len(linker.return_successes())/len(linker.records)
+
+
+def test_record_is_compact():
+    a = Record('1', ''.join(['37:1/4', '<84']))
+    b = Record('2', '37:1/4<84')
+    assert not hasattr(a, '__dict__')
+    assert a.raw_loc is b.raw_loc
+    assert a.page is b.page
+
+
+def test_link_normalized_titles():
+    tree = CompactTree('/')
+    for i, path in enumerate(['root/2 (29)/04/156', 'root/1 [28]/3-4/231',
+                              'root/III/1/V', 'root/5/1/1', 'root/5/01/1']):
+        parts = path.split('/')
+        for j in range(1, len(parts)):
+            tree.add_edge('/'.join(parts[:j]), '/'.join(parts[:j+1]),
+                          model='page', uuid=f'uuid:{i}-{j}')
+    per = Periodical('test', 'uuid:per', 'mzk', '7', 'https://kram.cz', 'https://api.kram.cz',
+                     None, None, tree=tree)
+    linker = Kram2CLB(per)
+    linker.add_records([('1', '2:4<156'), ('2', '1:3/4<231'),
+                        ('3', '3:1<5'), ('4', '5:1<1'), ('5', '2:5<1')])
+    linker.link()
+
+    assert [rec.error_code for rec in linker.records] == [ErrorCodes.SUCCESS]*3 + \
+        [ErrorCodes.SUCCESS, ErrorCodes.TO_DIAGNOSE]
+    assert linker.records[0].link == 'https://kram.cz/uuid/uuid:0-3'
+    assert linker.records[2].link == 'https://kram.cz/uuid/uuid:2-3'
+    # the tree is not changed
+    assert 'root/2 (29)/04/156' in linker.tree and 'root/2/4/156' not in linker.tree
+
+
+def test_fix_missing_issue_by_page():
+    tree = CompactTree('/')
+    issues = {'1 (5)': {'1': ['1', '2', '3', '4'], '2': ['5', '7', '8']},
+              '2': {'1': ['5', '6'], '2': ['5', '6', 'VII']},
+              '3': {'1-2': ['1', '2', '3']}}
+    for vol, vol_issues in issues.items():
+        tree.add_edge('root', f'root/{vol}', model='periodicalvolume', uuid=f'uuid:{vol}')
+        for issue, pages in vol_issues.items():
+            tree.add_edge(f'root/{vol}', f'root/{vol}/{issue}',
+                          model='periodicalitem', uuid=f'uuid:{vol}-{issue}')
+            for page in pages:
+                tree.add_edge(f'root/{vol}/{issue}', f'root/{vol}/{issue}/{page}',
+                              model='page', uuid=f'uuid:{vol}-{issue}-{page}')
+    per = Periodical('test', 'uuid:per', 'mzk', '7', 'https://kram.cz', 'https://api.kram.cz',
+                     None, None, tree=tree)
+    linker = Kram2CLB(per)
+    linker.add_records([('1', '1<7'), ('2', '1<6'), ('3', '2<5'),
+                        ('4', '2<7'), ('5', '3<2'), ('6', '4<1')])
+    linker.link()
+    linker.diagnose_fails()
+    linker.fix_errors()
+    linker.link()
+
+    # the guessed issue of a record that is not found is not kept
+    assert [rec.issue for rec in linker.records] == [
+        '2', None, None, '2', '1-2', None]
+    assert [rec.error_code for rec in linker.records] == [
+        ErrorCodes.SUCCESS, ErrorCodes.MISSING_ISSUE, ErrorCodes.AMBIGUOUS_PAGE,
+        ErrorCodes.SUCCESS, ErrorCodes.SUCCESS, ErrorCodes.MISSING_ISSUE]
+    assert linker.records[0].link == 'https://kram.cz/uuid/uuid:1 (5)-2-7'
+
+
+def test_link_articles():
+    tree = CompactTree('/')
+    tree.add_edge('root', 'root/3', model='periodicalvolume', uuid='uuid:v')
+    tree.add_edge('root/3', 'root/3/1', model='periodicalitem', uuid='uuid:i')
+    for i, title in enumerate(['Úvodem', 'Nové knihy', 'Staré knihy']):
+        tree.add_edge('root/3/1', f'root/3/1/{title}',
+                      model='article', uuid=f'uuid:a{i}')
+    per = Periodical('test', 'uuid:per', 'mzk', '7', 'https://kram.cz', 'https://api.kram.cz',
+                     None, None, tree=tree)
+    linker = Kram2CLB(per)
+    linker.add_records([('1', '3:1<5', 'Nové knihy'), ('2', '3:1<5', 'Knihy'),
+                        ('3', '3:1<5'), ('4', '3:01<7;4:1<1', 'Úvodem')])
+    linker.link()
+
+    assert [rec.link for rec in linker.records] == [
+        'https://kram.cz/uuid/uuid:a1', None, None, 'https://kram.cz/uuid/uuid:a0', None]
+    assert linker.records[4].title == 'Úvodem'
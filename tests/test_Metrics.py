@@ -0,0 +1,65 @@
+from clb2kramerius.Metrics import Metrics, JsonLinesSink, PrometheusSink, Histogram, endpoint_of
+from clb2kramerius.DwnKramerius import KramAPIv7
+from clb2kramerius.RateLimit import get_limiter
+from fakes import FakeKramAPI, FakeSession
+import json
+
+
+def test_endpoint_of():
+    assert endpoint_of('https://kramerius5.nkp.cz/search/api/v5.0/item/uuid:ae7-11dd/children') == \
+        ('kramerius5.nkp.cz', '/search/api/v5.0/item/{pid}/children')
+    assert endpoint_of('https://api.kramerius.mzk.cz/search/api/client/v7.0/search?fl=pid&q=own_parent.pid:"uuid:a"&rows=10') == \
+        ('api.kramerius.mzk.cz', '/search/api/client/v7.0/search?q=own_parent.pid')
+    assert endpoint_of('https://api.kramerius.mzk.cz/search/api/client/v7.0/search?q=(own_parent.pid:"uuid:a" OR own_parent.pid:"uuid:b")')[1] == \
+        '/search/api/client/v7.0/search?q=own_parent.pid'
+
+
+def test_histogram():
+    hist = Histogram()
+    for value in [0.01, 0.05, 0.3, 100]:
+        hist.observe(value)
+    buckets = hist.cumulative()
+    assert buckets['0.05'] == 2
+    assert buckets['0.5'] == 3
+    assert buckets['30.0'] == 3
+    assert buckets['+Inf'] == hist.count == 4
+
+
+def test_metrics_of_requests(tmp_path):
+    metrics = Metrics([JsonLinesSink(str(tmp_path/'metrics.jsonl')),
+                       PrometheusSink(str(tmp_path/'metrics.prom'))],
+                      labels={'periodical': 'uuid:per'}, interval=None)
+    api = KramAPIv7.__new__(KramAPIv7)
+    api.cache = None
+    api.limiter = get_limiter('fake.kramerius')
+    api.BACKOFF = 0
+    api.set_metrics(metrics)
+    api.session = FakeSession([503, 200, 200])
+    api.get_response('https://fake.kramerius/search/api/v5.0/item/uuid:a/children')
+    api.get_response('https://fake.kramerius/search/api/v5.0/item/uuid:b/children')
+
+    fake = FakeKramAPI('test_data/frenstat_test.json')
+    fake._set_root_id('root')
+    fake.set_metrics(metrics)
+    fake.bfs(fake.per_uuid, 'periodical', 'root')
+    metrics.flush()
+    metrics.flush()
+
+    with open(tmp_path/'metrics.jsonl') as f:
+        snapshots = [json.loads(line) for line in f]
+    assert len(snapshots) == 2
+    snapshot = snapshots[-1]
+    assert snapshot['labels'] == {'periodical': 'uuid:per'}
+    assert snapshot['nodes'] == len(fake.tree)-1
+    [endpoint] = snapshot['endpoints']
+    assert endpoint['endpoint'] == '/search/api/v5.0/item/{pid}/children'
+    assert endpoint['requests'] == 3
+    assert endpoint['statuses'] == {'503': 1, '200': 2}
+    assert endpoint['bytes'] == 6
+    assert snapshot['hosts']['fake.kramerius']['retries'] == 1
+
+    prom = (tmp_path/'metrics.prom').read_text()
+    assert '# TYPE clb2kramerius_request_duration_seconds histogram' in prom
+    assert 'clb2kramerius_request_duration_seconds_count{periodical="uuid:per",host="fake.kramerius",endpoint="/search/api/v5.0/item/{pid}/children"} 3' in prom
+    assert 'clb2kramerius_retries_total{periodical="uuid:per",host="fake.kramerius"} 1' in prom
+    assert f'clb2kramerius_nodes_total{{periodical="uuid:per"}} {len(fake.tree)-1}' in prom
@@ -1,5 +1,6 @@
 import csv
-from Parse773 import parse_location, replace_separators, remove_leading_zeros
+from Parse773 import parse_location, replace_separators, remove_leading_zeros, normalize, parse_normalized, parse_locations, check_format, normalize_title
+import pandas as pd
 
 
 def test_parse_location():
@@ -32,3 +33,40 @@ def test_remove_leading_zeros():
                            row['hand_page'])
             vol_iss_pg = (row['vol'], row['issue'], row['page'])
             assert remove_leading_zeros(*vol_iss_pg) == hand_parsed
+
+
+def test_parse_normalized():
+    with open('test_data/test_parsing.csv') as f:
+        reader = csv.DictReader(f, delimiter=';')
+        for row in reader:
+            expected = normalize(*parse_location(row['773q']))
+            assert parse_normalized(row['773q']) == expected
+            # memoized
+            assert parse_normalized(row['773q']) is parse_normalized(row['773q'])
+    # the same fields as the greedy regular expressions of the original parser
+    assert parse_location('1:2:3<4<5') == ('1:2', '2:3<4', '4<5')
+    assert remove_leading_zeros(None, '05/105', None) == (None, '5/105', None)
+    assert remove_leading_zeros(None, '10/010', None) == (None, '10/10', None)
+
+
+def test_parse_locations():
+    marc = pd.read_csv('test_data/test_parsing.csv', delimiter=';', dtype=str)
+    marc.loc[len(marc)] = ['x', '1:01<2;3<4', None, None, None]
+    parsed = parse_locations(marc['773q'])
+
+    expected = []
+    for i, field in marc['773q'].items():
+        for loc in field.split(';'):
+            expected.append((i, loc, *parse_normalized(loc), check_format(loc)))
+    assert list(zip(parsed.index, *(parsed[col] for col in parsed.columns))) == expected
+
+
+def test_normalize_title():
+    assert normalize_title('2 (29)') == '2'
+    assert normalize_title('1 [28]') == '1'
+    assert normalize_title('(29)') == '29'
+    assert normalize_title('01/02') == '1-2'
+    assert normalize_title(' 3 -  4 ') == '3-4'
+    assert normalize_title('IV') == '4'
+    assert normalize_title('xiv-XV') == '14-15'
+    assert normalize_title('Příloha v') == 'Příloha v'
@@ -0,0 +1,37 @@
+from clb2kramerius.RateLimit import AdaptiveLimiter, TokenBucket
+import time
+
+
+def test_aimd():
+    limiter = AdaptiveLimiter('fake.kramerius', rate=100, max_limit=4)
+    for _ in range(20):
+        limiter.success(0.1)
+    assert limiter.limit == 4
+
+    limiter.failure()
+    assert limiter.limit == 2
+    limiter.success(10)  # slow response
+    assert limiter.limit < 2
+    for _ in range(5):
+        limiter.failure()
+    assert limiter.limit == limiter.min_limit
+
+
+def test_max_limit():
+    limiter = AdaptiveLimiter('fake.kramerius', rate=100, max_limit=8)
+    assert limiter.limit == AdaptiveLimiter.INITIAL_LIMIT
+    # fewer workers lower the limit
+    limiter.set_max_limit(2)
+    assert (limiter.max_limit, limiter.limit) == (2, 2)
+    # more workers than the host allows
+    limiter.set_max_limit(32)
+    assert limiter.max_limit == 8
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # the first token is available immediately
+    assert time.monotonic()-start >= 5/50*0.9
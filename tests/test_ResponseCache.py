@@ -0,0 +1,34 @@
+from clb2kramerius.ResponseCache import ResponseCache, CacheMiss
+import pytest
+
+
+def test_put_get(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    assert cache.get('https://a') is None
+    cache.put('https://a', b'{"docs": []}')
+    assert cache.get('https://a') == b'{"docs": []}'
+    cache.close()
+
+    # the cache persists
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), offline=True)
+    assert cache.get('https://a') == b'{"docs": []}'
+    with pytest.raises(CacheMiss):
+        cache.get('https://b')
+
+
+def test_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), ttl=-1)
+    cache.put('https://a', b'content')
+    assert cache.get('https://a') is None
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), max_size=None)
+    cache.put('https://a', b'a'*1000)
+    cache.put('https://b', b'b'*1000)
+    cache.get('https://a')  # `b` is now the least recently used
+    cache.max_size = cache.size
+    cache.put('https://c', b'c'*1000)
+    assert cache.get('https://b') is None
+    assert cache.get('https://a') is not None
+    assert cache.get('https://c') is not None
@@ -0,0 +1,23 @@
+from clb2kramerius.DwnKramerius import load_periodical, TreeFormat
+import pytest
+import os
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_compact_roundtrip(tmp_path, compression):
+    with open('test_data/frenstat_test.json') as f:
+        text = f.read().replace('"issn"', '"ccnb": null,\n\t"issn"', 1)
+    json_file = tmp_path/'per.json'
+    json_file.write_text(text)
+    per = load_periodical(json_file)
+    per.tree.nodes['root/12']['uuid'] = 'uuid:not-a-uuid'
+
+    compact_file = tmp_path/'per.bin'
+    per.save(compact_file, TreeFormat.COMPACT, compression)
+    assert os.path.getsize(compact_file) < os.path.getsize(json_file)/4
+
+    loaded = load_periodical(compact_file)
+    assert loaded._params() == per._params()
+    assert dict(loaded.tree.nodes(data=True)) == dict(per.tree.nodes(data=True))
+    for node in per.tree:
+        assert list(loaded.tree.successors(node)) == list(per.tree.successors(node))
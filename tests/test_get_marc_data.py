@@ -0,0 +1,26 @@
+import io
+import pytest
+pytest.importorskip('pymarc')
+from scripts_marc.get_marc_data import iter_raw_records, RECORD_TERMINATOR
+
+
+def make_raw(body: bytes) -> bytes:
+    # length, body and the record terminator
+    return b'%05d' % (len(body)+6) + body + RECORD_TERMINATOR
+
+
+def test_iter_raw_records_skips_broken_records():
+    records = [make_raw(b'first'), make_raw(b'second'),
+               make_raw(b'third'), make_raw(b'fourth')]
+    # not a length
+    broken = b'x' + records[1][1:]
+    # wrong length, the record does not end with the terminator
+    too_short = b'%05d' % (len(records[2])-3) + records[2][5:]
+    data = records[0] + broken + too_short + records[3]
+
+    raw = list(iter_raw_records(io.BytesIO(data), 0, len(data)))
+    assert raw == [records[0], records[3]]
+
+    # only records starting in the chunk
+    end = len(records[0]) + len(broken)
+    assert list(iter_raw_records(io.BytesIO(data), 0, end)) == [records[0]]